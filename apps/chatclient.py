@@ -0,0 +1,97 @@
+#
+# Copyright (C) 2025 pdnguyen of HCMC University of Technology VNU-HCM.
+# All rights reserved.
+# This file is part of the CO3093/CO3094 course.
+#
+# WeApRous release
+#
+# The authors hereby grant to Licensee personal permission to use
+# and modify the Licensed Source Code for the sole purpose of studying
+# while attending the course
+#
+
+"""
+apps.chatclient
+~~~~~~~~~~~~~~~~~
+
+A chat client for bots and bridges speaking one of the binary wire formats
+of :mod:`daemon.wire` with the chat tracker.
+
+Usage::
+
+  >>> client = ChatClient('127.0.0.1', 9000, 'bot')
+  >>> client.register('127.0.0.1', 7000)
+  >>> client.broadcast('hello', channel='general')
+  {'status': 'success', 'message': 'Broadcast sent', 'peer_count': '3'}
+  >>> client.fetch()
+  [{'from': 'bot', 'message': 'hello', 'type': 'broadcast', ...}]
+"""
+
+import http.client
+import urllib.parse
+
+from daemon import wire
+
+
+class ChatClient:
+    """The :class:`ChatClient <ChatClient>` object sends and fetches the
+    messages of one peer.
+
+    :attrs name (str): peer name of the client.
+    :attrs content_type (str): wire format, one of
+        :data:`daemon.wire.CONTENT_TYPES`.
+    """
+
+    def __init__(self, host, port, name, content_type=wire.CONTENT_TYPE_FRAMES,
+                 timeout=10.0):
+        if content_type not in wire.CONTENT_TYPES:
+            raise ValueError("Unsupported wire format {}".format(content_type))
+        self.host = host
+        self.port = port
+        self.name = name
+        self.content_type = content_type
+        self.timeout = timeout
+
+    def _post(self, path, fields):
+        if self.content_type == wire.CONTENT_TYPE_MSGPACK:
+            body = wire.msgpack.packb(fields, use_bin_type=True)
+        else:
+            body = wire.encode_fields(fields)
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            conn.request("POST", path, body, {"Content-Type": self.content_type,
+                                              "Accept": self.content_type})
+            response = conn.getresponse()
+            data = response.read()
+            return wire.decode_response(response.getheader("Content-Type", ""), data)
+        finally:
+            conn.close()
+
+    def register(self, ip, port):
+        """Registers the client as a peer; the tracker answers in JSON."""
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            body = urllib.parse.urlencode({"name": self.name, "ip": ip, "port": port})
+            conn.request("POST", "/submit-info", body,
+                         {"Content-Type": "application/x-www-form-urlencoded"})
+            conn.getresponse().read()
+        finally:
+            conn.close()
+
+    def send(self, target, message, channel='general'):
+        """Sends a direct message to ``target``."""
+        return self._post("/send-peer", {"sender_name": self.name, "target_name": target,
+                                         "message": message, "channel": channel})
+
+    def broadcast(self, message, channel='general'):
+        """Broadcasts a message to ``channel``."""
+        return self._post("/broadcast-peer", {"sender_name": self.name,
+                                              "message": message, "channel": channel})
+
+    def fetch(self):
+        """
+        Drains the pending messages of the client.
+
+        :rtype list: message dicts, oldest first.
+        """
+        return self._post("/get-messages", {"peer_name": self.name}).get('messages', [])
@@ -0,0 +1,121 @@
+#
+# Copyright (C) 2025 pdnguyen of HCMC University of Technology VNU-HCM.
+# All rights reserved.
+# This file is part of the CO3093/CO3094 course.
+#
+# WeApRous release
+#
+# The authors hereby grant to Licensee personal permission to use
+# and modify the Licensed Source Code for the sole purpose of studying
+# while attending the course
+#
+
+"""
+benchmarks.bench_message_memory
+~~~~~~~~~~~~~~~~~
+
+Memory benchmark of queued chat messages.
+
+The same stream of queued messages is built in three representations and
+measured with :mod:`tracemalloc`:
+
+- ``dict``: one dict per queue entry, with the sender, channel and type
+  strings decoded from every request as before.
+- ``Message``: one :class:`daemon.message.Message` per queue entry, with
+  interned strings and its cached JSON view.
+- ``Message shared``: one message per send, shared by every recipient
+  queue as broadcasts are queued now.
+
+Usage::
+
+  $ python -m benchmarks.bench_message_memory --messages 1000000 --fanout 10
+"""
+
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+
+from daemon.message import Message, MESSAGE_BROADCAST
+
+
+def _decoded(text):
+    # Parsed request fields are fresh string objects, never interned
+    return text.encode('utf-8').decode('utf-8')
+
+
+def _sends(count, peers, channels, seed=0):
+    rnd = random.Random(seed)
+    for seq in range(1, count + 1):
+        yield (seq, "peer{}".format(rnd.randrange(peers)),
+               "message number {} from the benchmark".format(seq),
+               channels[rnd.randrange(len(channels))])
+
+
+def build_dicts(total, fanout, peers, channels):
+    queued = []
+    for seq, sender, text, channel in _sends(-(-total // fanout), peers, channels):
+        for _ in range(fanout):
+            queued.append({'from': _decoded(sender), 'message': text,
+                           'type': _decoded(MESSAGE_BROADCAST),
+                           'channel': _decoded(channel),
+                           'timestamp': time.time(), 'seq': seq})
+    return queued[:total]
+
+
+def build_messages(total, fanout, peers, channels, shared):
+    queued = []
+    for seq, sender, text, channel in _sends(-(-total // fanout), peers, channels):
+        if shared:
+            msg = Message(_decoded(sender), text, _decoded(MESSAGE_BROADCAST),
+                          _decoded(channel), seq=seq)
+            msg.json
+            queued.extend([msg] * fanout)
+            continue
+        for _ in range(fanout):
+            msg = Message(_decoded(sender), text, _decoded(MESSAGE_BROADCAST),
+                          _decoded(channel), seq=seq)
+            msg.json
+            queued.append(msg)
+    return queued[:total]
+
+
+def measure(build, *args):
+    """
+    Builds a queued message list and measures the memory it holds.
+
+    :rtype tuple: (bytes held after building, peak bytes while building).
+    """
+    gc.collect()
+    tracemalloc.start()
+    queued = build(*args)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del queued
+    gc.collect()
+    return current, peak
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog='bench_message_memory',
+                                     description='Queued message memory benchmark')
+    parser.add_argument('--messages', type=int, default=1000000)
+    parser.add_argument('--fanout', type=int, default=10)
+    parser.add_argument('--peers', type=int, default=200)
+    parser.add_argument('--channels', type=int, default=8)
+    args = parser.parse_args()
+
+    channels = ["channel{}".format(i) for i in range(args.channels)]
+    rounds = [
+        ("dict", build_dicts, (args.messages, args.fanout, args.peers, channels)),
+        ("Message", build_messages, (args.messages, args.fanout, args.peers, channels, False)),
+        ("Message shared", build_messages, (args.messages, args.fanout, args.peers, channels, True)),
+    ]
+
+    print("{} queued messages, fanout {}".format(args.messages, args.fanout))
+    print("{:>16} {:>12} {:>12} {:>12}".format("representation", "MiB", "peak MiB", "B/message"))
+    for name, build, build_args in rounds:
+        current, peak = measure(build, *build_args)
+        print("{:>16} {:>12.1f} {:>12.1f} {:>12.0f}".format(
+            name, current / 2 ** 20, peak / 2 ** 20, current / args.messages))
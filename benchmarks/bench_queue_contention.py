@@ -0,0 +1,139 @@
+#
+# Copyright (C) 2025 pdnguyen of HCMC University of Technology VNU-HCM.
+# All rights reserved.
+# This file is part of the CO3093/CO3094 course.
+#
+# WeApRous release
+#
+# The authors hereby grant to Licensee personal permission to use
+# and modify the Licensed Source Code for the sole purpose of studying
+# while attending the course
+#
+
+"""
+benchmarks.bench_queue_contention
+~~~~~~~~~~~~~~~~~
+
+Contention benchmark for :class:`MessageQueues <daemon.msgqueue.MessageQueues>`.
+
+Many sender threads push direct messages and broadcasts while poller threads
+drain their own queues. The same workload runs once per stripe count so the
+throughput of a single global lock can be compared with lock striping.
+
+With ``--hold 0`` the critical sections are pure Python and the GIL already
+runs them one at a time, so the stripe count barely changes throughput. The
+contention case is a lock holder that blocks while holding the lock (I/O,
+a page fault, a GIL switch): ``--hold`` keeps every lock that many seconds
+after it is acquired, releasing the GIL meanwhile. One lock then stalls
+every sender and poller behind the blocked holder, stripes only the peers
+sharing its stripe.
+
+Usage::
+
+  $ python -m benchmarks.bench_queue_contention --peers 200 --senders 16 --pollers 16 --hold 0 0.0002
+"""
+
+import argparse
+import random
+import threading
+import time
+
+from daemon.msgqueue import MessageQueues
+
+
+class _HeldLock:
+    """Lock kept ``hold`` seconds after each acquisition, a holder blocked
+    with the GIL released."""
+
+    def __init__(self, hold):
+        self.lock = threading.Lock()
+        self.hold = hold
+
+    def __enter__(self):
+        self.lock.acquire()
+        time.sleep(self.hold)
+        return self
+
+    def __exit__(self, *exc):
+        self.lock.release()
+
+
+def run(stripes, peers, senders, pollers, duration, broadcast_ratio, hold=0.0):
+    """
+    Runs one benchmark round.
+
+    :param stripes (int): number of lock stripes.
+    :param peers (int): number of registered peers.
+    :param senders (int): number of sender threads.
+    :param pollers (int): number of poller threads.
+    :param duration (float): seconds to run.
+    :param broadcast_ratio (float): fraction of sends that are broadcasts.
+    :param hold (float): seconds each stripe lock is held after acquiring it.
+
+    :rtype tuple: (sends per second, polls per second).
+    """
+    queues = MessageQueues(stripes=stripes)
+    if hold:
+        for stripe in queues.stripes:
+            stripe.lock = _HeldLock(hold)
+    names = ["peer{}".format(i) for i in range(peers)]
+    for name in names:
+        queues.ensure(name)
+
+    stop = threading.Event()
+    counts = {"send": 0, "poll": 0}
+    counts_lock = threading.Lock()
+
+    def sender(seed):
+        rnd = random.Random(seed)
+        done = 0
+        while not stop.is_set():
+            msg = {"from": rnd.choice(names), "message": "hello world",
+                   "type": "direct", "channel": "general", "timestamp": time.time()}
+            if rnd.random() < broadcast_ratio:
+                queues.push_many(names, msg)
+            else:
+                queues.push(rnd.choice(names), msg)
+            done += 1
+        with counts_lock:
+            counts["send"] += done
+
+    def poller(seed):
+        rnd = random.Random(seed)
+        done = 0
+        while not stop.is_set():
+            queues.drain(rnd.choice(names))
+            done += 1
+        with counts_lock:
+            counts["poll"] += done
+
+    threads = [threading.Thread(target=sender, args=(i,)) for i in range(senders)]
+    threads += [threading.Thread(target=poller, args=(-i - 1,)) for i in range(pollers)]
+    for t in threads:
+        t.start()
+    time.sleep(duration)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    return counts["send"] / duration, counts["poll"] / duration
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog='bench_queue_contention',
+                                     description='MessageQueues lock contention benchmark')
+    parser.add_argument('--peers', type=int, default=200)
+    parser.add_argument('--senders', type=int, default=16)
+    parser.add_argument('--pollers', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=3.0)
+    parser.add_argument('--broadcast-ratio', type=float, default=0.05)
+    parser.add_argument('--stripes', type=int, nargs='+', default=[1, 4, 16, 64])
+    parser.add_argument('--hold', type=float, nargs='+', default=[0.0, 0.0002])
+    args = parser.parse_args()
+
+    print("{:>8} {:>8} {:>14} {:>14}".format("hold", "stripes", "sends/s", "polls/s"))
+    for hold in args.hold:
+        for n in args.stripes:
+            sends, polls = run(n, args.peers, args.senders, args.pollers,
+                               args.duration, args.broadcast_ratio, hold)
+            print("{:>8} {:>8} {:>14.0f} {:>14.0f}".format(hold, n, sends, polls))
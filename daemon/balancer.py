@@ -0,0 +1,357 @@
+#
+# Copyright (C) 2025 pdnguyen of HCMC University of Technology VNU-HCM.
+# All rights reserved.
+# This file is part of the CO3093/CO3094 course.
+#
+# WeApRous release
+#
+# The authors hereby grant to Licensee personal permission to use
+# and modify the Licensed Source Code for the sole purpose of studying
+# while attending the course
+#
+
+"""
+daemon.balancer
+~~~~~~~~~~~~~~~~~
+
+This module provides the load-balancing policies used by the proxy to pick
+one of the ``proxy_pass`` upstreams of a ``host`` block.
+
+Each upstream is an :class:`Upstream <Upstream>` state object holding its
+weight and its number of in-flight requests. A balancer chooses an upstream
+and counts the request as in flight until :meth:`Balancer.release`.
+
+Policies choose among the ``available`` upstreams, a tuple recomputed by
+:meth:`Balancer.refresh` only when an upstream changes health (see
+:mod:`daemon.health`) or its circuit breaker opens (see
+:mod:`daemon.breaker`), so skipping unhealthy upstreams costs nothing per
+request.
+
+Policies, selected with ``dist_policy`` in a host block:
+
+- ``round-robin``: upstreams in turn, weights ignored.
+- ``weighted``: smooth weighted round-robin, an upstream of weight 3 gets
+  three requests out of ``total weight``, interleaved with the others.
+- ``least-conn``: the upstream with the fewest in-flight requests per
+  unit of weight.
+- ``random-two``: the less loaded of two random upstreams, nearly as good
+  as ``least-conn`` without scanning every upstream.
+- ``consistent-hash``: a hash ring keyed by client IP, or by the value of a
+  cookie with ``dist_policy consistent-hash cookie=<name>``, so a client
+  sticks to one upstream and only ``1/n`` of the clients move when an
+  upstream is added or removed.
+
+Usage::
+
+  >>> balancer = create_balancer('least-conn', [Upstream('127.0.0.1', 9001),
+  ...                                           Upstream('127.0.0.1', 9002)])
+  >>> upstream, probe = balancer.choose(client_ip='10.0.0.7')
+  >>> try:
+  ...     attempt = Attempt(upstream, method, payload, client, framing, probe)
+  ...     attempt.send(policy)
+  ... finally:
+  ...     balancer.release(upstream)
+"""
+
+import bisect
+import hashlib
+import random
+import threading
+
+from .breaker import CLOSED, OPEN
+
+DEFAULT_POLICY = 'round-robin'
+
+#: Ring points per unit of weight of a consistent-hash upstream.
+VIRTUAL_NODES = 100
+
+
+class Upstream:
+    """The :class:`Upstream <Upstream>` object is the state of one backend
+    of a host block.
+
+    :attrs host (str): backend IP address.
+    :attrs port (int): backend port.
+    :attrs weight (int): share of the requests, 1 by default.
+    :attrs active (int): requests in flight.
+    :attrs requests (int): requests sent so far.
+    :attrs healthy (bool): False while health checks keep it out.
+    :attrs health (daemon.health.UpstreamHealth): health tracking, or
+        ``None``.
+    :attrs breaker (daemon.breaker.CircuitBreaker): circuit breaker, or
+        ``None``.
+    """
+
+    __slots__ = ("host", "port", "weight", "active", "requests", "current_weight",
+                 "healthy", "health", "breaker")
+
+    def __init__(self, host, port, weight=1):
+        if weight < 1:
+            raise ValueError("Upstream weight must be at least 1")
+        self.host = host
+        self.port = int(port)
+        self.weight = weight
+        self.active = 0
+        self.requests = 0
+        #: running weight of the smooth weighted round-robin
+        self.current_weight = 0
+        self.healthy = True
+        self.health = None
+        self.breaker = None
+
+    @property
+    def address(self):
+        return "{}:{}".format(self.host, self.port)
+
+    def __repr__(self):
+        return "<Upstream {} weight={} active={}>".format(self.address, self.weight, self.active)
+
+
+def parse_upstream(value, weight=1):
+    """
+    Builds an upstream from a ``host:port`` string.
+
+    :raises ValueError: If the port is missing or not a number.
+    """
+    host, sep, port = value.rpartition(':')
+    if not sep or not port.isdigit():
+        raise ValueError("Invalid upstream {}".format(value))
+    return Upstream(host, int(port), weight)
+
+
+class Balancer:
+    """The :class:`Balancer <Balancer>` object chooses the upstream of each
+    request; subclasses implement :meth:`_pick`.
+
+    :attrs upstreams (tuple): the :class:`Upstream` objects.
+    :attrs available (tuple): the healthy upstreams, or all of them when
+        none is healthy.
+    :attrs request_policy (daemon.timeouts.RequestPolicy): timeouts,
+        retries and hedging of the host block, or ``None``.
+    :attrs coalescer (daemon.coalesce.SingleFlight): single-flight
+        tracker of the block, or ``None`` when requests are not coalesced.
+    """
+
+    name = None
+
+    def __init__(self, upstreams):
+        if not upstreams:
+            raise ValueError("A balancer needs at least one upstream")
+        self.upstreams = tuple(upstreams)
+        self.available = self.upstreams
+        self.lock = threading.Lock()
+        self.request_policy = None
+        self.coalescer = None
+
+    def _pick(self, client_ip, cookie):
+        raise NotImplementedError
+
+    def _rebuild(self):
+        """Recomputes policy state derived from :attr:`available`."""
+
+    def refresh(self):
+        """Recomputes the available upstreams after a health or circuit
+        breaker change."""
+        with self.lock:
+            self.available = tuple(
+                u for u in self.upstreams
+                if u.healthy and (u.breaker is None or u.breaker.state is not OPEN)
+            ) or self.upstreams
+            self._rebuild()
+
+    def choose(self, client_ip='', cookie='', exclude=()):
+        """
+        Chooses the upstream of a request and counts it as in flight.
+
+        :param client_ip (str): client address.
+        :param cookie (str): raw ``Cookie`` header of the request.
+        :param exclude (list): upstreams already tried by the request; the
+            least loaded other upstream replaces a pick among them, if any.
+
+        :rtype tuple: (the chosen upstream, what its circuit breaker admitted
+            the request as, see :meth:`CircuitBreaker.admit
+            <daemon.breaker.CircuitBreaker.admit>`).
+        """
+        with self.lock:
+            upstream = self._pick(client_ip, cookie)
+            if upstream in exclude:
+                others = [u for u in self.available if u not in exclude]
+                if others:
+                    upstream = min(others, key=_load)
+            probe = 0
+            if upstream.breaker is not None:
+                probe = upstream.breaker.admit()
+            if probe is None:
+                # Half-open with every probe taken, or every upstream open
+                probe = 0
+                others = [u for u in self.available if u is not upstream
+                          and u not in exclude
+                          and (u.breaker is None or u.breaker.state is CLOSED)]
+                if others:
+                    upstream = min(others, key=_load)
+            upstream.active += 1
+            upstream.requests += 1
+        return upstream, probe
+
+    def release(self, upstream):
+        """Marks a request to ``upstream`` as finished."""
+        with self.lock:
+            upstream.active -= 1
+
+    def __repr__(self):
+        return "<{} {}>".format(self.name, ", ".join(u.address for u in self.upstreams))
+
+
+class RoundRobin(Balancer):
+    name = 'round-robin'
+
+    def __init__(self, upstreams):
+        super().__init__(upstreams)
+        self.next = 0
+
+    def _pick(self, client_ip, cookie):
+        available = self.available
+        upstream = available[self.next % len(available)]
+        self.next += 1
+        return upstream
+
+
+class WeightedRoundRobin(Balancer):
+    """Smooth weighted round-robin, as in nginx: every pick adds each weight
+    to its running weight and takes the largest, which then pays back the
+    total weight. Heavier upstreams are interleaved rather than bunched."""
+
+    name = 'weighted'
+
+    def __init__(self, upstreams):
+        super().__init__(upstreams)
+        self._rebuild()
+
+    def _rebuild(self):
+        self.total_weight = sum(u.weight for u in self.available)
+
+    def _pick(self, client_ip, cookie):
+        best = None
+        for upstream in self.available:
+            upstream.current_weight += upstream.weight
+            if best is None or upstream.current_weight > best.current_weight:
+                best = upstream
+        best.current_weight -= self.total_weight
+        return best
+
+
+def _load(upstream):
+    return upstream.active / upstream.weight
+
+
+class LeastConnections(Balancer):
+    name = 'least-conn'
+
+    def __init__(self, upstreams):
+        super().__init__(upstreams)
+        # Rotates the start of the scan so ties are shared out
+        self.next = 0
+
+    def _pick(self, client_ip, cookie):
+        available = self.available
+        count = len(available)
+        start = self.next % count
+        self.next += 1
+        best = None
+        for i in range(count):
+            upstream = available[(start + i) % count]
+            if best is None or _load(upstream) < _load(best):
+                best = upstream
+        return best
+
+
+class RandomTwoChoices(Balancer):
+    name = 'random-two'
+
+    def _pick(self, client_ip, cookie):
+        available = self.available
+        if len(available) == 1:
+            return available[0]
+        first, second = random.sample(available, 2)
+        return first if _load(first) <= _load(second) else second
+
+
+def _hash(value):
+    return int.from_bytes(hashlib.md5(value.encode('utf-8')).digest()[:8], 'big')
+
+
+def cookie_value(cookie, name):
+    """Returns the value of cookie ``name`` in a raw ``Cookie`` header, or
+    an empty string."""
+    for pair in cookie.split(';'):
+        key, sep, value = pair.strip().partition('=')
+        if sep and key == name:
+            return value
+    return ''
+
+
+class ConsistentHash(Balancer):
+    """Hash ring of ``VIRTUAL_NODES * weight`` points per upstream. Requests
+    without the hashed cookie fall back to the client IP.
+
+    :attrs cookie (str): name of the cookie hashed, or ``None`` to hash the
+        client IP.
+    """
+
+    name = 'consistent-hash'
+
+    def __init__(self, upstreams, cookie=None):
+        super().__init__(upstreams)
+        self.cookie = cookie
+        ring = []
+        for upstream in self.upstreams:
+            for i in range(VIRTUAL_NODES * upstream.weight):
+                ring.append((_hash("{}#{}".format(upstream.address, i)), upstream))
+        ring.sort(key=lambda point: point[0])
+        #: ring of every upstream, the points of unavailable ones are left
+        #: out by :meth:`_rebuild` so only their clients move
+        self.full_ring = ring
+        self._rebuild()
+
+    def _rebuild(self):
+        available = set(self.available)
+        ring = [point for point in self.full_ring if point[1] in available]
+        self.points = [point for point, _ in ring]
+        self.ring = [upstream for _, upstream in ring]
+
+    def _pick(self, client_ip, cookie):
+        key = cookie_value(cookie, self.cookie) if self.cookie and cookie else ''
+        index = bisect.bisect(self.points, _hash(key or client_ip))
+        return self.ring[index % len(self.ring)]
+
+
+#: Policy names to balancer classes.
+POLICIES = {cls.name: cls for cls in (RoundRobin, WeightedRoundRobin, LeastConnections,
+                                      RandomTwoChoices, ConsistentHash)}
+
+
+def create_balancer(policy, upstreams, options=None):
+    """
+    Builds the balancer of a host block.
+
+    :param policy (str): one of :data:`POLICIES`.
+    :param upstreams (list): the :class:`Upstream` objects.
+    :param options (dict): policy options, ``cookie`` or ``ip`` for
+        consistent-hash.
+
+    :raises ValueError: If the policy or an option is unknown.
+
+    :rtype Balancer: the balancer.
+    """
+    cls = POLICIES.get(policy)
+    if cls is None:
+        raise ValueError("Unknown dist_policy {}".format(policy))
+    options = dict(options or {})
+    if cls is ConsistentHash:
+        options.pop('ip', None)
+        cookie = options.pop('cookie', None)
+        if not options:
+            return cls(upstreams, cookie=cookie)
+    if options:
+        raise ValueError("Unknown {} options {}".format(policy, ", ".join(options)))
+    return cls(upstreams)
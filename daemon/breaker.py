@@ -0,0 +1,285 @@
+#
+# Copyright (C) 2025 pdnguyen of HCMC University of Technology VNU-HCM.
+# All rights reserved.
+# This file is part of the CO3093/CO3094 course.
+#
+# WeApRous release
+#
+# The authors hereby grant to Licensee personal permission to use
+# and modify the Licensed Source Code for the sole purpose of studying
+# while attending the course
+#
+
+"""
+daemon.breaker
+~~~~~~~~~~~~~~~~~
+
+This module provides the circuit breakers of the upstreams of the proxy,
+one per upstream.
+
+A breaker is
+
+- ``closed`` while the upstream behaves: requests go through and their
+  outcomes are counted over a rolling ``window`` of seconds. Once
+  ``min_requests`` were counted, a share of failures (connect errors,
+  timeouts, broken responses, 5xx statuses) reaching ``error_rate``, or a
+  share of responses slower than ``slow`` seconds reaching ``slow_rate``,
+  opens the breaker.
+- ``open`` for ``open`` seconds: the upstream is taken out of the
+  available upstreams of its balancer at once, so no request waits on it.
+- ``half-open`` afterwards: the upstream is available again but only
+  ``probes`` requests at a time are let through. ``probes`` successes in a
+  row close the breaker, a failure opens it again. Only the outcomes of
+  the probes count: a request admitted as a probe carries the number of
+  its half-open period, and requests sent before, or probes of an earlier
+  period, are ignored when they complete.
+
+Unlike the passive checks of :mod:`daemon.health`, which judge error rates
+only, the breaker also trips on latency and comes back gradually.
+
+The rolling window is a ring of ``BUCKETS`` buckets allocated once, so
+recording an outcome allocates nothing and only sums the ring when a
+failure or a slow response may trip the breaker.
+
+Configured per host or location block::
+
+    circuit_breaker error_rate=0.5 min_requests=20 window=10 slow=2 slow_rate=0.5 open=5 probes=3;
+
+Breakers are on by default, ``circuit_breaker off;`` disables them;
+latency only trips a breaker with a ``slow`` option.
+"""
+
+import threading
+import time
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+#: Buckets of the rolling window.
+BUCKETS = 10
+
+
+class BreakerSettings:
+    """Settings of the circuit breakers of a block.
+
+    :attrs error_rate (float): share of failures opening the breaker.
+    :attrs min_requests (int): requests in the window before judging it.
+    :attrs window (float): seconds of the rolling window.
+    :attrs slow (float): seconds making a response slow, 0 to ignore
+        latency.
+    :attrs slow_rate (float): share of slow responses opening the breaker.
+    :attrs open (float): seconds an open breaker stays open.
+    :attrs probes (int): requests let through while half-open.
+    """
+
+    def __init__(self, error_rate=0.5, min_requests=20, window=10.0, slow=0.0,
+                 slow_rate=0.5, open=5.0, probes=3):
+        if (not 0 < error_rate <= 1 or not 0 < slow_rate <= 1 or min_requests < 1
+                or window <= 0 or slow < 0 or open <= 0 or probes < 1):
+            raise ValueError("Invalid circuit_breaker settings")
+        self.error_rate = float(error_rate)
+        self.min_requests = int(min_requests)
+        self.window = float(window)
+        self.slow = float(slow)
+        self.slow_rate = float(slow_rate)
+        self.open = float(open)
+        self.probes = int(probes)
+
+
+def parse_breaker(args):
+    """
+    Builds the breaker settings of a ``circuit_breaker`` line.
+
+    :rtype BreakerSettings: the settings, or ``None`` for ``off``.
+    """
+    if args == ['off']:
+        return None
+    options = dict(arg.partition('=')[::2] for arg in args)
+    try:
+        return BreakerSettings(**{key: float(value) for key, value in options.items()})
+    except TypeError as e:
+        raise ValueError("Unknown circuit_breaker option: {}".format(e))
+
+
+class CircuitBreaker:
+    """The :class:`CircuitBreaker <CircuitBreaker>` object is the breaker
+    of one upstream.
+
+    :attrs upstream (Upstream): the upstream.
+    :attrs balancer (Balancer): balancer refreshed on state changes.
+    :attrs settings (BreakerSettings): the settings.
+    :attrs state (str): :data:`CLOSED`, :data:`OPEN` or :data:`HALF_OPEN`.
+    """
+
+    def __init__(self, upstream, balancer, settings):
+        self.upstream = upstream
+        self.balancer = balancer
+        self.settings = settings
+        self.state = CLOSED
+        self.lock = threading.Lock()
+        self.width = settings.window / BUCKETS
+        #: rolling window, bucket ``tick % BUCKETS`` counts the requests of
+        #: the ``tick`` th slice of ``width`` seconds
+        self.ticks = [-1] * BUCKETS
+        self.requests = [0] * BUCKETS
+        self.failures = [0] * BUCKETS
+        self.slow = [0] * BUCKETS
+        #: half-open probes in flight and successes so far
+        self.probing = 0
+        self.successes = 0
+        #: times the breaker opened, numbering the half-open periods
+        self.opened = 0
+
+    def admit(self):
+        """
+        Admits a request to the upstream, if it may be sent; a half-open
+        breaker admits it as a probe.
+
+        :rtype int: ``None`` while open, or half-open with every probe
+            taken; else the half-open period of a probe, or 0 for a
+            request that is no probe.
+        """
+        if self.state is CLOSED:
+            return 0
+        with self.lock:
+            if self.state is HALF_OPEN and self.probing < self.settings.probes:
+                self.probing += 1
+                return self.opened
+            return 0 if self.state is CLOSED else None
+
+    def allow(self):
+        """
+        Tells whether a request may be sent to the upstream; a half-open
+        breaker counts the request as a probe.
+
+        :rtype bool: False while open, or half-open with every probe taken.
+        """
+        return self.admit() is not None
+
+    def record(self, ok, latency=0.0, now=None, probe=0):
+        """
+        Records the outcome of a request sent to the upstream.
+
+        :param ok (bool): False for a connect error, a timeout, a broken
+            response or a 5xx status.
+        :param latency (float): seconds until the response head.
+        :param probe (int): what :meth:`admit` returned for the request.
+        """
+        with self.lock:
+            changed = self._record(ok, latency, now, probe)
+        # The balancer lock is taken after the breaker lock is released,
+        # choosing an upstream takes them in the other order
+        if changed:
+            self.balancer.refresh()
+
+    def _record(self, ok, latency, now, probe):
+        settings = self.settings
+        slow = settings.slow and latency >= settings.slow
+        if self.state is HALF_OPEN:
+            if probe != self.opened:
+                # Sent before the breaker opened, or a probe of an earlier
+                # half-open period
+                return False
+            self.probing -= 1
+            if not ok or slow:
+                return self._open()
+            self.successes += 1
+            if self.successes >= settings.probes:
+                self.state = CLOSED
+                self.probing = 0
+                print("[Breaker] Closing {}".format(self.upstream.address))
+                return True
+            return False
+        if self.state is OPEN:
+            return False
+        if now is None:
+            now = time.monotonic()
+        tick = int(now / self.width)
+        i = tick % BUCKETS
+        if self.ticks[i] != tick:
+            self.ticks[i] = tick
+            self.requests[i] = self.failures[i] = self.slow[i] = 0
+        self.requests[i] += 1
+        if ok and not slow:
+            return False
+        if not ok:
+            self.failures[i] += 1
+        if slow:
+            self.slow[i] += 1
+        requests = failures = slow_count = 0
+        for j in range(BUCKETS):
+            if tick - self.ticks[j] < BUCKETS:
+                requests += self.requests[j]
+                failures += self.failures[j]
+                slow_count += self.slow[j]
+        if requests >= settings.min_requests and (
+                failures >= settings.error_rate * requests
+                or (settings.slow and slow_count >= settings.slow_rate * requests)):
+            print("[Breaker] Opening {}: {} failed and {} slow of {} requests".format(
+                self.upstream.address, failures, slow_count, requests))
+            return self._open()
+        return False
+
+    def cancel(self, probe=0):
+        """Gives back the probe of a request abandoned without outcome.
+
+        :param probe (int): what :meth:`admit` returned for the request.
+        """
+        with self.lock:
+            if self.state is HALF_OPEN and probe == self.opened:
+                self.probing -= 1
+
+    def _open(self):
+        self.state = OPEN
+        self.opened += 1
+        self.probing = self.successes = 0
+        for j in range(BUCKETS):
+            self.ticks[j] = -1
+        timer = threading.Timer(self.settings.open, self._half_open)
+        timer.daemon = True
+        timer.start()
+        return True
+
+    def _half_open(self):
+        with self.lock:
+            if self.state is not OPEN:
+                return
+            self.state = HALF_OPEN
+            print("[Breaker] {} is half-open".format(self.upstream.address))
+        self.balancer.refresh()
+
+
+def watch(balancer, settings):
+    """
+    Attaches a circuit breaker to every upstream of ``balancer``.
+
+    :param settings (BreakerSettings): the settings, or ``None`` to leave
+        the upstreams without breaker.
+    """
+    if settings is None:
+        return
+    for upstream in balancer.upstreams:
+        upstream.breaker = CircuitBreaker(upstream, balancer, settings)
+
+
+def allow(upstream):
+    """Tells whether a request may be sent to ``upstream``."""
+    breaker = upstream.breaker
+    return breaker is None or breaker.allow()
+
+
+def record(upstream, ok, latency=0.0, probe=0):
+    """Records the outcome of a request sent to ``upstream``; ``probe`` is
+    what the breaker admitted it as."""
+    breaker = upstream.breaker
+    if breaker is not None:
+        breaker.record(ok, latency, probe=probe)
+
+
+def cancel(upstream, probe=0):
+    """Gives back the probe of a request to ``upstream`` abandoned without
+    outcome."""
+    breaker = upstream.breaker
+    if breaker is not None:
+        breaker.cancel(probe)
@@ -0,0 +1,477 @@
+#
+# Copyright (C) 2025 pdnguyen of HCMC University of Technology VNU-HCM.
+# All rights reserved.
+# This file is part of the CO3093/CO3094 course.
+#
+# WeApRous release
+#
+# The authors hereby grant to Licensee personal permission to use
+# and modify the Licensed Source Code for the sole purpose of studying
+# while attending the course
+#
+
+"""
+daemon.cache
+~~~~~~~~~~~~~~~~~
+
+This module provides the HTTP response cache of the proxy.
+
+Only ``200`` answers to ``GET`` are stored, and only when the upstream
+allows it: no ``no-store`` or ``private``, no ``Set-Cookie``, no
+``Vary: *``, and either a ``max-age``/``s-maxage`` or a validator
+(``ETag`` or ``Last-Modified``) to revalidate with. Responses varying on
+request headers are stored as one variant per combination of the values of
+the ``Vary`` headers.
+
+A stored response is
+
+- fresh for ``s-maxage`` (or ``max-age``) seconds: served from the cache,
+  with a ``304`` when the client already holds it,
+- stale within the following ``stale-while-revalidate`` seconds: still
+  served from the cache while one background request revalidates it, so
+  refreshes do not show in latency,
+- expired afterwards: revalidated with a conditional request before it is
+  served again.
+
+Entries are kept in LRU order within ``max_bytes`` of memory. With a disk
+``directory`` bodies of ``spill_threshold`` bytes or more, and entries
+evicted from memory, are written to files and served from an ``mmap``,
+within ``max_disk_bytes``.
+
+Usage::
+
+  >>> cache = HttpCache(max_bytes=32 << 20, directory='/var/cache/proxy')
+  >>> entry = cache.lookup(key, request_headers)
+  >>> if entry is not None and cache.freshness(entry) == FRESH:
+  ...     cache.serve(entry, conn, 'GET', request_headers)
+"""
+
+import datetime
+import itertools
+import mmap
+import os
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+DEFAULT_MAX_OBJECT_BYTES = 8 * 1024 * 1024
+DEFAULT_MAX_DISK_BYTES = 256 * 1024 * 1024
+DEFAULT_SPILL_THRESHOLD = 256 * 1024
+
+FRESH = 'fresh'
+STALE = 'stale'
+EXPIRED = 'expired'
+
+
+def parse_cache_control(value):
+    """
+    Parses a ``Cache-Control`` header.
+
+    :rtype dict: lower-cased directives to their value, ``True`` for
+                 directives without one.
+    """
+    directives = {}
+    for part in value.split(','):
+        name, sep, arg = part.strip().partition('=')
+        if name:
+            directives[name.lower()] = arg.strip('"') if sep else True
+    return directives
+
+
+def _seconds(directives, name):
+    try:
+        return max(0, int(directives[name]))
+    except (KeyError, ValueError, TypeError):
+        return None
+
+
+def cache_key(host, target):
+    """Returns the cache key of a request for ``target`` on ``host``."""
+    return host.lower() + target
+
+
+def request_bypasses(method, headers):
+    """Tells whether a request must not be answered from the cache."""
+    if method not in ('GET', 'HEAD'):
+        return True
+    if 'authorization' in headers or 'range' in headers:
+        return True
+    return 'no-store' in parse_cache_control(headers.get('cache-control', ''))
+
+
+def request_revalidates(headers):
+    """Tells whether a request asks for a revalidated response."""
+    directives = parse_cache_control(headers.get('cache-control', ''))
+    return ('no-cache' in directives or _seconds(directives, 'max-age') == 0
+            or headers.get('pragma', '').lower() == 'no-cache')
+
+
+def storable(method, status, headers, max_object_bytes):
+    """
+    Tells whether a response may be stored.
+
+    :param headers (dict): lower-cased response headers.
+
+    :rtype bool: True if the response can be cached.
+    """
+    if method != 'GET' or status != 200 or 'set-cookie' in headers:
+        return False
+    directives = parse_cache_control(headers.get('cache-control', ''))
+    if 'no-store' in directives or 'private' in directives:
+        return False
+    if headers.get('vary', '').strip() == '*':
+        return False
+    try:
+        length = int(headers['content-length'])
+    except (KeyError, ValueError):
+        return False
+    if length > max_object_bytes:
+        return False
+    has_lifetime = (_seconds(directives, 's-maxage') is not None
+                    or _seconds(directives, 'max-age') is not None)
+    return has_lifetime or 'etag' in headers or 'last-modified' in headers
+
+
+def _vary(request_headers, response_headers):
+    names = [name.strip().lower() for name in response_headers.get('vary', '').split(',')]
+    return tuple((name, request_headers.get(name, '')) for name in sorted(names) if name)
+
+
+def _strip_head(head, names):
+    lines = [line for line in head.split(b"\r\n")
+             if line.split(b":", 1)[0].strip().lower() not in names]
+    return b"\r\n".join(lines)
+
+
+#: Response headers of the upstream not kept in a stored head.
+HOP_HEADERS = (b"connection", b"keep-alive", b"age", b"transfer-encoding")
+
+
+class CacheEntry:
+    """The :class:`CacheEntry <CacheEntry>` object is one stored response.
+
+    :attrs key (str): cache key.
+    :attrs vary (tuple): ``(header, value)`` pairs of the request the
+        response varies on.
+    :attrs head (bytes): response head, without the final blank line and
+        hop-by-hop headers.
+    :attrs body (bytes or mmap.mmap): response body.
+    :attrs path (str): file holding the body when spilled to disk.
+    :attrs request_head (bytes): request that fetched the response, sent
+        again with conditional headers to revalidate it.
+    :attrs etag (str): ``ETag`` of the response, or ``None``.
+    :attrs last_modified (str): ``Last-Modified`` of the response, or
+        ``None``.
+    :attrs fresh_until (float): end of the freshness lifetime.
+    :attrs stale_until (float): end of the stale-while-revalidate window.
+    :attrs revalidating (bool): True while a revalidation is running.
+    """
+
+    __slots__ = ("id", "key", "vary", "head", "body", "size", "path", "request_head",
+                 "etag", "last_modified", "stored", "fresh_until", "stale_until",
+                 "cache_control", "revalidating")
+
+    def __init__(self, id, key, vary, head, body, request_head):
+        self.id = id
+        self.key = key
+        self.vary = vary
+        self.head = head
+        self.body = body
+        self.size = len(body)
+        self.path = None
+        self.request_head = request_head
+        self.etag = None
+        self.last_modified = None
+        self.stored = 0.0
+        self.fresh_until = 0.0
+        self.stale_until = 0.0
+        self.cache_control = ''
+        self.revalidating = False
+
+    def update(self, headers, now):
+        """Recomputes validators and lifetime from response headers."""
+        self.etag = headers.get('etag', self.etag)
+        self.last_modified = headers.get('last-modified', self.last_modified)
+        self.cache_control = headers.get('cache-control', self.cache_control)
+        directives = parse_cache_control(self.cache_control)
+        lifetime = _seconds(directives, 's-maxage')
+        if lifetime is None:
+            lifetime = _seconds(directives, 'max-age') or 0
+        if 'no-cache' in directives:
+            lifetime = 0
+        try:
+            age = int(headers.get('age', 0))
+        except ValueError:
+            age = 0
+        self.stored = now - age
+        self.fresh_until = self.stored + lifetime
+        window = 0 if 'must-revalidate' in directives else \
+            _seconds(directives, 'stale-while-revalidate') or 0
+        self.stale_until = self.fresh_until + window
+
+
+class HttpCache:
+    """The :class:`HttpCache <HttpCache>` object stores proxied responses.
+
+    :attrs max_bytes (int): memory held by bodies and heads at most.
+    :attrs max_object_bytes (int): largest body stored.
+    :attrs directory (str): directory bodies spill to, or ``None``.
+    :attrs max_disk_bytes (int): disk held by spilled bodies at most.
+    :attrs spill_threshold (int): bodies of this size go to disk directly.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, max_object_bytes=DEFAULT_MAX_OBJECT_BYTES,
+                 directory=None, max_disk_bytes=DEFAULT_MAX_DISK_BYTES,
+                 spill_threshold=DEFAULT_SPILL_THRESHOLD):
+        self.max_bytes = max_bytes
+        self.max_object_bytes = max_object_bytes
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.spill_threshold = spill_threshold
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+        #: key to the list of its variants
+        self.variants = {}
+        #: LRU orders of entries held in memory and on disk, by entry id
+        self.memory = OrderedDict()
+        self.disk = OrderedDict()
+        self.memory_bytes = 0
+        self.disk_bytes = 0
+        self.ids = itertools.count(1)
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+
+    def __len__(self):
+        return len(self.memory) + len(self.disk)
+
+    def lookup(self, key, request_headers):
+        """
+        Finds the stored variant of a request.
+
+        :rtype CacheEntry: the entry, or ``None``.
+        """
+        with self.lock:
+            for entry in self.variants.get(key, ()):
+                if all(request_headers.get(name, '') == value for name, value in entry.vary):
+                    # An entry being spilled is in neither order for a moment
+                    for lru in (self.memory, self.disk):
+                        if entry.id in lru:
+                            lru.move_to_end(entry.id)
+                    return entry
+            self.misses += 1
+            return None
+
+    def freshness(self, entry, now=None):
+        """
+        Returns :data:`FRESH`, :data:`STALE` (servable while revalidating)
+        or :data:`EXPIRED`.
+        """
+        if now is None:
+            now = time.time()
+        if now < entry.fresh_until:
+            return FRESH
+        if now < entry.stale_until:
+            return STALE
+        return EXPIRED
+
+    def claim_revalidation(self, entry):
+        """Marks ``entry`` as being revalidated; False if it already is."""
+        with self.lock:
+            if entry.revalidating:
+                return False
+            entry.revalidating = True
+            self.revalidations += 1
+            return True
+
+    def refresh(self, entry, headers, now=None):
+        """Renews ``entry`` after a ``304`` answer to its revalidation."""
+        with self.lock:
+            entry.update(headers, time.time() if now is None else now)
+            entry.revalidating = False
+
+    def release_revalidation(self, entry):
+        with self.lock:
+            entry.revalidating = False
+
+    def store(self, key, request_head, request_headers, response_head, response_headers, body,
+              now=None):
+        """
+        Stores a response, replacing the variant it updates.
+
+        :param response_head (bytes): head as received, with its blank line.
+        :param body (bytes): the whole body.
+
+        :rtype CacheEntry: the entry, or ``None`` if the response is too large.
+        """
+        if len(body) > self.max_object_bytes:
+            return None
+        head = _strip_head(response_head[:-4], HOP_HEADERS)
+        vary = _vary(request_headers, response_headers)
+        entry = CacheEntry(next(self.ids), key, vary, head, body, request_head)
+        entry.update(response_headers, time.time() if now is None else now)
+        if self.directory and len(body) >= self.spill_threshold:
+            self._spill(entry)
+        with self.lock:
+            variants = self.variants.setdefault(key, [])
+            for old in [v for v in variants if v.vary == vary]:
+                self._remove(old)
+            variants.append(entry)
+            if entry.path:
+                self.disk[entry.id] = entry
+                self.disk_bytes += entry.size
+            else:
+                self.memory[entry.id] = entry
+                self.memory_bytes += entry.size + len(entry.head)
+            evicted = self._evict()
+        for old in evicted:
+            self._spill_or_drop(old)
+        return entry
+
+    def _spill(self, entry):
+        """Moves the body of ``entry`` to a file mapped in memory."""
+        path = os.path.join(self.directory, "{}.body".format(entry.id))
+        with open(path, 'wb') as f:
+            f.write(entry.body)
+        if entry.size:
+            with open(path, 'rb') as f:
+                entry.body = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        entry.path = path
+
+    def _evict(self):
+        """Takes least recently used entries out of memory, returned to be
+        spilled or dropped outside the lock."""
+        evicted = []
+        while self.memory_bytes > self.max_bytes and self.memory:
+            _, entry = self.memory.popitem(last=False)
+            self.memory_bytes -= entry.size + len(entry.head)
+            evicted.append(entry)
+        while self.disk_bytes > self.max_disk_bytes and self.disk:
+            _, entry = self.disk.popitem(last=False)
+            self.disk_bytes -= entry.size
+            self._unlink(entry)
+        return evicted
+
+    def _spill_or_drop(self, entry):
+        if not self.directory or entry.size < 1:
+            with self.lock:
+                self._forget(entry)
+            return
+        self._spill(entry)
+        with self.lock:
+            if entry in self.variants.get(entry.key, ()):
+                self.disk[entry.id] = entry
+                self.disk_bytes += entry.size
+                self._evict()
+            else:
+                self._unlink(entry)
+
+    def _forget(self, entry):
+        variants = self.variants.get(entry.key)
+        if variants and entry in variants:
+            variants.remove(entry)
+            if not variants:
+                del self.variants[entry.key]
+
+    def _unlink(self, entry):
+        self._forget(entry)
+        if entry.path:
+            try:
+                os.unlink(entry.path)
+            except OSError:
+                pass
+            try:
+                entry.body.close()
+            except (BufferError, AttributeError):
+                # Still being sent, the mapping goes with the last view
+                pass
+
+    def _remove(self, entry):
+        if self.memory.pop(entry.id, None) is not None:
+            self.memory_bytes -= entry.size + len(entry.head)
+            self._forget(entry)
+        elif self.disk.pop(entry.id, None) is not None:
+            self.disk_bytes -= entry.size
+            self._unlink(entry)
+
+    def conditional_head(self, entry, head=None):
+        """
+        Returns the request head revalidating ``entry``.
+
+        :param head (bytes): request to send, the request stored with the
+            entry by default.
+
+        :rtype bytes: the request head with the client conditionals
+                      replaced by the validators of the entry.
+        """
+        head = _strip_head((head or entry.request_head)[:-4],
+                           (b"if-none-match", b"if-modified-since", b"cache-control", b"pragma"))
+        if entry.etag:
+            head += "\r\nIf-None-Match: {}".format(entry.etag).encode('latin-1')
+        if entry.last_modified:
+            head += "\r\nIf-Modified-Since: {}".format(entry.last_modified).encode('latin-1')
+        return head + b"\r\n\r\n"
+
+    def serve(self, entry, conn, method, request_headers, now=None):
+        """
+        Sends a stored response, or a ``304`` when the client validators
+        match it.
+
+        :param conn (socket.socket): client connection socket.
+        :param method (str): ``GET`` or ``HEAD``.
+        :param request_headers (dict): lower-cased request headers.
+
+        :rtype int: status code sent.
+        """
+        if now is None:
+            now = time.time()
+        with self.lock:
+            self.hits += 1
+        extra = "\r\nAge: {}\r\nX-Cache: HIT\r\nConnection: close\r\n\r\n".format(
+            max(0, int(now - entry.stored))).encode('latin-1')
+        if_none_match = request_headers.get('if-none-match')
+        if if_none_match is not None:
+            not_modified = entry.etag is not None and (
+                if_none_match.strip() == '*' or entry.etag in if_none_match)
+        else:
+            not_modified = (entry.last_modified is not None and
+                            request_headers.get('if-modified-since') == entry.last_modified)
+        if not_modified:
+            head = "HTTP/1.1 304 Not Modified\r\nDate: {}\r\nCache-Control: {}".format(
+                datetime.datetime.utcnow().strftime("%a, %d %b %Y %H:%M:%S GMT"),
+                entry.cache_control)
+            if entry.etag:
+                head += "\r\nETag: {}".format(entry.etag)
+            conn.sendall(head.encode('latin-1') + extra)
+            return 304
+        if method == 'HEAD':
+            conn.sendall(entry.head + extra)
+            return 200
+        with self.lock:
+            # A view keeps a spilled body mapped even if it gets evicted
+            view = memoryview(entry.body)
+        try:
+            if entry.size <= 16 * 1024:
+                conn.sendall(entry.head + extra + view)
+            else:
+                conn.sendall(entry.head + extra)
+                conn.sendall(view)
+        finally:
+            view.release()
+        return 200
+
+    def stats(self):
+        """
+        Returns cache counters.
+
+        :rtype dict: entries and bytes in memory and on disk, responses
+                     served from the cache, lookups that found nothing and
+                     revalidations.
+        """
+        with self.lock:
+            return {'memory_entries': len(self.memory), 'memory_bytes': self.memory_bytes,
+                    'disk_entries': len(self.disk), 'disk_bytes': self.disk_bytes,
+                    'hits': self.hits, 'misses': self.misses,
+                    'revalidations': self.revalidations}
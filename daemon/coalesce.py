@@ -0,0 +1,272 @@
+#
+# Copyright (C) 2025 pdnguyen of HCMC University of Technology VNU-HCM.
+# All rights reserved.
+# This file is part of the CO3093/CO3094 course.
+#
+# WeApRous release
+#
+# The authors hereby grant to Licensee personal permission to use
+# and modify the Licensed Source Code for the sole purpose of studying
+# while attending the course
+#
+
+"""
+daemon.coalesce
+~~~~~~~~~~~~~~~~~
+
+This module provides request coalescing (single-flight) for the proxy.
+
+Identical ``GET`` requests arriving while one of them is being fetched
+share that fetch: the first request, the leader, goes upstream, and the
+response bytes are fanned out to every later request, the followers, as
+they arrive. A refresh storm of ``n`` clients costs the upstream one
+request instead of ``n``.
+
+Requests are identical when their method, host, target (path and query)
+and the values of the configured ``headers`` are; requests with
+credentials, cookies, ranges or conditions are not coalesced. Responses are only
+shared when their length is known and at most ``max_size`` bytes, and
+when they set no cookie; otherwise the followers fetch on their own. A
+leader that fails before its response started fails its followers too,
+rather than letting them all hit a failing upstream.
+
+Opt-in per host or location block::
+
+    location /get-list {
+        proxy_pass http://127.0.0.1:9000;
+        proxy_coalesce headers=accept,accept-encoding max_size=1048576;
+    }
+
+Usage::
+
+  >>> flight, leader = coalescer.join(key)
+  >>> if not leader:
+  ...     status = follow(flight, conn, timeout)
+"""
+
+import socket
+import threading
+
+from .relay import FRAMING_LENGTH, FRAMING_NONE
+
+DEFAULT_MAX_SIZE = 1024 * 1024
+
+#: Request headers making the response depend on the client; requests with
+#: one of them are not coalesced unless it is part of the key.
+PRIVATE_HEADERS = ('authorization', 'cookie', 'range', 'if-none-match',
+                   'if-modified-since', 'if-match', 'if-unmodified-since',
+                   'if-range')
+
+
+class Flight:
+    """The :class:`Flight <Flight>` object is one upstream fetch shared by
+    identical requests.
+
+    Bytes sent to the leader client, the response head included, are kept
+    in ``data``; followers send them on as ``data`` grows.
+
+    :attrs key (tuple): the request key.
+    :attrs group (SingleFlight): tracker of the flight.
+    :attrs status (int): response status, once the head arrived.
+    :attrs shared (bool): True once the response is known to be shared,
+        False if the followers must fetch on their own, ``None`` before
+        the response head.
+    :attrs finished (bool): True once the response was read whole.
+    :attrs failed (bool): True if the fetch failed.
+    """
+
+    __slots__ = ("key", "group", "cond", "data", "status", "shared", "finished",
+                 "failed")
+
+    def __init__(self, key, group):
+        self.key = key
+        self.group = group
+        self.cond = threading.Condition()
+        self.data = bytearray()
+        self.status = 0
+        self.shared = None
+        self.finished = False
+        self.failed = False
+
+    def accept(self, status, response_headers, framing):
+        """
+        Decides, once the leader has the response head, whether the
+        response is shared with the followers.
+
+        :rtype bool: True if the response is shared.
+        """
+        kind, length = framing
+        if 'set-cookie' in response_headers or not (
+                kind == FRAMING_NONE or (kind == FRAMING_LENGTH
+                                         and length <= self.group.max_size)):
+            self.decline()
+            return False
+        with self.cond:
+            self.status = status
+            self.shared = True
+            self.cond.notify_all()
+        return True
+
+    def decline(self):
+        """Sends the followers to fetch on their own; later identical
+        requests start a new flight."""
+        self.group.leave(self)
+        with self.cond:
+            self.shared = False
+            self.cond.notify_all()
+
+    def finish(self, failed=False):
+        """Ends the fetch of the leader, ``failed`` if it broke off."""
+        self.group.leave(self)
+        with self.cond:
+            if self.shared is None:
+                self.shared = False
+                failed = True
+            self.failed = self.failed or failed
+            self.finished = True
+            self.cond.notify_all()
+
+
+class FlightWriter:
+    """Socket stand-in of the leader: relays to the leader client and keeps
+    the bytes for the followers. A leader client that went away no longer
+    gets bytes, the response is still read for the followers."""
+
+    __slots__ = ("conn", "flight")
+
+    def __init__(self, conn, flight):
+        self.conn = conn
+        self.flight = flight
+
+    def sendall(self, data):
+        flight = self.flight
+        with flight.cond:
+            flight.data += data
+            flight.cond.notify_all()
+        if self.conn is not None:
+            try:
+                self.conn.sendall(data)
+            except socket.error as e:
+                print("[Coalesce] Leader client gone, still serving followers: {}".format(e))
+                self.conn = None
+
+
+class SingleFlight:
+    """The :class:`SingleFlight <SingleFlight>` object tracks the fetches
+    in flight of a block.
+
+    :attrs headers (tuple): lower-cased request headers part of the key.
+    :attrs max_size (int): largest response body shared.
+    """
+
+    def __init__(self, headers=(), max_size=DEFAULT_MAX_SIZE):
+        if max_size < 0:
+            raise ValueError("Invalid proxy_coalesce settings")
+        self.headers = tuple(name.strip().lower() for name in headers if name.strip())
+        self.max_size = int(max_size)
+        self.lock = threading.Lock()
+        self.flights = {}
+        self.leaders = 0
+        self.followers = 0
+
+    def key(self, method, host, target, request_headers):
+        """
+        Returns the key of a request.
+
+        :rtype tuple: the key, or ``None`` if the request carries one of
+                      the :data:`PRIVATE_HEADERS` outside the key.
+        """
+        for name in PRIVATE_HEADERS:
+            if name in request_headers and name not in self.headers:
+                return None
+        return (method, host.lower(), target) + tuple(
+            request_headers.get(name, '') for name in self.headers)
+
+    def join(self, key):
+        """
+        Joins the fetch of ``key`` in flight, or starts one.
+
+        :rtype tuple: (:class:`Flight`, True if the caller leads it).
+        """
+        with self.lock:
+            flight = self.flights.get(key)
+            if flight is not None:
+                self.followers += 1
+                return flight, False
+            flight = self.flights[key] = Flight(key, self)
+            self.leaders += 1
+            return flight, True
+
+    def leave(self, flight):
+        """Stops later requests from joining ``flight``."""
+        with self.lock:
+            if self.flights.get(flight.key) is flight:
+                del self.flights[flight.key]
+
+    def stats(self):
+        """
+        Returns coalescing counters.
+
+        :rtype dict: fetches in flight, requests that led a fetch and
+                     requests that followed one.
+        """
+        with self.lock:
+            return {'in_flight': len(self.flights), 'leaders': self.leaders,
+                    'followers': self.followers}
+
+
+def parse_coalesce(args):
+    """
+    Builds the single-flight tracker of a ``proxy_coalesce`` line.
+
+    :param args (list): ``on``, ``off`` or ``key=value`` options among
+        ``headers`` (comma separated) and ``max_size``.
+
+    :rtype SingleFlight: the tracker, or ``None`` for ``off``.
+    """
+    if args == ['off']:
+        return None
+    if args == ['on']:
+        args = []
+    options = dict(arg.partition('=')[::2] for arg in args)
+    headers = options.pop('headers', '').split(',')
+    max_size = options.pop('max_size', DEFAULT_MAX_SIZE)
+    if options:
+        raise ValueError("Unknown proxy_coalesce options {}".format(", ".join(options)))
+    return SingleFlight(headers, int(max_size))
+
+
+def follow(flight, conn, timeout):
+    """
+    Sends the response of the fetch of a flight to a follower.
+
+    :param timeout (float): seconds to wait for the response head.
+
+    :raises socket.timeout: If the head did not arrive in time.
+    :raises ValueError: If the fetch failed before its response started.
+
+    :rtype int: status code sent, or ``None`` if the response is not
+                shared and the follower must fetch on its own.
+    """
+    with flight.cond:
+        if not flight.cond.wait_for(lambda: flight.shared is not None, timeout):
+            raise socket.timeout("Coalesced request timed out")
+        if flight.failed and not flight.data:
+            raise ValueError("Coalesced request failed")
+        if not flight.shared:
+            return None
+    sent = 0
+    while True:
+        with flight.cond:
+            flight.cond.wait_for(lambda: len(flight.data) > sent or flight.finished)
+            chunk = bytes(flight.data[sent:])
+            finished = flight.finished
+        if chunk:
+            try:
+                conn.sendall(chunk)
+            except socket.error as e:
+                print("[Coalesce] Follower client gone: {}".format(e))
+                return flight.status
+            sent += len(chunk)
+        elif finished:
+            return flight.status
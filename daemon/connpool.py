@@ -0,0 +1,239 @@
+#
+# Copyright (C) 2025 pdnguyen of HCMC University of Technology VNU-HCM.
+# All rights reserved.
+# This file is part of the CO3093/CO3094 course.
+#
+# WeApRous release
+#
+# The authors hereby grant to Licensee personal permission to use
+# and modify the Licensed Source Code for the sole purpose of studying
+# while attending the course
+#
+
+"""
+daemon.connpool
+~~~~~~~~~~~~~~~~~
+
+This module provides pools of persistent upstream connections for the
+proxy, one pool per backend address.
+
+A request checks a connection out of the pool of its upstream and returns
+it once the response has been read in full, so consecutive requests reuse
+one TCP connection instead of paying a connect and close each. Idle
+connections are kept most recently used first; a connection is dropped when
+
+- more than ``max_idle`` connections are idle,
+- it stayed idle for ``idle_timeout`` seconds, shorter than the backend
+  keep-alive timeout so the proxy never reuses a connection the backend is
+  about to close,
+- it is older than ``max_lifetime`` seconds,
+- or it fails validation on checkout: an idle connection that is readable
+  was either closed by the backend or holds stray bytes.
+
+Usage::
+
+  >>> pool = get_pool('127.0.0.1', 9000)
+  >>> conn, reused = pool.acquire()
+  >>> conn.sock.sendall(request)
+  >>> ...
+  >>> pool.release(conn, reusable=True)
+"""
+
+import select
+import socket
+import threading
+import time
+from collections import deque
+
+DEFAULT_MAX_IDLE = 16
+DEFAULT_IDLE_TIMEOUT = 10.0
+DEFAULT_MAX_LIFETIME = 300.0
+DEFAULT_CONNECT_TIMEOUT = 5.0
+
+#: Settings of pools created by :func:`get_pool`, see :func:`configure`.
+settings = {
+    'max_idle': DEFAULT_MAX_IDLE,
+    'idle_timeout': DEFAULT_IDLE_TIMEOUT,
+    'max_lifetime': DEFAULT_MAX_LIFETIME,
+    'connect_timeout': DEFAULT_CONNECT_TIMEOUT,
+}
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class PooledConnection:
+    """The :class:`PooledConnection <PooledConnection>` object is one
+    upstream socket and its timestamps.
+
+    :attrs sock (socket.socket): connected socket.
+    :attrs created (float): connect time.
+    :attrs last_used (float): time the connection was last returned.
+    :attrs requests (int): requests sent on the connection.
+    :attrs reader (daemon.relay.SocketReader): buffered reader of the
+        socket, kept with the connection so its buffer is reused.
+    """
+
+    __slots__ = ("sock", "created", "last_used", "requests", "reader")
+
+    def __init__(self, sock, now):
+        self.sock = sock
+        self.created = now
+        self.last_used = now
+        self.requests = 0
+        self.reader = None
+
+    def buffered(self):
+        """Tells whether bytes past the last response wait in the reader;
+        they would be read as the head of the next response."""
+        return self.reader is not None and self.reader.buffered() > 0
+
+    def close(self):
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+def is_alive(sock):
+    """Tells whether an idle socket can carry a request: it must not be
+    readable, as that means the peer closed it or sent stray bytes."""
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+    except (OSError, ValueError):
+        return False
+    return not readable
+
+
+class ConnectionPool:
+    """The :class:`ConnectionPool <ConnectionPool>` object keeps the idle
+    connections to one upstream.
+
+    :attrs address (tuple): upstream ``(host, port)``.
+    :attrs max_idle (int): idle connections kept at most, 0 disables reuse.
+    :attrs idle_timeout (float): seconds an idle connection is kept.
+    :attrs max_lifetime (float): seconds a connection is used at most.
+    :attrs connect_timeout (float): timeout of connect.
+    """
+
+    def __init__(self, host, port, max_idle=DEFAULT_MAX_IDLE,
+                 idle_timeout=DEFAULT_IDLE_TIMEOUT, max_lifetime=DEFAULT_MAX_LIFETIME,
+                 connect_timeout=DEFAULT_CONNECT_TIMEOUT):
+        self.address = (host, int(port))
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.connect_timeout = connect_timeout
+        self.lock = threading.Lock()
+        #: idle connections, most recently used last
+        self.idle = deque()
+        self.connects = 0
+        self.reuses = 0
+
+    def _usable(self, conn, now):
+        return (now - conn.last_used < self.idle_timeout
+                and now - conn.created < self.max_lifetime
+                and not conn.buffered()
+                and is_alive(conn.sock))
+
+    def acquire(self, connect_timeout=None):
+        """
+        Checks out an idle connection, or opens a new one.
+
+        :param connect_timeout (float): timeout of connect, the one of the
+            pool by default.
+
+        :raises OSError: If connecting fails.
+
+        :rtype tuple: (:class:`PooledConnection`, True if reused).
+        """
+        now = time.monotonic()
+        while True:
+            with self.lock:
+                conn = self.idle.pop() if self.idle else None
+            if conn is None:
+                break
+            if self._usable(conn, now):
+                with self.lock:
+                    self.reuses += 1
+                conn.requests += 1
+                return conn, True
+            conn.close()
+        sock = socket.create_connection(self.address, timeout=connect_timeout or self.connect_timeout)
+        # The timeout only bounds connect, responses may take their time
+        sock.settimeout(None)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        conn = PooledConnection(sock, now)
+        conn.requests = 1
+        with self.lock:
+            self.connects += 1
+        return conn, False
+
+    def release(self, conn, reusable=True):
+        """
+        Returns a connection after its response has been read.
+
+        :param reusable (bool): False if the response was not read to its
+            end or the upstream asked to close; the connection is closed,
+            as is one with unread bytes left in its reader.
+        """
+        now = time.monotonic()
+        if not reusable or conn.buffered() or now - conn.created >= self.max_lifetime:
+            conn.close()
+            return
+        conn.last_used = now
+        stale = []
+        with self.lock:
+            self.idle.append(conn)
+            while len(self.idle) > self.max_idle:
+                stale.append(self.idle.popleft())
+            # The oldest idle connections are at the head
+            while self.idle and now - self.idle[0].last_used >= self.idle_timeout:
+                stale.append(self.idle.popleft())
+        for conn in stale:
+            conn.close()
+
+    def discard(self, conn):
+        """Closes a connection that failed."""
+        conn.close()
+
+    def close(self):
+        """Closes every idle connection."""
+        with self.lock:
+            idle, self.idle = self.idle, deque()
+        for conn in idle:
+            conn.close()
+
+    def stats(self):
+        """
+        Returns pool counters.
+
+        :rtype dict: idle connections, connects and reuses so far.
+        """
+        with self.lock:
+            return {'idle': len(self.idle), 'connects': self.connects,
+                    'reuses': self.reuses}
+
+
+def configure(**options):
+    """Changes the :data:`settings` of pools created afterwards."""
+    for key, value in options.items():
+        if key not in settings:
+            raise ValueError("Unknown pool setting {}".format(key))
+        settings[key] = value
+
+
+def get_pool(host, port):
+    """
+    Returns the pool of upstream ``host:port``, created on first use.
+
+    :rtype ConnectionPool: the pool.
+    """
+    key = (host, int(port))
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = _pools[key] = ConnectionPool(host, port, **settings)
+    return pool
@@ -0,0 +1,287 @@
+#
+# Copyright (C) 2025 pdnguyen of HCMC University of Technology VNU-HCM.
+# All rights reserved.
+# This file is part of the CO3093/CO3094 course.
+#
+# WeApRous release
+#
+# The authors hereby grant to Licensee personal permission to use
+# and modify the Licensed Source Code for the sole purpose of studying
+# while attending the course
+#
+
+"""
+daemon.health
+~~~~~~~~~~~~~~~~~
+
+This module provides active and passive health checking of the upstreams
+of a proxy host block.
+
+Active checks probe an upstream every ``interval`` seconds with
+``GET <path>``; a 2xx or 3xx answer within ``timeout`` seconds is a
+success. An upstream goes down after ``fall`` consecutive failures and
+comes back after ``rise`` consecutive successes.
+
+Passive checks watch the proxied requests themselves. Within each
+``window`` seconds, once ``min_requests`` requests were sent, an upstream
+whose share of failures (connect errors, broken responses, 5xx statuses)
+reaches ``error_rate`` is ejected for ``eject`` seconds.
+
+A health change rebuilds the tuple of available upstreams of the balancer,
+see :meth:`daemon.balancer.Balancer.refresh`; choosing an upstream does
+not look at health at all. When every upstream is down the balancer uses
+them all anyway, rather than failing every request.
+
+Configured per host block::
+
+    host "app.local:8080" {
+        proxy_pass http://127.0.0.1:9001;
+        proxy_pass http://127.0.0.1:9002;
+        health_check /health interval=5 timeout=1 rise=2 fall=3;
+        passive_check error_rate=0.5 min_requests=5 window=10 eject=30;
+    }
+
+Passive checks are on by default, ``passive_check off;`` disables them.
+Active checks are only run for host blocks with a ``health_check`` line.
+"""
+
+import http.client
+import threading
+import time
+
+
+class ActiveCheck:
+    """Settings of the active checks of a host block.
+
+    :attrs path (str): path probed.
+    :attrs interval (float): seconds between probes.
+    :attrs timeout (float): seconds a probe may take.
+    :attrs rise (int): successes bringing a down upstream back.
+    :attrs fall (int): failures taking an upstream down.
+    """
+
+    def __init__(self, path='/health', interval=5.0, timeout=1.0, rise=2, fall=3):
+        if interval <= 0 or timeout <= 0 or rise < 1 or fall < 1:
+            raise ValueError("Invalid health_check settings")
+        self.path = path
+        self.interval = float(interval)
+        self.timeout = float(timeout)
+        self.rise = int(rise)
+        self.fall = int(fall)
+
+
+class PassiveCheck:
+    """Settings of the outlier ejection of a host block.
+
+    :attrs error_rate (float): share of failed requests ejecting an upstream.
+    :attrs min_requests (int): requests in a window before judging it.
+    :attrs window (float): seconds over which requests are counted.
+    :attrs eject (float): seconds an ejected upstream is left out.
+    """
+
+    def __init__(self, error_rate=0.5, min_requests=5, window=10.0, eject=30.0):
+        if not 0 < error_rate <= 1 or min_requests < 1 or window <= 0 or eject <= 0:
+            raise ValueError("Invalid passive_check settings")
+        self.error_rate = float(error_rate)
+        self.min_requests = int(min_requests)
+        self.window = float(window)
+        self.eject = float(eject)
+
+
+def _options(cls, options):
+    try:
+        return cls(**{key: float(value) for key, value in options.items()})
+    except TypeError as e:
+        raise ValueError("Unknown {} option: {}".format(cls.__name__, e))
+
+
+def parse_active_check(args):
+    """
+    Builds the active check of a ``health_check`` line.
+
+    :param args (list): words after ``health_check``, an optional path
+        then ``key=value`` options.
+
+    :rtype ActiveCheck: the settings.
+    """
+    path = '/health'
+    if args and '=' not in args[0]:
+        path, args = args[0], args[1:]
+    options = dict(arg.partition('=')[::2] for arg in args)
+    check = _options(ActiveCheck, options)
+    check.path = path
+    return check
+
+
+def parse_passive_check(args):
+    """
+    Builds the passive check of a ``passive_check`` line.
+
+    :rtype PassiveCheck: the settings, or ``None`` for ``off``.
+    """
+    if args == ['off']:
+        return None
+    return _options(PassiveCheck, dict(arg.partition('=')[::2] for arg in args))
+
+
+def probe(host, port, path, timeout):
+    """
+    Sends one health probe.
+
+    :rtype bool: True if the upstream answered 2xx or 3xx in time.
+    """
+    conn = http.client.HTTPConnection(host, port, timeout=timeout)
+    try:
+        conn.request('GET', path, headers={'Connection': 'close'})
+        status = conn.getresponse().status
+        return 200 <= status < 400
+    except (OSError, http.client.HTTPException):
+        return False
+    finally:
+        conn.close()
+
+
+class UpstreamHealth:
+    """The :class:`UpstreamHealth <UpstreamHealth>` object tracks the health
+    of one upstream of a balancer.
+
+    :attrs upstream (Upstream): the upstream.
+    :attrs balancer (Balancer): balancer refreshed on health changes.
+    :attrs active (ActiveCheck): active check settings, or ``None``.
+    :attrs passive (PassiveCheck): passive check settings, or ``None``.
+    :attrs up (bool): result of the active checks.
+    :attrs ejected_until (float): end of the current ejection, 0 if none.
+    """
+
+    def __init__(self, upstream, balancer, active=None, passive=None):
+        self.upstream = upstream
+        self.balancer = balancer
+        self.active = active
+        self.passive = passive
+        self.up = True
+        self.ejected_until = 0.0
+        #: consecutive probe results
+        self.successes = 0
+        self.failures = 0
+        #: passive counters of the current window
+        self.window_start = time.monotonic()
+        self.window_requests = 0
+        self.window_failures = 0
+        #: guards the passive counters, the ejection and ``upstream.healthy``
+        #: against concurrent proxied requests and the checker thread
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def _update(self):
+        with self.lock:
+            healthy = self.up and not self.ejected_until
+            changed = healthy != self.upstream.healthy
+            self.upstream.healthy = healthy
+        # The balancer lock is taken after the health lock is released
+        if changed:
+            print("[Health] {} is {}".format(self.upstream.address, "up" if healthy else "down"))
+            self.balancer.refresh()
+
+    def report(self, ok, now=None):
+        """
+        Records the outcome of a proxied request for outlier ejection.
+
+        :param ok (bool): False for a connect error, a broken response or
+            a 5xx status.
+        """
+        passive = self.passive
+        if passive is None:
+            return
+        if now is None:
+            now = time.monotonic()
+        with self.lock:
+            if now - self.window_start >= passive.window:
+                self.window_start = now
+                self.window_requests = self.window_failures = 0
+            self.window_requests += 1
+            if ok:
+                return
+            self.window_failures += 1
+            if (self.ejected_until or self.window_requests < passive.min_requests
+                    or self.window_failures < passive.error_rate * self.window_requests):
+                return
+            print("[Health] Ejecting {}: {} of {} requests failed".format(
+                self.upstream.address, self.window_failures, self.window_requests))
+            self.ejected_until = now + passive.eject
+            self.window_start = now
+            self.window_requests = self.window_failures = 0
+        self._update()
+
+    def check(self, now=None):
+        """Ends an expired ejection and runs one active probe."""
+        if now is None:
+            now = time.monotonic()
+        with self.lock:
+            expired = self.ejected_until and now >= self.ejected_until
+            if expired:
+                self.ejected_until = 0.0
+        if expired:
+            self._update()
+        active = self.active
+        if active is None:
+            return
+        if probe(self.upstream.host, self.upstream.port, active.path, active.timeout):
+            self.successes += 1
+            self.failures = 0
+            if not self.up and self.successes >= active.rise:
+                self.up = True
+        else:
+            self.failures += 1
+            self.successes = 0
+            if self.up and self.failures >= active.fall:
+                self.up = False
+        self._update()
+
+    def _run(self):
+        period = self.active.interval if self.active is not None else 1.0
+        while not self.stopped.wait(period):
+            self.check()
+
+    def start(self):
+        """Starts the background checker of the upstream."""
+        if self.thread is None and (self.active is not None or self.passive is not None):
+            self.thread = threading.Thread(target=self._run, daemon=True,
+                                           name="health-{}".format(self.upstream.address))
+            self.thread.start()
+
+    def stop(self):
+        """Stops the background checker."""
+        self.stopped.set()
+
+
+def watch(balancer, active=None, passive=None):
+    """
+    Attaches health tracking to every upstream of ``balancer``.
+
+    :param active (ActiveCheck): active check settings, or ``None``.
+    :param passive (PassiveCheck): passive check settings, or ``None``.
+    """
+    for upstream in balancer.upstreams:
+        upstream.health = UpstreamHealth(upstream, balancer, active, passive)
+
+
+def start(balancer):
+    """Starts the health checkers of the upstreams of ``balancer``."""
+    for upstream in balancer.upstreams:
+        if upstream.health is not None:
+            upstream.health.start()
+
+
+def stop(balancer):
+    """Stops the health checkers of the upstreams of ``balancer``."""
+    for upstream in balancer.upstreams:
+        if upstream.health is not None:
+            upstream.health.stop()
+
+
+def report(upstream, ok):
+    """Records the outcome of a request proxied to ``upstream``."""
+    health = upstream.health
+    if health is not None:
+        health.report(ok)
@@ -0,0 +1,346 @@
+#
+# Copyright (C) 2025 pdnguyen of HCMC University of Technology VNU-HCM.
+# All rights reserved.
+# This file is part of the CO3093/CO3094 course.
+#
+# WeApRous release
+#
+# The authors hereby grant to Licensee personal permission to use
+# and modify the Licensed Source Code for the sole purpose of studying
+# while attending the course
+#
+
+"""
+daemon.history
+~~~~~~~~~~~~~~~~~
+
+This module provides the :class:`ChannelHistory <ChannelHistory>` object which
+keeps the recent broadcast messages of every chat channel.
+
+Channels are created on the first message sent to them. Messages are stored
+in sequence order together with their sequence numbers, so a page of history
+is located by binary search on a ``before`` or ``after`` cursor and only that
+page is copied.
+
+Each channel retains messages up to a count, a byte size and an age limit.
+The arrays of a channel work as a ring buffer: eviction advances a head
+offset and the dead prefix is only dropped once it is half of the arrays,
+which keeps appends and evictions amortized O(1). A global byte budget
+spans all channels; when it is exceeded, messages are evicted from the
+channel accessed least recently first.
+
+Usage::
+
+  >>> history = ChannelHistory(['general'], limit=100)
+  >>> history.append('general', Message('alice', 'hi', 'broadcast', 'general', seq=1))
+  >>> history.query('general', after=0, limit=50)
+  ([<Message seq=1 broadcast alice>], False)
+"""
+
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+
+from .msgqueue import message_size
+
+DEFAULT_LIMIT = 100
+DEFAULT_MAX_BYTES = 1024 * 1024
+DEFAULT_MAX_TOTAL_BYTES = 64 * 1024 * 1024
+DEFAULT_MAX_CHANNELS = 1024
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+class _Channel:
+    """Messages of one channel, ``seqs[i]``, ``sizes[i]`` and ``times[i]``
+    being the sequence number, size and time of ``messages[i]``. Entries
+    before ``head`` are evicted."""
+
+    __slots__ = ("messages", "seqs", "sizes", "times", "head", "bytes",
+                 "limit", "max_bytes", "max_age")
+
+    def __init__(self, limit, max_bytes, max_age):
+        self.messages = []
+        self.seqs = []
+        self.sizes = []
+        self.times = []
+        self.head = 0
+        self.bytes = 0
+        self.limit = limit
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+
+    def __len__(self):
+        return len(self.seqs) - self.head
+
+    def append(self, seq, msg, size, when):
+        # Keep times ascending so age eviction only looks at the head
+        if self.times and when < self.times[-1]:
+            when = self.times[-1]
+        self.messages.append(msg)
+        self.seqs.append(seq)
+        self.sizes.append(size)
+        self.times.append(when)
+        self.bytes += size
+
+    def pop_oldest(self):
+        """Evicts the oldest message and returns it."""
+        head = self.head
+        msg = self.messages[head]
+        self.bytes -= self.sizes[head]
+        self.messages[head] = None
+        self.head = head + 1
+        if self.head * 2 > len(self.seqs):
+            del self.messages[:self.head]
+            del self.seqs[:self.head]
+            del self.sizes[:self.head]
+            del self.times[:self.head]
+            self.head = 0
+        return msg
+
+    def trim(self, now):
+        """Evicts the messages beyond the retention limits, oldest first,
+        and returns them."""
+        evicted = []
+        while self and (len(self) > self.limit or self.bytes > self.max_bytes):
+            evicted.append(self.pop_oldest())
+        if self.max_age is not None:
+            deadline = now - self.max_age
+            while self and self.times[self.head] < deadline:
+                evicted.append(self.pop_oldest())
+        return evicted
+
+
+class ChannelHistory:
+    """The :class:`ChannelHistory <ChannelHistory>` object maps channel names
+    to their retained messages.
+
+    :attrs limit (int): default number of messages kept per channel.
+    :attrs max_bytes (int): default number of bytes kept per channel.
+    :attrs max_age (float): default seconds a message is kept, ``None`` for
+        no age limit.
+    :attrs retention (dict): channel name to a dict overriding some of
+        ``limit``, ``max_bytes`` and ``max_age``.
+    :attrs max_total_bytes (int): bytes kept over all channels.
+    :attrs max_channels (int): number of channels kept; the least recently
+        used created channel is dropped to make room for a new one.
+    :attrs total_bytes (int): bytes currently kept over all channels.
+    :attrs on_append (function): ``on_append(channel, msg)`` called for each
+        appended message, under the history lock.
+    :attrs on_evict (function): ``on_evict(channel, msg)`` called for each
+        evicted message, oldest first per channel, under the history lock
+        and after the ``on_append`` of that message.
+    """
+
+    def __init__(self, channels=(), limit=DEFAULT_LIMIT, retention=None,
+                 on_append=None, on_evict=None, max_bytes=DEFAULT_MAX_BYTES,
+                 max_age=None, max_total_bytes=DEFAULT_MAX_TOTAL_BYTES,
+                 max_channels=DEFAULT_MAX_CHANNELS):
+        self.lock = threading.Lock()
+        self.limit = limit
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.max_total_bytes = max_total_bytes
+        self.max_channels = max_channels
+        self.total_bytes = 0
+        self.on_append = on_append
+        self.on_evict = on_evict
+        self.retention = {name: dict(limits) for name, limits in (retention or {}).items()}
+        #: Channels that always exist, even when empty
+        self.pinned = set(channels)
+        #: Channel name to :class:`_Channel`, least recently used first
+        self.channels = OrderedDict()
+        for name in channels:
+            self.channels[name] = self._new_channel(name)
+
+    def __contains__(self, channel):
+        return channel in self.channels
+
+    def _new_channel(self, name):
+        limits = self.retention.get(name, {})
+        return _Channel(limits.get('limit', self.limit),
+                        limits.get('max_bytes', self.max_bytes),
+                        limits.get('max_age', self.max_age))
+
+    def configure(self, limit=None, max_bytes=None, max_age=None,
+                  max_total_bytes=None):
+        """Changes the default limits, applied to every channel without an
+        override in ``retention``; ``None`` leaves a limit unchanged."""
+        defaults = {key: value for key, value in
+                    (('limit', limit), ('max_bytes', max_bytes), ('max_age', max_age))
+                    if value is not None}
+        now = time.time()
+        with self.lock:
+            for key, value in defaults.items():
+                setattr(self, key, value)
+            if max_total_bytes is not None:
+                self.max_total_bytes = max_total_bytes
+            for name, history in list(self.channels.items()):
+                overrides = self.retention.get(name, {})
+                for key, value in defaults.items():
+                    if key not in overrides:
+                        setattr(history, key, value)
+                self._trim(name, history, now)
+            self._enforce_budget()
+
+    def set_retention(self, channel, limit=None, max_bytes=None, max_age=None):
+        """Sets the count, byte and age limits of ``channel``; ``None``
+        leaves a limit unchanged."""
+        limits = {key: value for key, value in
+                  (('limit', limit), ('max_bytes', max_bytes), ('max_age', max_age))
+                  if value is not None}
+        with self.lock:
+            self.retention.setdefault(channel, {}).update(limits)
+            history = self.channels.get(channel)
+            if history is None:
+                return
+            for key, value in limits.items():
+                setattr(history, key, value)
+            self._trim(channel, history, time.time())
+
+    def _trim(self, channel, history, now):
+        before = history.bytes
+        evicted = history.trim(now)
+        if evicted:
+            self.total_bytes -= before - history.bytes
+            if self.on_evict is not None:
+                for msg in evicted:
+                    self.on_evict(channel, msg)
+
+    def _drop_channel(self, channel):
+        history = self.channels.pop(channel)
+        self.total_bytes -= history.bytes
+        if self.on_evict is not None:
+            for i in range(history.head, len(history.seqs)):
+                self.on_evict(channel, history.messages[i])
+
+    def _enforce_budget(self):
+        """Evicts from the least recently used channels until the global
+        budget is met."""
+        while self.total_bytes > self.max_total_bytes:
+            name, history = next(iter(self.channels.items()))
+            if not history:
+                if name in self.pinned:
+                    self.channels.move_to_end(name)
+                else:
+                    del self.channels[name]
+                continue
+            size = history.sizes[history.head]
+            msg = history.pop_oldest()
+            self.total_bytes -= size
+            if self.on_evict is not None:
+                self.on_evict(name, msg)
+
+    def append(self, channel, msg):
+        """
+        Appends a sequenced :class:`daemon.message.Message` to ``channel``,
+        creating the channel if needed.
+        """
+        size = message_size(msg)
+        now = time.time()
+        with self.lock:
+            history = self.channels.get(channel)
+            if history is None:
+                if len(self.channels) >= self.max_channels:
+                    coldest = next((name for name in self.channels
+                                    if name not in self.pinned), None)
+                    if coldest is not None:
+                        self._drop_channel(coldest)
+                history = self.channels[channel] = self._new_channel(channel)
+            else:
+                self.channels.move_to_end(channel)
+            history.append(msg.seq, msg, size, msg.timestamp)
+            self.total_bytes += size
+            if self.on_append is not None:
+                self.on_append(channel, msg)
+            self._trim(channel, history, now)
+            self._enforce_budget()
+
+    def load(self, channel, msgs):
+        """Appends already sequenced messages, oldest first, to ``channel``."""
+        for msg in msgs:
+            self.append(channel, msg)
+
+    def lookup(self, channel, seqs):
+        """
+        Returns the retained messages of ``channel`` with the given sequence
+        numbers, in the order of ``seqs``; evicted ones are skipped.
+        """
+        with self.lock:
+            history = self.channels.get(channel)
+            if history is None:
+                return []
+            found = []
+            for seq in seqs:
+                i = bisect_left(history.seqs, seq, history.head)
+                if i < len(history.seqs) and history.seqs[i] == seq:
+                    found.append(history.messages[i])
+            return found
+
+    def floor(self, channel):
+        """
+        Returns the lowest sequence number kept for ``channel``.
+
+        :rtype int: sequence number, or ``None`` if nothing is kept.
+        """
+        with self.lock:
+            history = self.channels.get(channel)
+            if not history:
+                return None
+            return history.seqs[history.head]
+
+    def query(self, channel, before=None, after=None, limit=DEFAULT_PAGE_SIZE):
+        """
+        Returns one page of history.
+
+        With ``after``, the oldest ``limit`` messages newer than the cursor
+        are returned; otherwise the newest ``limit`` messages older than
+        ``before`` (or the newest overall). Pages are in sequence order.
+
+        :param channel (str): channel name.
+        :param before (int): exclusive upper sequence cursor.
+        :param after (int): exclusive lower sequence cursor.
+        :param limit (int): page size, capped at :data:`MAX_PAGE_SIZE`.
+
+        :rtype tuple: (list of messages, whether more messages exist
+                       beyond the page in the paging direction).
+        """
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        with self.lock:
+            history = self.channels.get(channel)
+            if history is None:
+                return [], False
+            self.channels.move_to_end(channel)
+            # Age limits are also enforced on read for idle channels
+            self._trim(channel, history, time.time())
+            seqs = history.seqs
+            lo = history.head
+            hi = len(seqs)
+            if after is not None:
+                lo = bisect_right(seqs, after, lo, hi)
+            if before is not None:
+                hi = bisect_left(seqs, before, lo, hi)
+            if after is not None:
+                end = min(hi, lo + limit)
+                return history.messages[lo:end], end < hi
+            start = max(lo, hi - limit)
+            return history.messages[start:hi], start > lo
+
+    def stats(self):
+        """
+        Returns per-channel message counts, sizes and sequence ranges,
+        least recently used channel first.
+
+        :rtype dict: totals and channel name to accounting.
+        """
+        with self.lock:
+            return {"total_bytes": self.total_bytes,
+                    "max_total_bytes": self.max_total_bytes,
+                    "channels": {name: {"messages": len(history), "bytes": history.bytes,
+                                        "limit": history.limit,
+                                        "max_bytes": history.max_bytes,
+                                        "max_age": history.max_age,
+                                        "first_seq": history.seqs[history.head] if history else None,
+                                        "last_seq": history.seqs[-1] if history else None}
+                                 for name, history in self.channels.items()}}
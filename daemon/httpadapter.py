@@ -20,10 +20,55 @@ raw URL paths and RESTful route definitions, and integrates with
 Request and Response objects to handle client-server communication.
 """
 
+import math
+import socket
+
 from .request import Request
-from .response import Response
+from .response import (Response, Payload, BadRequest, dumps, set_connection,
+                       PRIVATE_CACHE_CONTROL)
 from .dictionary import CaseInsensitiveDict
 
+#: Upper bounds on the size of an incoming request.
+MAX_HEADER_BYTES = 64 * 1024
+MAX_BODY_BYTES = 1024 * 1024
+
+#: Answers to a request whose body is not read, the connection is closed.
+PAYLOAD_TOO_LARGE = (
+    "HTTP/1.1 413 Payload Too Large\r\n"
+    "Content-Type: text/plain\r\n"
+    "Content-Length: 21\r\n"
+    "Connection: close\r\n"
+    "\r\n"
+    "413 Payload Too Large"
+).encode("utf-8")
+BAD_REQUEST = (
+    "HTTP/1.1 400 Bad Request\r\n"
+    "Content-Type: text/plain\r\n"
+    "Content-Length: 15\r\n"
+    "Connection: close\r\n"
+    "\r\n"
+    "400 Bad Request"
+).encode("utf-8")
+
+#: Seconds an idle keep-alive connection is kept open.
+KEEPALIVE_TIMEOUT = 15.0
+#: Requests served on one connection before it is closed.
+MAX_KEEPALIVE_REQUESTS = 1000
+
+#: Non ``text/*`` content types whose bodies are handed to routes as text.
+TEXT_CONTENT_TYPES = ("application/x-www-form-urlencoded", "application/json")
+
+
+def is_text_type(content_type):
+    """
+    Tells whether a request body of ``content_type`` is text. Requests
+    without a content type are treated as text.
+
+    :rtype bool: ``False`` for binary content types.
+    """
+    kind = content_type.split(";", 1)[0].strip().lower()
+    return not kind or kind.startswith("text/") or kind in TEXT_CONTENT_TYPES
+
 class HttpAdapter:
     """
     A mutable :class:`HTTP adapter <HTTP adapter>` for managing client connections
@@ -84,9 +129,10 @@ class HttpAdapter:
         """
         Handle an incoming client connection.
 
-        This method reads the request from the socket, prepares the request object,
-        invokes the appropriate route handler if available, builds the response,
-        and sends it back to the client.
+        Requests are served one after the other while the client keeps the
+        connection alive (HTTP/1.1 unless ``Connection: close``), so a
+        proxy or browser pays for the TCP handshake once. An idle
+        connection is closed after :data:`KEEPALIVE_TIMEOUT` seconds.
 
         :param conn (socket): The client socket connection.
         :param addr (tuple): The client's address.
@@ -97,6 +143,50 @@ class HttpAdapter:
         self.conn = conn        
         # Connection address.
         self.connaddr = addr
+        # Bytes received past the end of the previous request
+        self.pending = b""
+
+        served = 0
+        keep_alive = True
+        while keep_alive:
+            raw = self.receive(conn)
+            if not raw:
+                break
+            served += 1
+            self.request = Request()
+            self.response = Response()
+            keep_alive = self.handle_request(conn, addr, routes, raw,
+                                             served < MAX_KEEPALIVE_REQUESTS)
+            conn.settimeout(KEEPALIVE_TIMEOUT)
+        try:
+            conn.close()
+        except OSError:
+            pass
+
+    def wants_keep_alive(self, req):
+        """Tells whether the client asked to keep the connection open."""
+        connection = req.headers.get('connection', '').lower()
+        if req.version == 'HTTP/1.1':
+            return 'close' not in connection
+        return 'keep-alive' in connection
+
+    def handle_request(self, conn, addr, routes, raw, keep_alive=True):
+        """
+        Handle one request of a client connection.
+
+        This method prepares the request object from the raw request,
+        invokes the appropriate route handler if available, builds the
+        response, and sends it back to the client.
+
+        :param conn (socket): The client socket connection.
+        :param addr (tuple): The client's address.
+        :param routes (dict): The route mapping for dispatching requests.
+        :param raw (bytes): The raw request message.
+        :param keep_alive (bool): Whether the connection may stay open.
+
+        :rtype bool: True if the connection stays open for another request.
+        """
+
         # Request handler
         req = self.request
         # Response handler
@@ -104,28 +194,24 @@ class HttpAdapter:
 
         try:
             # Handle the request
-            msg = conn.recv(1024).decode()
-            req.prepare(msg, routes)
+            req.prepare(raw.decode('utf-8', errors='replace'), routes)
+            req.raw_body = raw.partition(b"\r\n\r\n")[2]
+            req.remote_addr = addr[0] if addr else None
             
             # Check if request parsing failed
             if req.method is None or req.path is None:
                 print("[HttpAdapter] Invalid request received, closing connection")
-                conn.close()
-                return
+                return False
+
+            # Requests over the rate limit of their route are refused
+            # without calling the handler
+            limiter = getattr(req.hook, '_route_rate_limit', None)
+            retry_after = limiter.check(req) if limiter is not None else 0.0
 
             # Task 1A: Handle /login POST with authentication (Multi-user support)
             if req.method == 'POST' and req.path == '/login':
-                # Parse form data from body
-                username = None
-                password = None
-                if req.body:
-                    for param in req.body.split('&'):
-                        if '=' in param:
-                            key, value = param.split('=', 1)
-                            if key == 'username':
-                                username = value
-                            elif key == 'password':
-                                password = value
+                username = req.form.get('username')
+                password = req.form.get('password')
                 
                 # Load users from database
                 import json
@@ -170,17 +256,8 @@ class HttpAdapter:
             
             # NEW: Handle /register POST - User registration
             elif req.method == 'POST' and req.path == '/register':
-                # Parse form data
-                username = None
-                password = None
-                if req.body:
-                    for param in req.body.split('&'):
-                        if '=' in param:
-                            key, value = param.split('=', 1)
-                            if key == 'username':
-                                username = value
-                            elif key == 'password':
-                                password = value
+                username = req.form.get('username')
+                password = req.form.get('password')
                 
                 if not username or not password:
                     body_content = "<html><body><h1>Error</h1><p>Username and password required. <a href='/register.html'>Try again</a></p></body></html>"
@@ -245,6 +322,7 @@ class HttpAdapter:
                 auth_cookie = req.cookies.get('auth', '')
                 if auth_cookie == 'true':
                     print("[HttpAdapter] Authorized access to index page")
+                    resp.cache_control = PRIVATE_CACHE_CONTROL
                     response = resp.build_response(req)
                 else:
                     print("[HttpAdapter] Unauthorized access attempt to index page")
@@ -266,6 +344,7 @@ class HttpAdapter:
                 print("[HttpAdapter] Chat access attempt - Cookie value: '{}'".format(auth_cookie))
                 if auth_cookie == 'true':
                     print("[HttpAdapter] Authorized access to chat page")
+                    resp.cache_control = PRIVATE_CACHE_CONTROL
                     response = resp.build_response(req)
                 else:
                     print("[HttpAdapter] Unauthorized access attempt to chat page - redirecting to login")
@@ -281,26 +360,51 @@ class HttpAdapter:
                     ).format(len(body_content), body_content).encode('utf-8')
             
             # Handle request hook for RESTful routes
+            # Refused by the rate limit of the route, see daemon.ratelimit
+            elif retry_after:
+                body_content = dumps({"status": "error", "message": "Rate limit exceeded",
+                                      "retry_after": round(retry_after, 3)})
+                response = (
+                    "HTTP/1.1 429 Too Many Requests\r\n"
+                    "Content-Type: application/json\r\n"
+                    "Retry-After: {}\r\n"
+                    "Access-Control-Allow-Origin: *\r\n"
+                    "Content-Length: {}\r\n"
+                    "Connection: close\r\n"
+                    "\r\n"
+                    "{}"
+                ).format(max(1, math.ceil(retry_after)), len(body_content), body_content).encode('utf-8')
+
             elif req.hook:
                 print("[HttpAdapter] hook in route-path METHOD {} PATH {}".format(req.hook._route_path,req.hook._route_methods))
-                # Call the route handler with headers and body
-                result = req.hook(headers=req.headers, body=req.body)
+                # Call the route handler with the request, or with headers
+                # and body; requests without a body (GET) pass their query
+                # string instead, binary bodies are passed undecoded
+                if getattr(req.hook, '_route_wants_request', False):
+                    result = req.hook(request=req)
+                else:
+                    body = req.body or req.query_string
+                    if req.raw_body and not is_text_type(req.headers.get('content-type', '')):
+                        body = req.raw_body
+                    result = req.hook(headers=req.headers, body=body)
                 
                 # Convert result to JSON response
-                import json
-                if isinstance(result, dict):
-                    json_body = json.dumps(result)
+                if isinstance(result, (dict, Payload)):
+                    if isinstance(result, Payload):
+                        content_type, payload = result.content_type, bytes(result)
+                    else:
+                        content_type, payload = "application/json", dumps(result).encode('utf-8')
+                    status = "400 Bad Request" if isinstance(result, BadRequest) else "200 OK"
                     response = (
-                        "HTTP/1.1 200 OK\r\n"
-                        "Content-Type: application/json\r\n"
+                        "HTTP/1.1 {}\r\n"
+                        "Content-Type: {}\r\n"
                         "Access-Control-Allow-Origin: *\r\n"
                         "Access-Control-Allow-Methods: GET, POST, PUT, DELETE, OPTIONS\r\n"
                         "Access-Control-Allow-Headers: Content-Type, Authorization\r\n"
                         "Content-Length: {}\r\n"
                         "Connection: close\r\n"
                         "\r\n"
-                        "{}"
-                    ).format(len(json_body), json_body).encode('utf-8')
+                    ).format(status, content_type, len(payload)).encode('utf-8') + payload
                 else:
                     # Build normal response if not dict
                     response = resp.build_response(req)
@@ -309,18 +413,93 @@ class HttpAdapter:
                 # Build normal response for all other requests (including /login.html)
                 response = resp.build_response(req)
 
+            # A HEAD response announces the length of the body it omits
+            if req.method == 'HEAD':
+                response = b"".join(response.partition(b"\r\n\r\n")[:2])
+
+            # Only responses with a known length can share the connection,
+            # a 304 never has a body
+            head = response.partition(b"\r\n\r\n")[0].lower()
+            keep_alive = (keep_alive and self.wants_keep_alive(req)
+                          and (b"\r\ncontent-length:" in head
+                               or head.startswith(b"http/1.1 304 ")))
+
             #print(response)
-            conn.sendall(response)
-            conn.close()
+            conn.sendall(set_connection(response, keep_alive))
+            return keep_alive
         
         except Exception as e:
             print("[HttpAdapter] Exception in handle_client: {}".format(str(e)))
             import traceback
             traceback.print_exc()
-            try:
-                conn.close()
-            except:
-                pass
+            return False
+
+    def receive(self, conn):
+        """
+        Read one complete HTTP request from the socket: the header block,
+        then as many body bytes as announced by ``Content-Length``.
+
+        Bytes received past the end of the request are kept for the next
+        request of the connection. A body over :data:`MAX_BODY_BYTES`, or
+        an invalid or repeated ``Content-Length``, is answered with a 413
+        or a 400 and ends the connection: its bytes are never read as a
+        next request.
+
+        :param conn (socket): The client socket connection.
+        :rtype bytes: The raw request message, empty once the client closed
+                      the connection, went idle or was refused.
+        """
+        data = getattr(self, 'pending', b"")
+        self.pending = b""
+        try:
+            while b"\r\n\r\n" not in data and len(data) < MAX_HEADER_BYTES:
+                chunk = conn.recv(4096)
+                if not chunk:
+                    break
+                data += chunk
+        except (socket.timeout, OSError):
+            return b""
+
+        head, sep, body = data.partition(b"\r\n\r\n")
+        length = None
+        for line in head.split(b"\r\n")[1:]:
+            name, _, value = line.partition(b":")
+            if name.strip().lower() == b"content-length":
+                value = value.strip()
+                if not value.isdigit() or (length is not None and int(value) != length):
+                    return self.refuse(conn, BAD_REQUEST)
+                length = int(value)
+        if length is None:
+            length = 0
+        elif length > MAX_BODY_BYTES:
+            return self.refuse(conn, PAYLOAD_TOO_LARGE)
+
+        body = bytearray(body)
+        try:
+            while len(body) < length:
+                chunk = conn.recv(min(65536, length - len(body)))
+                if not chunk:
+                    break
+                body += chunk
+        except (socket.timeout, OSError):
+            return b""
+
+        self.pending = bytes(body[length:])
+        return head + sep + bytes(body[:length])
+
+    def refuse(self, conn, answer):
+        """
+        Answers a request that is not read and ends the connection.
+
+        :rtype bytes: empty, the connection is done.
+        """
+        print("[HttpAdapter] Refusing request from {}: {}".format(
+            self.connaddr, answer.split(b"\r\n", 1)[0].decode()))
+        try:
+            conn.sendall(answer)
+        except OSError:
+            pass
+        return b""
 
     @property
     def extract_cookies(self, req, resp):
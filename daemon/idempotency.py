@@ -0,0 +1,122 @@
+#
+# Copyright (C) 2025 pdnguyen of HCMC University of Technology VNU-HCM.
+# All rights reserved.
+# This file is part of the CO3093/CO3094 course.
+#
+# WeApRous release
+#
+# The authors hereby grant to Licensee personal permission to use
+# and modify the Licensed Source Code for the sole purpose of studying
+# while attending the course
+#
+
+"""
+daemon.idempotency
+~~~~~~~~~~~~~~~~~
+
+This module provides a bounded, time-windowed set of recently seen request
+keys, used to answer client retries of a send without sending again.
+
+Keys live in a hash map, to their stored result, and in a ring ordered by
+expiry. Lookups are O(1); expired keys are dropped from the head of the ring
+as new keys are claimed, and the ring is capped at ``max_ids`` entries so a
+flood of unique keys cannot grow memory past the cap.
+
+Usage::
+
+  >>> recent = RecentIds(window=300)
+  >>> recent.claim(('alice', 'm-1'))
+  (True, None)
+  >>> recent.complete(('alice', 'm-1'), {'status': 'success', 'seq': 7})
+  >>> recent.claim(('alice', 'm-1'))
+  (False, {'status': 'success', 'seq': 7})
+"""
+
+import threading
+import time
+from collections import deque
+
+DEFAULT_WINDOW = 300.0
+DEFAULT_MAX_IDS = 100000
+
+
+class RecentIds:
+    """The :class:`RecentIds <RecentIds>` object remembers the keys claimed
+    during the last ``window`` seconds and the result of their request.
+
+    :attrs window (float): seconds a key is remembered.
+    :attrs max_ids (int): number of keys remembered at most.
+    """
+
+    def __init__(self, window=DEFAULT_WINDOW, max_ids=DEFAULT_MAX_IDS):
+        self.window = window
+        self.max_ids = max_ids
+        self.lock = threading.Lock()
+        #: key to ``(deadline, result)``, the result being ``None`` while
+        #: the first request still runs
+        self.results = {}
+        #: ``(deadline, key)`` pairs, oldest first
+        self._ring = deque()
+
+    def __len__(self):
+        return len(self.results)
+
+    def __contains__(self, key):
+        """Tells whether ``key`` was claimed within the window, without
+        claiming it."""
+        with self.lock:
+            entry = self.results.get(key)
+            return entry is not None and entry[0] > time.time()
+
+    def _expire(self, now):
+        ring = self._ring
+        while ring and (ring[0][0] <= now or len(ring) > self.max_ids):
+            deadline, key = ring.popleft()
+            # A released and claimed again key has a newer ring entry
+            entry = self.results.get(key)
+            if entry is not None and entry[0] == deadline:
+                del self.results[key]
+
+    def claim(self, key, now=None):
+        """
+        Reserves ``key`` unless it was claimed within the window.
+
+        :rtype tuple: ``(True, None)`` if the key is new and the request
+                      should run, else ``(False, result)`` with the stored
+                      result, ``None`` while the first request still runs.
+        """
+        if now is None:
+            now = time.time()
+        with self.lock:
+            self._expire(now)
+            entry = self.results.get(key)
+            # Replayed keys enter the ring out of deadline order, an expired
+            # one may still be in the map
+            if entry is not None and entry[0] > now:
+                return False, entry[1]
+            deadline = now + self.window
+            self.results[key] = (deadline, None)
+            self._ring.append((deadline, key))
+            return True, None
+
+    def complete(self, key, result):
+        """Stores the result of the request that claimed ``key``."""
+        with self.lock:
+            entry = self.results.get(key)
+            if entry is not None:
+                self.results[key] = (entry[0], result)
+
+    def release(self, key):
+        """Forgets ``key`` so a retry runs again, e.g. after a failure."""
+        with self.lock:
+            self.results.pop(key, None)
+
+    def remember(self, key, result, when):
+        """Records a key claimed at time ``when``, e.g. replayed from the
+        message log; keys already outside the window are ignored."""
+        deadline = when + self.window
+        with self.lock:
+            if deadline <= time.time() or key in self.results:
+                return
+            self.results[key] = (deadline, result)
+            self._ring.append((deadline, key))
@@ -0,0 +1,121 @@
+#
+# Copyright (C) 2025 pdnguyen of HCMC University of Technology VNU-HCM.
+# All rights reserved.
+# This file is part of the CO3093/CO3094 course.
+#
+# WeApRous release
+#
+# The authors hereby grant to Licensee personal permission to use
+# and modify the Licensed Source Code for the sole purpose of studying
+# while attending the course
+#
+
+"""
+daemon.message
+~~~~~~~~~~~~~~~~~
+
+This module provides the :class:`Message <Message>` record used for chat
+messages.
+
+A message is queued once per recipient and retained in channel history, so
+its representation dominates the memory of the chat tracker. Messages are
+slotted objects instead of dicts; the sender, target, channel and type
+strings are interned so every message of a peer or channel shares them.
+
+The JSON view of a message is serialized on first use and cached. The
+message log, queue accounting and HTTP responses all reuse it, so a message
+is encoded once however many peers receive it. A message is immutable once
+its sequence number has been assigned.
+
+Usage::
+
+  >>> msg = Message('alice', 'hi', MESSAGE_BROADCAST, 'general')
+  >>> msg.seq = 1
+  >>> msg.json
+  '{"from":"alice","message":"hi","type":"broadcast","channel":"general",...}'
+"""
+
+import json
+import time
+from sys import intern
+
+MESSAGE_DIRECT = 'direct'
+MESSAGE_BROADCAST = 'broadcast'
+
+
+class Message:
+    """The :class:`Message <Message>` object is one chat message.
+
+    :attrs sender (str): name of the sending peer, ``from`` in JSON.
+    :attrs target (str): recipient of a direct message, ``to`` in JSON, or
+        ``None`` for broadcasts.
+    :attrs text (str): message body, ``message`` in JSON.
+    :attrs type (str): :data:`MESSAGE_DIRECT` or :data:`MESSAGE_BROADCAST`.
+    :attrs channel (str): channel name.
+    :attrs timestamp (float): creation time.
+    :attrs seq (int): sequence number assigned by the message log, 0 before.
+    :attrs msg_id (str): client generated id used to deduplicate retries,
+        or ``None``.
+    """
+
+    __slots__ = ("sender", "target", "text", "type", "channel", "timestamp",
+                 "seq", "msg_id", "_json")
+
+    def __init__(self, sender, text, type, channel, target=None,
+                 timestamp=None, seq=0, msg_id=None):
+        self.sender = intern(sender)
+        self.target = intern(target) if target is not None else None
+        self.text = text
+        self.type = intern(type)
+        self.channel = intern(channel)
+        self.timestamp = time.time() if timestamp is None else timestamp
+        self.seq = seq
+        self.msg_id = msg_id
+        self._json = None
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Builds a message from its JSON view.
+
+        :param data (dict): message fields, as returned by :meth:`to_dict`.
+
+        :rtype Message: the message.
+        """
+        return cls(str(data.get('from', '')), str(data.get('message', '')),
+                   str(data.get('type', MESSAGE_DIRECT)),
+                   str(data.get('channel', 'general')),
+                   data.get('to'), float(data.get('timestamp', 0)),
+                   int(data.get('seq', 0)), data.get('msg_id'))
+
+    def to_dict(self):
+        """
+        Returns the JSON view of the message as a dict; ``to`` is only
+        present for direct messages and ``msg_id`` when the client set one.
+
+        :rtype dict: message fields.
+        """
+        data = {'from': self.sender}
+        if self.target is not None:
+            data['to'] = self.target
+        data['message'] = self.text
+        data['type'] = self.type
+        data['channel'] = self.channel
+        data['timestamp'] = self.timestamp
+        data['seq'] = self.seq
+        if self.msg_id is not None:
+            data['msg_id'] = self.msg_id
+        return data
+
+    @property
+    def json(self):
+        """The cached JSON view of the message."""
+        if self._json is None:
+            self._json = json.dumps(self.to_dict(), separators=(',', ':'))
+        return self._json
+
+    def __json__(self):
+        return self.json
+
+    def __repr__(self):
+        return "<Message seq={} {} {}>".format(self.seq, self.type, self.sender)
@@ -0,0 +1,451 @@
+#
+# Copyright (C) 2025 pdnguyen of HCMC University of Technology VNU-HCM.
+# All rights reserved.
+# This file is part of the CO3093/CO3094 course.
+#
+# WeApRous release
+#
+# The authors hereby grant to Licensee personal permission to use
+# and modify the Licensed Source Code for the sole purpose of studying
+# while attending the course
+#
+
+"""
+daemon.msglog
+~~~~~~~~~~~~~~~~~
+
+This module provides an append-only, segmented message log used by the chat
+tracker to persist queued and historic messages.
+
+Each record is a length-prefixed, checksummed JSON payload::
+
+    +----------------+----------------+----------------------+
+    | length (>I)    | crc32 (>I)     | payload (JSON utf-8) |
+    +----------------+----------------+----------------------+
+
+Three record kinds exist:
+
+- ``m``: a message with its sequence number, recipients and, for channel
+  broadcasts, the channel whose history keeps it.
+- ``a``: an acknowledgement, every message of a peer up to a sequence number
+  has been delivered.
+- ``s``: the highest sequence number assigned when a compaction ran, so
+  sequence numbers keep growing after every message was compacted away.
+
+Records are appended to the active segment, so persisting a message costs
+O(message). The log lock only orders messages: sequence numbers are
+assigned and records buffered under it, and the buffer is written out
+after it is released, one write for every message buffered meanwhile
+(group commit). Appending returns once its record is written;
+acknowledgements are only buffered, and written with the next messages
+or every ``FLUSH_INTERVAL`` seconds, a lost acknowledgement only delivers
+a message again. When the active segment grows past ``segment_bytes`` it is sealed
+and a background thread compacts all sealed segments into one, keeping only
+messages that are still queued for some peer or still retained in a channel
+history. Recovery replays the remaining segments, so startup time is
+proportional to live data. A torn record at the tail of the last segment is
+truncated away.
+"""
+
+import json
+import os
+import struct
+import threading
+import zlib
+
+from .message import Message
+
+#: Record header: payload length and crc32 of the payload.
+RECORD_HEADER = struct.Struct('>II')
+
+SEGMENT_PREFIX = 'segment-'
+SEGMENT_SUFFIX = '.log'
+COMPACT_SUFFIX = '.compact'
+
+DEFAULT_SEGMENT_BYTES = 4 * 1024 * 1024
+
+#: Seconds buffered acknowledgements wait at most before being written.
+FLUSH_INTERVAL = 1.0
+
+
+def encode_record(payload):
+    """
+    Encodes a record payload.
+
+    :param payload (dict): JSON-serializable record.
+
+    :rtype bytes: header followed by the payload.
+    """
+    return _frame(json.dumps(payload, separators=(',', ':')).encode('utf-8'))
+
+
+def encode_message(msg, recipients, channel):
+    """
+    Encodes the record of a sequenced message, embedding its cached JSON
+    view instead of serializing it again.
+
+    :param msg (Message): message with its ``seq`` assigned.
+    :param recipients (list): peers whose queues receive the message.
+    :param channel (str): channel whose history keeps the message, if any.
+
+    :rtype bytes: header followed by the payload.
+    """
+    data = '{{"k":"m","s":{},"to":{},"h":{},"m":{}}}'.format(
+        msg.seq, json.dumps(list(recipients), separators=(',', ':')),
+        json.dumps(channel), msg.json)
+    return _frame(data.encode('utf-8'))
+
+
+def _frame(data):
+    return RECORD_HEADER.pack(len(data), zlib.crc32(data)) + data
+
+
+def scan_segment(path):
+    """
+    Reads every valid record of a segment file.
+
+    Scanning stops at the first truncated or corrupted record.
+
+    :param path (str): segment file path.
+
+    :rtype tuple: (list of payloads, offset after the last valid record,
+                   file size).
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    records = []
+    offset = 0
+    header_size = RECORD_HEADER.size
+    while offset + header_size <= len(data):
+        length, crc = RECORD_HEADER.unpack_from(data, offset)
+        start = offset + header_size
+        payload = data[start:start + length]
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            break
+        try:
+            records.append(json.loads(payload.decode('utf-8')))
+        except ValueError:
+            break
+        offset = start + length
+    return records, offset, len(data)
+
+
+class MessageLog:
+    """The :class:`MessageLog <MessageLog>` object owns the segment files of
+    a log directory and assigns message sequence numbers.
+
+    :attrs directory (str): directory holding the segment files.
+    :attrs segment_bytes (int): size after which the active segment is sealed.
+    :attrs history_floor (function): ``history_floor(channel)`` returns the
+        lowest sequence number still retained in the channel history, or
+        ``None`` if the channel retains nothing. Used by compaction.
+    :attrs seq (int): last assigned sequence number.
+    :attrs acked (dict): peer name to highest acknowledged sequence number.
+    """
+
+    def __init__(self, directory, segment_bytes=DEFAULT_SEGMENT_BYTES,
+                 history_floor=None, fsync=False):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.history_floor = history_floor
+        self.fsync = fsync
+        self.lock = threading.Lock()
+        self.seq = 0
+        self.acked = {}
+        #: records buffered under ``lock``, written under ``_io_lock``
+        self._buffer = []
+        self._buffered = 0
+        self._written = 0
+        self._io_lock = threading.Lock()
+        self._segments = []
+        self._active = None
+        self._active_size = 0
+        self._compact_lock = threading.Lock()
+        self._compact_wanted = threading.Event()
+        self._compactor = None
+        self._closed = False
+
+    def _path(self, segment_id):
+        return os.path.join(self.directory, "{}{:08d}{}".format(
+            SEGMENT_PREFIX, segment_id, SEGMENT_SUFFIX))
+
+    def _list_segments(self):
+        ids = []
+        for name in os.listdir(self.directory):
+            if name.endswith(COMPACT_SUFFIX):
+                # Leftover of an interrupted compaction
+                os.remove(os.path.join(self.directory, name))
+            elif name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+                ids.append(int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]))
+        return sorted(ids)
+
+    def recover(self):
+        """
+        Replays the log and opens the active segment for appending.
+
+        :rtype tuple: (dict of peer name to pending :class:`Message`,
+                       dict of channel name to historic :class:`Message`),
+                       both in sequence order.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        self._segments = self._list_segments()
+
+        messages = {}
+        for index, segment_id in enumerate(self._segments):
+            path = self._path(segment_id)
+            records, valid_end, size = scan_segment(path)
+            if valid_end < size:
+                if index == len(self._segments) - 1:
+                    print("[MessageLog] Truncating torn tail of {} at {}".format(path, valid_end))
+                    with open(path, 'r+b') as f:
+                        f.truncate(valid_end)
+                else:
+                    print("[MessageLog] Corrupted record in {} at {}".format(path, valid_end))
+            for record in records:
+                if record['k'] == 'm':
+                    messages[record['s']] = record
+                    if record['s'] > self.seq:
+                        self.seq = record['s']
+                elif record['k'] == 'a':
+                    if record['s'] > self.acked.get(record['p'], 0):
+                        self.acked[record['p']] = record['s']
+                elif record['k'] == 's':
+                    self.seq = max(self.seq, record['s'])
+
+        queues = {}
+        history = {}
+        for seq in sorted(messages):
+            record = messages[seq]
+            # One message object is shared by every queue and the history
+            msg = Message.from_dict(record['m'])
+            for peer in record['to']:
+                if self.acked.get(peer, 0) < seq:
+                    queues.setdefault(peer, []).append(msg)
+            if record.get('h'):
+                history.setdefault(record['h'], []).append(msg)
+
+        if not self._segments:
+            self._segments = [1]
+        path = self._path(self._segments[-1])
+        self._active = open(path, 'ab')
+        self._active_size = self._active.tell()
+
+        self._closed = False
+        if self._compactor is None:
+            self._compactor = threading.Thread(target=self._compact_loop, daemon=True)
+            self._compactor.start()
+
+        print("[MessageLog] Recovered {} messages from {} segments".format(
+            len(messages), len(self._segments)))
+        return queues, history
+
+    def append(self, msg, recipients, channel=None, deliver=None):
+        """
+        Persists a message and assigns its sequence number, stored in
+        ``msg.seq``.
+
+        :param msg (Message): message to persist.
+        :param recipients (list): peers whose queues receive the message.
+        :param channel (str): channel whose history keeps the message, if any.
+        :param deliver (function): called with ``msg`` while the log lock is
+            held, so messages reach the queues in sequence order. It must
+            not block; the record is written after the lock is released.
+
+        :rtype int: sequence number of the message.
+        """
+        with self.lock:
+            self.seq += 1
+            msg.seq = seq = self.seq
+            ticket = self._buffer_record(encode_message(msg, recipients, channel))
+            if deliver is not None:
+                deliver(msg)
+        self._sync(ticket)
+        return seq
+
+    def append_many(self, entries, deliver=None):
+        """
+        Persists several messages under a single acquisition of the log lock.
+
+        :param entries (list): ``(msg, recipients, channel)`` triples as for
+                               :meth:`append`.
+        :param deliver (function): called with the list of messages while
+                                   the log lock is held.
+
+        :rtype list: sequence numbers of the messages.
+        """
+        with self.lock:
+            seqs = []
+            ticket = self._written
+            for msg, recipients, channel in entries:
+                self.seq += 1
+                msg.seq = self.seq
+                ticket = self._buffer_record(encode_message(msg, recipients, channel))
+                seqs.append(self.seq)
+            if deliver is not None:
+                deliver([msg for msg, _, _ in entries])
+        self._sync(ticket)
+        return seqs
+
+    def ack(self, peer, seq):
+        """Records that every message of ``peer`` up to ``seq`` was delivered.
+
+        The acknowledgement is buffered, not written at once."""
+        with self.lock:
+            if seq <= self.acked.get(peer, 0):
+                return
+            self.acked[peer] = seq
+            self._buffer_record(encode_record({'k': 'a', 'p': peer, 's': seq}))
+
+    def forget(self, peer):
+        """Acknowledges every pending message of ``peer``."""
+        self.ack(peer, self.seq)
+
+    def flush(self):
+        """Writes every buffered record."""
+        with self.lock:
+            ticket = self._buffered
+        self._sync(ticket)
+
+    def _buffer_record(self, record):
+        # Called with the log lock held
+        self._buffer.append(record)
+        self._buffered += 1
+        return self._buffered
+
+    def _sync(self, ticket):
+        """Writes the buffered records, up to the ``ticket`` th at least.
+
+        A closed log, or one whose rotation failed, appends to its last
+        segment again. Records that could not be written go back to the
+        buffer and the error is raised.
+        """
+        with self._io_lock:
+            if self._written >= ticket:
+                # Written by another thread meanwhile
+                return
+            with self.lock:
+                records = self._buffer
+                self._buffer = []
+                written = self._buffered
+                segment_id = self._segments[-1] if self._segments else None
+            data = b''.join(records)
+            try:
+                if self._active is None:
+                    if segment_id is None:
+                        raise ValueError("Message log is not recovered")
+                    self._active = open(self._path(segment_id), 'ab')
+                    self._active_size = self._active.tell()
+                self._active.write(data)
+                self._active.flush()
+                if self.fsync:
+                    os.fsync(self._active.fileno())
+            except (OSError, ValueError):
+                with self.lock:
+                    self._buffer[:0] = records
+                raise
+            self._written = written
+            self._active_size += len(data)
+            if self._active_size >= self.segment_bytes:
+                self._rotate()
+
+    def _rotate(self):
+        # Called with the io lock held
+        self._active.close()
+        self._active = None
+        with self.lock:
+            self._segments.append(self._segments[-1] + 1)
+            segment_id = self._segments[-1]
+        self._active = open(self._path(segment_id), 'ab')
+        self._active_size = 0
+        self._compact_wanted.set()
+
+    def _compact_loop(self):
+        while True:
+            wanted = self._compact_wanted.wait(FLUSH_INTERVAL)
+            try:
+                self.flush()
+                if wanted:
+                    self._compact_wanted.clear()
+                    self.compact()
+            except Exception as e:
+                print("[MessageLog] Flush or compaction error: {}".format(e))
+
+    def compact(self):
+        """
+        Rewrites all sealed segments into one, dropping delivered messages,
+        messages evicted from channel history and acknowledgements. The
+        compacted segment starts with the highest sequence number assigned.
+        """
+        with self._compact_lock:
+            if self._closed:
+                return
+            with self.lock:
+                sealed = self._segments[:-1]
+                acked = dict(self.acked)
+                high_water = self.seq
+            if not sealed:
+                return
+
+            live = {}
+            for segment_id in sealed:
+                records, _, _ = scan_segment(self._path(segment_id))
+                for record in records:
+                    if record['k'] != 'm':
+                        continue
+                    seq = record['s']
+                    to = [peer for peer in record['to'] if acked.get(peer, 0) < seq]
+                    channel = record.get('h')
+                    if channel and self.history_floor is not None:
+                        floor = self.history_floor(channel)
+                        if floor is None or seq < floor:
+                            channel = None
+                    if to or channel:
+                        record['to'] = to
+                        record['h'] = channel
+                        live[seq] = record
+
+            target = self._path(sealed[0])
+            tmp_path = target + COMPACT_SUFFIX
+            with open(tmp_path, 'wb') as f:
+                f.write(encode_record({'k': 's', 's': high_water}))
+                for seq in sorted(live):
+                    f.write(encode_record(live[seq]))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, target)
+            for segment_id in sealed[1:]:
+                os.remove(self._path(segment_id))
+
+            with self.lock:
+                self._segments = [sealed[0]] + self._segments[len(sealed):]
+            print("[MessageLog] Compacted {} segments, {} live messages".format(
+                len(sealed), len(live)))
+
+    def stats(self):
+        """
+        Returns log accounting.
+
+        :rtype dict: segment count, bytes on disk and last sequence number.
+        """
+        with self.lock:
+            segments = list(self._segments)
+            seq = self.seq
+        size = 0
+        for segment_id in segments:
+            try:
+                size += os.path.getsize(self._path(segment_id))
+            except OSError:
+                pass
+        return {"segments": len(segments), "bytes": size, "seq": seq}
+
+    def close(self):
+        """Flushes and closes the active segment; a compaction under way is
+        finished first and none starts afterwards."""
+        self.flush()
+        with self._compact_lock:
+            self._closed = True
+        with self._io_lock:
+            if self._active is not None:
+                self._active.close()
+                self._active = None
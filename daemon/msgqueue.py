@@ -0,0 +1,379 @@
+#
+# Copyright (C) 2025 pdnguyen of HCMC University of Technology VNU-HCM.
+# All rights reserved.
+# This file is part of the CO3093/CO3094 course.
+#
+# WeApRous release
+#
+# The authors hereby grant to Licensee personal permission to use
+# and modify the Licensed Source Code for the sole purpose of studying
+# while attending the course
+#
+
+"""
+daemon.msgqueue
+~~~~~~~~~~~~~~~~~
+
+This module provides bounded per-peer message queues for the chat tracker.
+The queues are sharded over a fixed number of lock stripes.
+
+Every peer owns a :class:`PeerQueue <PeerQueue>` limited both by message count
+and by queued bytes. When a queue (or the global byte budget) is full, the
+configured overflow policy decides what happens to the incoming message:
+
+- ``drop-oldest``: evict the oldest pending messages to make room.
+- ``drop-newest``: reject the incoming message.
+- ``disconnect``: discard the whole queue and report the peer as gone.
+
+Queues are only created by :meth:`MessageQueues.ensure`, when a peer
+registers; messages to a peer without a queue are not kept, so unknown or
+removed peer names cannot grow the queue map.
+
+Usage::
+
+  >>> queues = MessageQueues(max_messages=500, policy='drop-oldest')
+  >>> queues.ensure('alice')
+  >>> queues.push('alice', {'from': 'bob', 'message': 'hi'})
+  True
+  >>> queues.drain('alice')
+  [{'from': 'bob', 'message': 'hi'}]
+"""
+
+import json
+import threading
+from collections import deque
+
+OVERFLOW_DROP_OLDEST = 'drop-oldest'
+OVERFLOW_DROP_NEWEST = 'drop-newest'
+OVERFLOW_DISCONNECT = 'disconnect'
+
+OVERFLOW_POLICIES = (OVERFLOW_DROP_OLDEST, OVERFLOW_DROP_NEWEST, OVERFLOW_DISCONNECT)
+
+#: Default per-peer limits and global byte budget.
+DEFAULT_MAX_MESSAGES = 1000
+DEFAULT_MAX_BYTES = 256 * 1024
+DEFAULT_MAX_TOTAL_BYTES = 64 * 1024 * 1024
+DEFAULT_STRIPES = 16
+
+
+def message_size(msg):
+    """
+    Returns the accounted size of a queued message, which is the length of
+    its JSON encoding as it will be sent to the client. The cached view of a
+    :class:`daemon.message.Message` is reused.
+
+    :param msg (Message): queued message, or a plain dict.
+
+    :rtype int: size in bytes.
+    """
+    if isinstance(msg, dict):
+        return len(json.dumps(msg))
+    return len(msg.json)
+
+
+class PeerQueue:
+    """The :class:`PeerQueue <PeerQueue>` object holds the pending messages of
+    a single peer together with their accounted sizes.
+
+    :attrs entries (deque): pending ``(size, message)`` pairs, oldest first.
+    :attrs bytes (int): sum of the sizes of pending messages.
+    :attrs dropped (int): number of messages lost to the overflow policy.
+    """
+
+    __slots__ = ("entries", "bytes", "dropped")
+
+    def __init__(self):
+        self.entries = deque()
+        self.bytes = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def append(self, size, msg):
+        self.entries.append((size, msg))
+        self.bytes += size
+
+    def popleft(self):
+        size, msg = self.entries.popleft()
+        self.bytes -= size
+        self.dropped += 1
+        return size
+
+    def drain(self):
+        messages = [msg for _, msg in self.entries]
+        self.entries.clear()
+        self.bytes = 0
+        return messages
+
+
+class _Stripe:
+    """One shard of :class:`MessageQueues <MessageQueues>`: a lock and the
+    queues of the peers hashed to it."""
+
+    __slots__ = ("lock", "queues")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.queues = {}
+
+
+class MessageQueues:
+    """The :class:`MessageQueues <MessageQueues>` object maps peer names to
+    bounded :class:`PeerQueue <PeerQueue>` instances and keeps track of the
+    total number of queued bytes, so memory use has a hard ceiling.
+
+    Peers are sharded over ``stripes`` independent locks by a hash of their
+    name, so senders and pollers of different peers do not serialize on a
+    single lock. The byte budget stays global: one counter shared by every
+    stripe, updated under its own small lock, so a few busy peers hashed to
+    the same stripe can use all of it.
+
+    :attrs max_messages (int): per-peer message limit.
+    :attrs max_bytes (int): per-peer byte limit.
+    :attrs max_total_bytes (int): byte budget shared by all peers.
+    :attrs policy (str): overflow policy, one of :data:`OVERFLOW_POLICIES`.
+    """
+
+    def __init__(self, max_messages=DEFAULT_MAX_MESSAGES, max_bytes=DEFAULT_MAX_BYTES,
+                 max_total_bytes=DEFAULT_MAX_TOTAL_BYTES, policy=OVERFLOW_DROP_OLDEST,
+                 stripes=DEFAULT_STRIPES):
+        self.stripes = [_Stripe() for _ in range(stripes)]
+        #: bytes queued over all stripes, guarded by ``budget_lock``
+        self.queued_bytes = 0
+        self.budget_lock = threading.Lock()
+        self.configure(max_messages, max_bytes, max_total_bytes, policy)
+
+    def configure(self, max_messages=None, max_bytes=None, max_total_bytes=None, policy=None):
+        """
+        Updates the queue limits. Arguments left as ``None`` are unchanged.
+
+        :raises ValueError: If the overflow policy is unknown.
+        """
+        if policy is not None and policy not in OVERFLOW_POLICIES:
+            raise ValueError("Unknown overflow policy {}".format(policy))
+        if max_messages is not None:
+            self.max_messages = max_messages
+        if max_bytes is not None:
+            self.max_bytes = max_bytes
+        if max_total_bytes is not None:
+            self.max_total_bytes = max_total_bytes
+        if policy is not None:
+            self.policy = policy
+
+    @property
+    def total_bytes(self):
+        """Bytes queued over all stripes."""
+        return self.queued_bytes
+
+    def _reserve(self, size):
+        """Takes ``size`` bytes of the global budget, if they are left."""
+        with self.budget_lock:
+            if self.queued_bytes + size > self.max_total_bytes:
+                return False
+            self.queued_bytes += size
+            return True
+
+    def _release(self, size):
+        with self.budget_lock:
+            self.queued_bytes -= size
+
+    def _stripe(self, peer):
+        return self.stripes[hash(peer) % len(self.stripes)]
+
+    def ensure(self, peer):
+        """Creates an empty queue for ``peer`` if it does not have one yet."""
+        stripe = self._stripe(peer)
+        with stripe.lock:
+            if peer not in stripe.queues:
+                stripe.queues[peer] = PeerQueue()
+
+    def push(self, peer, msg):
+        """
+        Appends a message to the queue of ``peer``, applying the overflow
+        policy when a limit would be exceeded.
+
+        :param peer (str): recipient peer name.
+        :param msg (Message): message to queue.
+
+        :rtype bool: ``False`` when the peer was disconnected by the
+                     ``disconnect`` policy, ``None`` when it has no queue,
+                     ``True`` otherwise.
+        """
+        size = message_size(msg)
+        stripe = self._stripe(peer)
+        with stripe.lock:
+            return self._push_locked(stripe, peer, size, msg)
+
+    def push_many(self, peers, msg):
+        """
+        Appends ``msg`` to the queue of every peer in ``peers``; messages
+        are immutable, so all queues share the same object. Stripes are
+        visited one at a time, each lock being taken once.
+
+        :param peers (list): recipient peer names.
+        :param msg (Message): message to queue.
+
+        :rtype tuple: (number of queues the message was offered to,
+                       list of peers disconnected by the overflow policy).
+        """
+        counts, disconnected = self.push_batch([(peers, msg)])
+        return counts[0], disconnected
+
+    def push_batch(self, items):
+        """
+        Queues several messages at once, taking each stripe lock once for
+        the whole batch. Messages reach every queue in ``items`` order.
+
+        :param items (list): ``(peers, msg)`` pairs; each peer receives
+                             ``msg``.
+
+        :rtype tuple: (list with the number of queues each message was
+                       offered to, list of peers disconnected by the
+                       overflow policy).
+        """
+        by_stripe = {}
+        for index, (peers, msg) in enumerate(items):
+            size = message_size(msg)
+            for peer in peers:
+                by_stripe.setdefault(hash(peer) % len(self.stripes), []).append(
+                    (index, peer, size, msg))
+
+        counts = [0] * len(items)
+        disconnected = []
+        for stripe_index, members in by_stripe.items():
+            stripe = self.stripes[stripe_index]
+            with stripe.lock:
+                for index, peer, size, msg in members:
+                    pushed = self._push_locked(stripe, peer, size, msg)
+                    if pushed:
+                        counts[index] += 1
+                    elif pushed is False:
+                        disconnected.append(peer)
+        return counts, disconnected
+
+    def _push_locked(self, stripe, peer, size, msg):
+        queue = stripe.queues.get(peer)
+        if queue is None:
+            # Only ensure() creates queues, removed peers stay removed
+            return None
+
+        if self._fits(queue, size) and self._reserve(size):
+            queue.append(size, msg)
+            return True
+
+        if self.policy == OVERFLOW_DISCONNECT:
+            self._release(queue.bytes)
+            del stripe.queues[peer]
+            print("[MessageQueues] Queue of {} overflowed, disconnecting".format(peer))
+            return False
+
+        if self.policy == OVERFLOW_DROP_OLDEST:
+            while len(queue):
+                self._release(queue.popleft())
+                if self._fits(queue, size) and self._reserve(size):
+                    queue.append(size, msg)
+                    return True
+
+        # drop-newest, or a message that cannot fit even in an empty queue
+        queue.dropped += 1
+        return True
+
+    def _fits(self, queue, size):
+        return len(queue) < self.max_messages and queue.bytes + size <= self.max_bytes
+
+    def drain(self, peer):
+        """
+        Removes and returns every pending message of ``peer``.
+
+        :rtype list: pending messages, oldest first.
+        """
+        stripe = self._stripe(peer)
+        with stripe.lock:
+            queue = stripe.queues.get(peer)
+            if queue is None:
+                return []
+            self._release(queue.bytes)
+            return queue.drain()
+
+    def drain_many(self, peers):
+        """
+        Drains the queues of several peers, taking each stripe lock once.
+
+        :rtype dict: peer name to pending messages, oldest first.
+        """
+        by_stripe = {}
+        for peer in peers:
+            by_stripe.setdefault(hash(peer) % len(self.stripes), []).append(peer)
+
+        result = {}
+        for stripe_index, members in by_stripe.items():
+            stripe = self.stripes[stripe_index]
+            with stripe.lock:
+                for peer in members:
+                    queue = stripe.queues.get(peer)
+                    if queue is None:
+                        result[peer] = []
+                    else:
+                        self._release(queue.bytes)
+                        result[peer] = queue.drain()
+        return result
+
+    def remove(self, peer):
+        """Drops the queue of ``peer`` and releases its bytes."""
+        stripe = self._stripe(peer)
+        with stripe.lock:
+            queue = stripe.queues.pop(peer, None)
+            if queue is not None:
+                self._release(queue.bytes)
+
+    def load(self, queues):
+        """
+        Replaces the current content with ``queues``, a mapping of peer name
+        to a list of messages, applying the configured limits.
+        """
+        for stripe in self.stripes:
+            with stripe.lock:
+                stripe.queues = {}
+        with self.budget_lock:
+            self.queued_bytes = 0
+        for peer, msgs in queues.items():
+            self.ensure(peer)
+            for msg in msgs:
+                self.push(peer, msg)
+
+    def snapshot(self):
+        """
+        Returns a copy of all pending messages.
+
+        :rtype dict: peer name to list of messages.
+        """
+        result = {}
+        for stripe in self.stripes:
+            with stripe.lock:
+                for peer, queue in stripe.queues.items():
+                    result[peer] = [msg for _, msg in queue.entries]
+        return result
+
+    def stats(self):
+        """
+        Returns memory accounting for all queues.
+
+        :rtype dict: totals and per-peer message count, bytes and drops.
+        """
+        peers = {}
+        for stripe in self.stripes:
+            with stripe.lock:
+                for peer, queue in stripe.queues.items():
+                    peers[peer] = {"messages": len(queue), "bytes": queue.bytes,
+                                   "dropped": queue.dropped}
+        return {
+            "policy": self.policy,
+            "max_messages": self.max_messages,
+            "max_bytes": self.max_bytes,
+            "max_total_bytes": self.max_total_bytes,
+            "stripes": len(self.stripes),
+            "total_bytes": self.queued_bytes,
+            "total_messages": sum(p["messages"] for p in peers.values()),
+            "peers": peers,
+        }
@@ -0,0 +1,104 @@
+#
+# Copyright (C) 2025 pdnguyen of HCMC University of Technology VNU-HCM.
+# All rights reserved.
+# This file is part of the CO3093/CO3094 course.
+#
+# WeApRous release
+#
+# The authors hereby grant to Licensee personal permission to use
+# and modify the Licensed Source Code for the sole purpose of studying
+# while attending the course
+#
+
+"""
+daemon.presence
+~~~~~~~~~~~~~~~~~
+
+This module provides heartbeat based presence tracking for chat peers.
+
+Any request from a peer refreshes its ``last_seen`` time in O(1). Deadlines
+live in a min-heap holding at most one entry per peer; the entry is not
+updated on every heartbeat. When an entry reaches the top of the heap it is
+checked against ``last_seen``: an active peer is pushed back with its new
+deadline and a silent one is expired. Expiry is lazy (driven by incoming
+requests) and costs O(log n) per heap entry popped, never a full scan.
+
+Usage::
+
+  >>> presence = PresenceTracker(ttl=30)
+  >>> presence.touch('alice')
+  >>> presence.expire()
+  []
+"""
+
+import heapq
+import threading
+import time
+
+DEFAULT_TTL = 30.0
+
+
+class PresenceTracker:
+    """The :class:`PresenceTracker <PresenceTracker>` object records when each
+    peer was last seen and reports the peers silent for longer than ``ttl``.
+
+    :attrs ttl (float): seconds without requests after which a peer expires.
+    :attrs last_seen (dict): peer name to time of its last request.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.last_seen = {}
+        self._heap = []
+        self._scheduled = set()
+
+    def __len__(self):
+        return len(self.last_seen)
+
+    def touch(self, name, now=None):
+        """Records activity of ``name``."""
+        if now is None:
+            now = time.time()
+        with self.lock:
+            self.last_seen[name] = now
+            if name not in self._scheduled:
+                self._scheduled.add(name)
+                heapq.heappush(self._heap, (now + self.ttl, name))
+
+    def forget(self, name):
+        """Stops tracking ``name``; its heap entry is discarded lazily."""
+        with self.lock:
+            self.last_seen.pop(name, None)
+
+    def expire(self, now=None):
+        """
+        Removes and returns the peers whose last activity is older than
+        ``ttl``.
+
+        :rtype list: names of expired peers.
+        """
+        if now is None:
+            now = time.time()
+        heap = self._heap
+        # Fast path without the lock: nothing is due
+        try:
+            if heap[0][0] > now:
+                return []
+        except IndexError:
+            return []
+
+        expired = []
+        with self.lock:
+            while heap and heap[0][0] <= now:
+                _, name = heapq.heappop(heap)
+                seen = self.last_seen.get(name)
+                if seen is None:
+                    self._scheduled.discard(name)
+                elif seen + self.ttl > now:
+                    heapq.heappush(heap, (seen + self.ttl, name))
+                else:
+                    del self.last_seen[name]
+                    self._scheduled.discard(name)
+                    expired.append(name)
+        return expired
@@ -25,102 +25,568 @@ Requirement:
 - response: customized :class: `Response <Response>` utilities.
 - httpadapter: :class: `HttpAdapter <HttpAdapter >` adapter for HTTP request processing.
 - dictionary: :class: `CaseInsensitiveDict <CaseInsensitiveDict>` for managing headers and cookies.
+- connpool: pools of keep-alive upstream connections.
+- relay: buffered socket reader streaming message bodies.
+- health: active and passive upstream health checks.
+- breaker: circuit breakers of the upstreams.
+- cache: cache of the cacheable upstream responses.
+- timeouts: timeouts, retries and hedging of upstream requests.
+- routing: compiled routing tables reloaded with the configuration.
+- coalesce: single-flight coalescing of identical requests.
 
 """
+import select
 import socket
 import threading
+import time
 from .response import *
 from .httpadapter import HttpAdapter
 from .dictionary import CaseInsensitiveDict
+from .balancer import RoundRobin, Upstream
+from .timeouts import RequestPolicy, IDEMPOTENT_METHODS, RETRY_STATUSES
+from .routing import Router, RoutingTable
+from .coalesce import FlightWriter, follow
+from .connpool import get_pool
+from . import health
+from . import breaker
+from .cache import (cache_key, request_bypasses, request_revalidates, storable,
+                    FRESH, STALE)
+from .relay import (SocketReader, parse_head, request_framing, response_framing,
+                    FRAMING_NONE, FRAMING_LENGTH, FRAMING_EOF)
+
+#: Answer to requests whose backend cannot be reached.
+BAD_GATEWAY = (
+    "HTTP/1.1 502 Bad Gateway\r\n"
+    "Content-Type: text/plain\r\n"
+    "Content-Length: 15\r\n"
+    "Connection: close\r\n"
+    "\r\n"
+    "502 Bad Gateway"
+).encode('utf-8')
+
+#: Answer to requests no location of their host block matches.
+NOT_FOUND = (
+    "HTTP/1.1 404 Not Found\r\n"
+    "Content-Type: text/plain\r\n"
+    "Content-Length: 13\r\n"
+    "Connection: close\r\n"
+    "\r\n"
+    "404 Not Found"
+).encode('utf-8')
+
+#: Answer to requests no backend answered in time.
+GATEWAY_TIMEOUT = (
+    "HTTP/1.1 504 Gateway Timeout\r\n"
+    "Content-Type: text/plain\r\n"
+    "Content-Length: 19\r\n"
+    "Connection: close\r\n"
+    "\r\n"
+    "504 Gateway Timeout"
+).encode('utf-8')
+
+#: Balancer of hostnames without a host block.
+DEFAULT_ROUTE = RoundRobin([Upstream('127.0.0.1', 9000)])
+
+#: Timeouts and retries of host blocks without a request policy.
+DEFAULT_REQUEST_POLICY = RequestPolicy()
+
+
+class CachedRequest:
+    """Cache bookkeeping of one proxied ``GET`` or ``HEAD`` request.
+
+    :attrs cache (daemon.cache.HttpCache): the cache.
+    :attrs key (str): cache key of the request.
+    :attrs method (str): method of the client request.
+    :attrs head (bytes): head of the client request.
+    :attrs headers (dict): lower-cased headers of the client request.
+    :attrs entry (daemon.cache.CacheEntry): stored response being
+        revalidated, or ``None``.
+    """
+
+    __slots__ = ("cache", "key", "method", "head", "headers", "entry")
+
+    def __init__(self, cache, key, method, head, headers, entry=None):
+        self.cache = cache
+        self.key = key
+        self.method = method
+        self.head = head
+        self.headers = headers
+        self.entry = entry
+
+
+class _Capture:
+    """Socket stand-in relaying to ``conn``, if any, and keeping a copy of
+    what it is sent."""
+
+    __slots__ = ("conn", "data")
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.data = bytearray()
 
-#: A dictionary mapping hostnames to backend IP and port tuples.
-#: Used to determine routing targets for incoming requests.
-PROXY_PASS = {
-    "192.168.56.103:8080": ('192.168.56.103', 9000),
-    "app1.local": ('192.168.56.103', 9001),
-    "app2.local": ('192.168.56.103', 9002),
-}
+    def sendall(self, data):
+        if self.conn is not None:
+            self.conn.sendall(data)
+        self.data += data
 
 
-def forward_request(host, port, request):
+def prepare_request(head, client):
     """
-    Forwards an HTTP request to a backend server and retrieves the response.
+    Builds the bytes sent upstream for a request.
+
+    A body already received travels with the head, the request can then be
+    sent again, to the same or another upstream.
+
+    :params head (bytes): request head, read from the client.
+    :params client (SocketReader): reader of the client connection, at the
+                                   start of the request body, or ``None``
+                                   for a request without one.
+
+    :rtype tuple: (payload, framing of the body left to relay, True if
+                  the request can be sent again).
+    """
+    _, headers = parse_head(head)
+    framing = request_framing(headers)
+    payload = set_connection(head, True)
+
+    kind, length = framing
+    if kind == FRAMING_LENGTH and length <= client.buffered():
+        payload += client.view[client.start:client.start + length]
+        client.start += length
+        framing = (FRAMING_NONE, 0)
+    return payload, framing, framing[0] == FRAMING_NONE
+
+
+class Attempt:
+    """The :class:`Attempt <Attempt>` object is one try of a request on one
+    upstream, up to the response head.
+
+    The request travels on a pooled keep-alive connection of the upstream,
+    see :mod:`daemon.connpool`, so a request costs one round trip once the
+    pool is warm. A pooled connection the upstream closed in the meantime
+    is detected and the request is sent again on a new connection, when
+    none of it was written yet, or when it is idempotent and its body was
+    not streamed: the upstream may have acted on a ``POST`` it received
+    before closing.
+
+    :attrs upstream (Upstream): upstream tried.
+    :attrs probe (int): what the circuit breaker of the upstream admitted
+        the request as.
+    :attrs upconn (PooledConnection): connection carrying the request.
+    :attrs started (float): time the request was sent.
+    :attrs latency (float): seconds until the response head.
+    """
+
+    __slots__ = ("upstream", "probe", "pool", "upconn", "reused", "started",
+                 "latency", "idempotent", "payload", "client", "framing")
+
+    def __init__(self, upstream, method, payload, client, framing, probe=0):
+        self.upstream = upstream
+        self.probe = probe
+        self.pool = get_pool(upstream.host, upstream.port)
+        self.upconn = None
+        self.reused = False
+        self.started = 0.0
+        self.latency = 0.0
+        self.idempotent = method in IDEMPOTENT_METHODS
+        self.payload = payload
+        self.client = client
+        self.framing = framing
+
+    def send(self, policy):
+        """
+        Sends the request, and its body, on a pooled connection.
+
+        :raises OSError, ValueError: If the upstream cannot be reached.
+        """
+        while True:
+            self.upconn, self.reused = self.pool.acquire(policy.connect)
+            if self.upconn.reader is None:
+                self.upconn.reader = SocketReader(self.upconn.sock)
+            self.upconn.sock.settimeout(policy.read)
+            self.started = time.monotonic()
+            written = False
+            try:
+                sent = self.upconn.sock.send(self.payload)
+                written = True
+                self.upconn.sock.sendall(self.payload[sent:])
+                if self.framing[0] != FRAMING_NONE:
+                    self.client.relay_body(self.upconn.sock, self.framing)
+                return
+            except (socket.error, ValueError):
+                self.discard()
+                if self.reused and (not written or self.replayable()):
+                    continue
+                raise
+
+    def replayable(self):
+        """Tells whether the request can be sent again once written."""
+        return self.idempotent and self.framing[0] == FRAMING_NONE
+
+    def waiting(self, timeout):
+        """Tells whether the response head is still awaited after waiting up
+        to ``timeout`` seconds."""
+        if self.upconn.reader.buffered():
+            return False
+        try:
+            readable, _, _ = select.select([self.upconn.sock], [], [], timeout)
+        except (OSError, ValueError):
+            return False
+        return not readable
+
+    def read_head(self, policy, deadline):
+        """
+        Reads the response head, within the read timeout and ``deadline``.
+
+        :raises OSError, ValueError: If the upstream fails or times out.
+
+        :rtype bytes: the response head.
+        """
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.discard()
+                raise socket.timeout("Upstream {} timed out".format(self.upstream.address))
+            self.upconn.sock.settimeout(min(policy.read, remaining))
+            try:
+                head = self.upconn.reader.read_head()
+                if not head:
+                    raise ValueError("Upstream closed the connection without answering")
+            except socket.timeout:
+                self.discard()
+                raise
+            except (socket.error, ValueError):
+                self.discard()
+                if self.reused and self.replayable():
+                    self.send(policy)
+                    continue
+                raise
+            # The body is only bound by the read timeout
+            self.upconn.sock.settimeout(policy.read)
+            return head
+
+    def discard(self):
+        """Closes the connection of an attempt that failed or lost."""
+        if self.upconn is not None:
+            self.pool.discard(self.upconn)
+            self.upconn = None
+
+
+def report(attempt, ok, latency=0.0):
+    """Feeds the outcome of an attempt to the passive health checks and
+    the circuit breaker of its upstream."""
+    health.report(attempt.upstream, ok)
+    breaker.record(attempt.upstream, ok, latency, attempt.probe)
+
+
+def _drop(balancer, attempt, failed):
+    """Ends an attempt whose response is not relayed."""
+    attempt.discard()
+    if failed:
+        report(attempt, False)
+    else:
+        breaker.cancel(attempt.upstream, attempt.probe)
+    balancer.release(attempt.upstream)
 
-    :params host (str): IP address of the backend server.
-    :params port (int): port number of the backend server.
-    :params request (str): incoming HTTP request.
 
-    :rtype bytes: Raw HTTP response from the backend server. If the connection
-                  fails, returns a 404 Not Found response.
+def exchange(balancer, client_ip, cookie, tried, method, payload, client, framing,
+             policy, deadline, hedge_delay=None):
     """
+    Sends a request to an upstream of ``balancer`` and waits for the first
+    response head. With a ``hedge_delay``, a request still unanswered
+    after that many seconds is sent to a second upstream as well, and the
+    first head to arrive wins.
+
+    Failed and abandoned attempts are released here. The winning upstream
+    is still counted in flight; the caller releases it.
 
-    backend = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    :params tried (list): upstreams tried so far, extended with the ones
+                          chosen here.
 
+    :raises OSError, ValueError: If every attempt failed or timed out.
+
+    :rtype tuple: (winning :class:`Attempt`, response head).
+    """
+    upstream, probe = balancer.choose(client_ip, cookie, exclude=tried)
+    tried.append(upstream)
+    attempt = Attempt(upstream, method, payload, client, framing, probe)
     try:
-        backend.connect((host, port))
-        backend.sendall(request.encode())
-        response = b""
-        while True:
-            chunk = backend.recv(4096)
-            if not chunk:
-                break
-            response += chunk
-        return response
-    except socket.error as e:
-      print("Socket error: {}".format(e))
-      return (
-            "HTTP/1.1 404 Not Found\r\n"
-            "Content-Type: text/plain\r\n"
-            "Content-Length: 13\r\n"
-            "Connection: close\r\n"
-            "\r\n"
-            "404 Not Found"
-        ).encode('utf-8')
-
-
-def resolve_routing_policy(hostname, routes):
-    """
-    Handles an routing policy to return the matching proxy_pass.
-    It determines the target backend to forward the request to.
-
-    :params host (str): IP address of the request target server.
-    :params port (int): port number of the request target server.
-    :params routes (dict): dictionary mapping hostnames and location.
-    """
-
-    print(hostname)
-    proxy_map, policy = routes.get(hostname,('127.0.0.1:9000','round-robin'))
-    print(proxy_map)
-    print(policy)
-
-    proxy_host = ''
-    proxy_port = '9000'
-    if isinstance(proxy_map, list):
-        if len(proxy_map) == 0:
-            print("[Proxy] Emtpy resolved routing of hostname {}".format(hostname))
-            print("Empty proxy_map result")
-            # TODO: implement the error handling for non mapped host
-            #       the policy is design by team, but it can be 
-            #       basic default host in your self-defined system
-            # Use a dummy host to raise an invalid connection
-            proxy_host = '127.0.0.1'
-            proxy_port = '9000'
-        elif len(proxy_map) == 1:
-            proxy_host, proxy_port = proxy_map[0].split(":", 2)
-        #elif: # apply the policy handling 
-        #   proxy_map
-        #   policy
+        attempt.send(policy)
+    except (socket.error, ValueError):
+        _drop(balancer, attempt, True)
+        raise
+    pending = [attempt]
+
+    if hedge_delay is not None and hedge_delay < deadline - time.monotonic() \
+            and attempt.waiting(hedge_delay):
+        upstream, probe = balancer.choose(client_ip, cookie, exclude=tried)
+        if upstream in tried:
+            # A single upstream, hedging would only double its load
+            breaker.cancel(upstream, probe)
+            balancer.release(upstream)
         else:
-            # Out-of-handle mapped host
-            proxy_host = '127.0.0.1'
-            proxy_port = '9000'
+            tried.append(upstream)
+            hedge = Attempt(upstream, method, payload, client, framing, probe)
+            print("[Proxy] Hedging {} with {}".format(attempt.upstream.address,
+                                                      upstream.address))
+            try:
+                hedge.send(policy)
+                pending.append(hedge)
+            except (socket.error, ValueError):
+                _drop(balancer, hedge, True)
+
+    error = None
+    while pending:
+        remaining = deadline - time.monotonic()
+        ready = [a for a in pending if a.upconn.reader.buffered()]
+        if not ready and remaining > 0:
+            try:
+                readable, _, _ = select.select([a.upconn.sock for a in pending], [], [],
+                                               min(policy.read, remaining))
+            except (OSError, ValueError):
+                readable = [a.upconn.sock for a in pending]
+            ready = [a for a in pending if a.upconn.sock in readable]
+        if not ready:
+            for late in pending:
+                _drop(balancer, late, True)
+            raise socket.timeout("Upstream {} timed out".format(
+                ", ".join(a.upstream.address for a in pending)))
+        attempt = ready[0]
+        pending.remove(attempt)
+        try:
+            head = attempt.read_head(policy, deadline)
+        except (socket.error, ValueError) as e:
+            _drop(balancer, attempt, True)
+            error = e
+            continue
+        for loser in pending:
+            _drop(balancer, loser, False)
+        attempt.latency = time.monotonic() - attempt.started
+        policy.latencies.add(attempt.latency)
+        return attempt, head
+    raise error
+
+
+def relay_response(attempt, method, response_head, conn, cached=None, flight=None):
+    """
+    Streams the response of a won attempt back to the client, through the
+    fixed buffers of :mod:`daemon.relay`, and returns its connection to
+    the pool.
+
+    With ``cached`` a storable response is kept in the cache while it is
+    relayed, and a ``304`` answer to a revalidation renews the stored
+    response, which is then served from the cache.
+
+    With ``flight`` the response is also fanned out to the requests
+    coalesced with this one, when it can be shared.
+
+    :params attempt (Attempt): attempt whose response head was read.
+    :params method (str): method of the request.
+    :params response_head (bytes): the response head.
+    :params conn (socket.socket): client connection socket, or ``None`` to
+                                  only refresh the cache.
+    :params cached (CachedRequest): cache bookkeeping of the request, or
+                                    ``None`` to bypass the cache.
+    :params flight (Flight): coalesced fetch led by the request, or
+                             ``None``.
+
+    :raises ValueError: If the status line is invalid.
+
+    :rtype int: status code of the upstream response.
+    """
+    pool, upconn = attempt.pool, attempt.upconn
+    upstream = upconn.reader
+    status_line, response_headers = parse_head(response_head)
+    version, _, rest = status_line.partition(" ")
+    try:
+        status = int(rest[:3])
+    except ValueError:
+        attempt.discard()
+        raise ValueError("Invalid upstream status line {}".format(status_line))
+    connection = response_headers.get("connection", "").lower()
+    if version == "HTTP/1.1":
+        reusable = "close" not in connection
     else:
-        print("[Proxy] resolve route of hostname {} is a singulair to".format(hostname))
-        proxy_host, proxy_port = proxy_map.split(":", 2)
+        reusable = "keep-alive" in connection
+    framing = response_framing(method, status, response_headers)
+
+    if cached is not None and cached.entry is not None and status == 304:
+        # Still valid, the stored response answers the client
+        if flight is not None:
+            flight.decline()
+        pool.release(upconn, reusable and not upstream.buffered())
+        cached.cache.refresh(cached.entry, response_headers)
+        if conn is not None:
+            cached.cache.serve(cached.entry, conn, cached.method, cached.headers)
+        return status
+    out = conn
+    if flight is not None and flight.accept(status, response_headers, framing):
+        out = FlightWriter(conn, flight)
+    capture = None
+    if cached is not None and storable(method, status, response_headers,
+                                       cached.cache.max_object_bytes):
+        capture = _Capture(out)
+    elif conn is None:
+        # Nobody waits for this response, do not read it
+        attempt.discard()
+        return status
+
+    try:
+        # The proxy closes the client connection after the response
+        if out is not None:
+            out.sendall(set_connection(response_head, False))
+        upstream.relay_body(capture or out, framing)
+    except (socket.error, ValueError) as e:
+        # Too late to answer the client otherwise, just drop both ends
+        print("[Proxy] Relay from {} interrupted: {}".format(attempt.upstream.address, e))
+        attempt.discard()
+        return status
+    # Stray bytes after the response put the connection out of sync
+    pool.release(upconn, reusable and framing[0] != FRAMING_EOF
+                 and not upstream.buffered())
+    if capture is not None:
+        cached.cache.store(cached.key, cached.head, cached.headers, response_head,
+                           response_headers, bytes(capture.data))
+    return status
+
+
+def find_balancer(hostname, path, routes):
+    """
+    Returns the balancer of a request, see :mod:`daemon.routing`.
+
+    :rtype Balancer: the balancer of the location of ``path`` in the host
+                     block of ``hostname``, the default route for unknown
+                     hosts, or ``None`` if no location of the block
+                     matches.
+    """
+    route = routes.get(hostname)
+    if route is None:
+        print("[Proxy] No host block for hostname {}, using the default route".format(hostname))
+        return DEFAULT_ROUTE
+    return route.match(path)
+
+
+def proxy_request(hostname, routes, client_ip, cookie, head, client, conn, cached=None):
+    """
+    Forwards a request to the upstreams of the host block of ``hostname``,
+    or of its location matching the request path, and streams the response
+    back to the client; a path no location matches gets a 404.
+
+    The timeouts, retries and hedging of the block apply, see
+    :mod:`daemon.timeouts`: an idempotent request is tried again on another
+    upstream when its upstream fails or answers 502, 503 or 504 before
+    anything reached the client. Each outcome feeds the passive health
+    checks and the circuit breaker of the upstream.
+
+    With ``proxy_coalesce`` an identical ``GET`` already in flight is not
+    sent again, its response is shared, see :mod:`daemon.coalesce`.
+
+    :params head (bytes): request head, read from the client.
+    :params client (SocketReader): reader of the client connection, at the
+                                   start of the request body, or ``None``
+                                   for a request without one.
+    :params conn (socket.socket): client connection socket, or ``None`` to
+                                  only refresh the cache.
+    :params cached (CachedRequest): cache bookkeeping of the request, or
+                                    ``None`` to bypass the cache.
+
+    :raises OSError, ValueError: If no upstream answered, the caller
+                                 answers then.
+
+    :rtype int: status code of the upstream response.
+    """
+    request_line, request_headers = parse_head(head)
+    method, _, target = request_line.partition(" ")
+    target = target.rpartition(" ")[0]
+    path = target.split("?", 1)[0]
+    balancer = find_balancer(hostname, path, routes)
+    if balancer is None:
+        print("[Proxy] No location of {} matches {}".format(hostname, path))
+        if conn is not None:
+            conn.sendall(NOT_FOUND)
+        return 404
+    policy = balancer.request_policy or DEFAULT_REQUEST_POLICY
+    payload, framing, replayable = prepare_request(head, client)
+    tries = policy.tries(method, replayable)
+    hedge_delay = policy.hedge_delay(method, replayable)
+    deadline = time.monotonic() + policy.total
+
+    flight = None
+    coalescer = balancer.coalescer
+    if coalescer is not None and method == 'GET' and replayable and conn is not None:
+        key = coalescer.key(method, hostname, target, request_headers)
+        if key is not None:
+            flight, leader = coalescer.join(key)
+            if not leader:
+                status = follow(flight, conn, policy.total)
+                if status is not None:
+                    return status
+                # Not shared, fetched like any other request
+                flight = None
+
+    failed = False
+    try:
+        tried = []
+        while True:
+            tries -= 1
+            try:
+                attempt, response_head = exchange(balancer, client_ip, cookie, tried, method,
+                                                  payload, client, framing, policy, deadline,
+                                                  hedge_delay)
+            except (socket.error, ValueError) as e:
+                if not tries or time.monotonic() >= deadline:
+                    raise
+                print("[Proxy] Retrying {} {}: {}".format(method, hostname, e))
+                continue
+            upstream = attempt.upstream
+            if tries and _status(response_head) in RETRY_STATUSES:
+                print("[Proxy] Retrying {} {}: {} answered {}".format(
+                    method, hostname, upstream.address, _status(response_head)))
+                _drop(balancer, attempt, True)
+                continue
+            try:
+                print("[Proxy] Host name {} is forwarded to {}".format(hostname, upstream.address))
+                status = relay_response(attempt, method, response_head, conn, cached,
+                                        flight)
+                report(attempt, status < 500, attempt.latency)
+                return status
+            except (socket.error, ValueError):
+                report(attempt, False)
+                raise
+            finally:
+                balancer.release(upstream)
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        if flight is not None:
+            flight.finish(failed)
+
+
+def _status(response_head):
+    try:
+        return int(response_head[9:12])
+    except ValueError:
+        return 0
 
-    return proxy_host, proxy_port
 
-def handle_client(ip, port, conn, addr, routes):
+def revalidate(cache, entry, hostname, routes):
+    """
+    Refreshes a stale stored response, run in the background while the
+    stale response is still being served.
+    """
+    _, headers = parse_head(entry.request_head)
+    cached = CachedRequest(cache, entry.key, 'GET', entry.request_head, headers, entry)
+    try:
+        proxy_request(hostname, routes, '', headers.get('cookie', ''),
+                      cache.conditional_head(entry), None, None, cached)
+    except (socket.error, ValueError) as e:
+        print("[Proxy] Revalidating {} failed: {}".format(entry.key, e))
+    finally:
+        cache.release_revalidation(entry)
+
+
+def handle_client(ip, port, conn, addr, routes, cache=None):
     """
     Handles an individual client connection by parsing the request,
     determining the target backend, and forwarding the request.
@@ -129,65 +595,100 @@ def handle_client(ip, port, conn, addr, routes):
     matches the hostname against known routes. In the matching
     condition,it forwards the request to the appropriate backend.
 
-    The handler sends the backend response back to the client or
-    returns 404 if the hostname is unreachable or is not recognized.
+    The handler streams the backend response back to the client or
+    returns 502 if the backend is unreachable, 504 if it did not answer in
+    time. Each outcome feeds the
+    passive health checks of the backend, see :mod:`daemon.health`.
+
+    With a ``cache``, fresh stored responses are served without reaching
+    the backend, stale ones are served while one background request
+    revalidates them, and expired ones are revalidated first, see
+    :mod:`daemon.cache`.
 
     :params ip (str): IP address of the proxy server.
     :params port (int): port number of the proxy server.
     :params conn (socket.socket): client connection socket.
     :params addr (tuple): client address (IP, port).
-    :params routes (dict): dictionary mapping hostnames and location.
+    :params routes (RoutingTable): routing table mapping hostnames to
+                                   host routes.
+    :params cache (daemon.cache.HttpCache): response cache, or ``None``.
     """
 
-    request = conn.recv(1024).decode()
-
-    # Extract hostname
-    for line in request.splitlines():
-        if line.lower().startswith('host:'):
-            hostname = line.split(':', 1)[1].strip()
+    # Only the request head is read before routing, the body is relayed
+    client = SocketReader(conn)
+    try:
+        head = client.read_head()
+    except (socket.error, ValueError) as e:
+        print("[Proxy] Invalid request from {}: {}".format(addr, e))
+        head = b""
+    if not head:
+        conn.close()
+        return
+
+    # Extract hostname and cookies
+    request_line, headers = parse_head(head)
+    hostname = headers.get('host', '')
+    cookie = headers.get('cookie', '')
 
     print("[Proxy] {} at Host: {}".format(addr, hostname))
 
-    # Resolve the matching destination in routes and need conver port
-    # to integer value
-    resolved_host, resolved_port = resolve_routing_policy(hostname, routes)
-    try:
-        resolved_port = int(resolved_port)
-    except ValueError:
-        print("Not a valid integer")
+    cached = None
+    method, _, target = request_line.partition(" ")
+    if cache is not None and not request_bypasses(method, headers):
+        target = target.rpartition(" ")[0] or target
+        cached = CachedRequest(cache, cache_key(hostname, target), method, head, headers)
+        entry = cache.lookup(cached.key, headers)
+        state = cache.freshness(entry) if entry is not None else None
+        if state in (FRESH, STALE) and not request_revalidates(headers):
+            if state == STALE and cache.claim_revalidation(entry):
+                threading.Thread(target=revalidate, args=(cache, entry, hostname, routes),
+                                 daemon=True).start()
+            try:
+                cache.serve(entry, conn, method, headers)
+            except socket.error as e:
+                print("[Proxy] Cached response to {} interrupted: {}".format(addr, e))
+            conn.close()
+            return
+        if entry is not None and method == 'GET':
+            # Expired, or the client asks for a revalidated response
+            cached.entry = entry
+            head = cache.conditional_head(entry, head)
 
-    if resolved_host:
-        print("[Proxy] Host name {} is forwarded to {}:{}".format(hostname,resolved_host, resolved_port))
-        response = forward_request(resolved_host, resolved_port, request)        
-    else:
-        response = (
-            "HTTP/1.1 404 Not Found\r\n"
-            "Content-Type: text/plain\r\n"
-            "Content-Length: 13\r\n"
-            "Connection: close\r\n"
-            "\r\n"
-            "404 Not Found"
-        ).encode('utf-8')
-    conn.sendall(response)
+    try:
+        proxy_request(hostname, routes, addr[0], cookie, head, client, conn, cached)
+    except (socket.error, ValueError) as e:
+        print("Socket error: {}".format(e))
+        try:
+            conn.sendall(GATEWAY_TIMEOUT if isinstance(e, socket.timeout) else BAD_GATEWAY)
+        except socket.error:
+            pass
     conn.close()
 
-def run_proxy(ip, port, routes):
+def run_proxy(ip, port, routes, cache=None):
     """
     Starts the proxy server and listens for incoming connections. 
 
     The process dinds the proxy server to the specified IP and port.
     In each incomping connection, it accepts the connections and
     spawns a new thread for each client using `handle_client`.
- 
+    Each connection is routed with the routing table current when it
+    was accepted, see :mod:`daemon.routing`.
 
     :params ip (str): IP address to bind the proxy server.
     :params port (int): port number to listen on.
-    :params routes (dict): dictionary mapping hostnames and location.
+    :params routes (Router or dict): router of the configuration, or a
+                                     fixed dictionary mapping hostnames
+                                     to balancers.
+    :params cache (daemon.cache.HttpCache): response cache, or ``None``.
 
     """
 
     proxy = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
 
+    router = routes if isinstance(routes, Router) else Router(table=RoutingTable(routes))
+    for balancer in router.table.balancers():
+        health.start(balancer)
+
     try:
         proxy.bind((ip, port))
         proxy.listen(50)
@@ -199,7 +700,7 @@ def run_proxy(ip, port, routes):
             #
             client_thread = threading.Thread(
                 target=handle_client,
-                args=(ip, port, conn, addr, routes),
+                args=(ip, port, conn, addr, router.table, cache),
                 daemon=True
             )
             client_thread.start()
@@ -207,13 +708,16 @@ def run_proxy(ip, port, routes):
     except socket.error as e:
       print("Socket error: {}".format(e))
 
-def create_proxy(ip, port, routes):
+def create_proxy(ip, port, routes, cache=None):
     """
     Entry point for launching the proxy server.
 
     :params ip (str): IP address to bind the proxy server.
     :params port (int): port number to listen on.
-    :params routes (dict): dictionary mapping hostnames and location.
+    :params routes (Router or dict): router of the configuration, or a
+                                     fixed dictionary mapping hostnames
+                                     to balancers.
+    :params cache (daemon.cache.HttpCache): response cache, or ``None``.
     """
 
-    run_proxy(ip, port, routes)
+    run_proxy(ip, port, routes, cache)
@@ -0,0 +1,124 @@
+#
+# Copyright (C) 2025 pdnguyen of HCMC University of Technology VNU-HCM.
+# All rights reserved.
+# This file is part of the CO3093/CO3094 course.
+#
+# WeApRous release
+#
+# The authors hereby grant to Licensee personal permission to use
+# and modify the Licensed Source Code for the sole purpose of studying
+# while attending the course
+#
+
+"""
+daemon.ratelimit
+~~~~~~~~~~~~~~~~~
+
+This module provides token bucket rate limiting for WeApRous routes.
+
+Each client key (a peer name or an IP address) owns a bucket refilled at
+``rate`` tokens per second up to ``burst`` tokens; a request spends one
+token. Buckets live in a bounded LRU table so memory stays flat however many
+keys are seen; an evicted key simply starts again with a full bucket.
+
+The table is not locked. Every step is a single dict operation or a float
+update, atomic under the GIL, so concurrent requests of one key can at
+worst both spend the same token. In exchange an allowed request costs about
+a microsecond.
+
+Usage::
+
+  >>> limiter = RateLimiter(rate=5, burst=10)
+  >>> @app.route('/broadcast-peer', methods=['POST'], rate_limit=limiter)
+  >>> def broadcast_peer(request):
+  >>>     ...
+"""
+
+import time
+from collections import OrderedDict
+
+DEFAULT_MAX_KEYS = 10000
+
+
+class _Bucket:
+    __slots__ = ("tokens", "stamp")
+
+    def __init__(self, tokens, stamp):
+        self.tokens = tokens
+        self.stamp = stamp
+
+
+def client_ip(request):
+    """Rate limit key of a request: the client IP address."""
+    return request.remote_addr
+
+
+class RateLimiter:
+    """The :class:`RateLimiter <RateLimiter>` object keeps one token bucket
+    per client key.
+
+    :attrs rate (float): tokens added per second.
+    :attrs burst (float): bucket capacity, the largest burst allowed.
+    :attrs key (function): ``key(request)`` returns the bucket key of a
+        request, :func:`client_ip` by default.
+    :attrs max_keys (int): number of buckets kept, least recently used
+        buckets are evicted first.
+    :attrs exempt (function): ``exempt(request)`` tells whether a request
+        spends no token, e.g. a retry answered from a stored result, or
+        ``None``.
+    """
+
+    def __init__(self, rate, burst=None, key=client_ip, max_keys=DEFAULT_MAX_KEYS,
+                 exempt=None):
+        if rate <= 0:
+            raise ValueError("Rate must be positive")
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(1.0, rate))
+        self.key = key
+        self.max_keys = max_keys
+        self.exempt = exempt
+        self.buckets = OrderedDict()
+
+    def acquire(self, key, cost=1.0, now=None):
+        """
+        Spends ``cost`` tokens of the bucket of ``key``.
+
+        :rtype float: 0.0 if allowed, else the seconds until enough tokens
+                      are available; nothing is spent then.
+        """
+        if now is None:
+            now = time.monotonic()
+        buckets = self.buckets
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = _Bucket(self.burst, now)
+            if len(buckets) > self.max_keys:
+                try:
+                    buckets.popitem(last=False)
+                except KeyError:
+                    pass
+        else:
+            try:
+                buckets.move_to_end(key)
+            except KeyError:
+                # Evicted by a concurrent request, keep using the bucket
+                pass
+        tokens = bucket.tokens + (now - bucket.stamp) * self.rate
+        if tokens > self.burst:
+            tokens = self.burst
+        bucket.stamp = now
+        if tokens >= cost:
+            bucket.tokens = tokens - cost
+            return 0.0
+        bucket.tokens = tokens
+        return (cost - tokens) / self.rate
+
+    def check(self, request):
+        """
+        Spends one token for ``request``, none if it is exempt.
+
+        :rtype float: 0.0 if allowed, else the seconds to wait.
+        """
+        if self.exempt is not None and self.exempt(request):
+            return 0.0
+        return self.acquire(self.key(request))
@@ -0,0 +1,215 @@
+#
+# Copyright (C) 2025 pdnguyen of HCMC University of Technology VNU-HCM.
+# All rights reserved.
+# This file is part of the CO3093/CO3094 course.
+#
+# WeApRous release
+#
+# The authors hereby grant to Licensee personal permission to use
+# and modify the Licensed Source Code for the sole purpose of studying
+# while attending the course
+#
+
+"""
+daemon.registry
+~~~~~~~~~~~~~~~~~
+
+This module provides the :class:`PeerRegistry <PeerRegistry>` used by the chat
+tracker to keep the set of registered peers.
+
+Peers are indexed by name in a dictionary, so upsert, lookup and removal are
+O(1). Every mutation bumps a monotonically increasing version number and is
+recorded in a bounded changelog, so clients that already know version ``v``
+can fetch only the peers added, updated or removed since then. The
+registry is persisted write-behind: mutations only mark it dirty and a
+background thread saves a snapshot after a short debounce delay, so disk I/O
+never happens on the request path or while the lock is held.
+
+Usage::
+
+  >>> registry = PeerRegistry()
+  >>> registry.start_writer(save_peer_list)
+  >>> registry.upsert('alice', '127.0.0.1', '5001')
+  True
+  >>> 'alice' in registry
+  True
+"""
+
+import threading
+import time
+from collections import deque
+
+#: Delay in seconds between the first unsaved mutation and the disk write.
+DEFAULT_DEBOUNCE = 0.5
+
+#: Number of mutations kept in the changelog.
+DEFAULT_CHANGELOG_SIZE = 1024
+
+PEER_ADDED = 'added'
+PEER_UPDATED = 'updated'
+PEER_REMOVED = 'removed'
+
+
+class PeerRegistry:
+    """The :class:`PeerRegistry <PeerRegistry>` object maps peer names to peer
+    records (``{'name', 'ip', 'port'}`` dictionaries).
+
+    Records are never mutated in place; an update stores a new record, so
+    snapshots handed out to callers stay consistent without copying.
+
+    :attrs peers (dict): peer name to peer record.
+    :attrs version (int): incremented on every mutation.
+    :attrs changes (deque): ``(version, name, op)`` of the latest mutations.
+    """
+
+    def __init__(self, debounce=DEFAULT_DEBOUNCE, changelog_size=DEFAULT_CHANGELOG_SIZE):
+        self.lock = threading.Lock()
+        self.peers = {}
+        # Versions start from the clock so they keep increasing across
+        # restarts and a client's stale version is never mistaken for a
+        # recent one.
+        self.version = int(time.time() * 1000)
+        self.changes = deque(maxlen=changelog_size)
+        self.debounce = debounce
+        self._save = None
+        self._saved_version = self.version
+        self._dirty = threading.Event()
+        self._writer = None
+
+    def __len__(self):
+        return len(self.peers)
+
+    def __contains__(self, name):
+        return name in self.peers
+
+    def get(self, name):
+        """Returns the record of ``name`` or ``None``."""
+        return self.peers.get(name)
+
+    def upsert(self, name, ip, port):
+        """
+        Registers ``name`` or updates its address.
+
+        :rtype bool: ``True`` if the peer was not registered before.
+        """
+        record = {'name': name, 'ip': ip, 'port': port}
+        with self.lock:
+            previous = self.peers.get(name)
+            if previous == record:
+                return False
+            self.peers[name] = record
+            self._record(name, PEER_UPDATED if previous else PEER_ADDED)
+        self._dirty.set()
+        return previous is None
+
+    def remove(self, name):
+        """
+        Removes ``name`` from the registry.
+
+        :rtype bool: ``True`` if the peer was registered.
+        """
+        with self.lock:
+            if self.peers.pop(name, None) is None:
+                return False
+            self._record(name, PEER_REMOVED)
+        self._dirty.set()
+        return True
+
+    def _record(self, name, op):
+        self.version += 1
+        self.changes.append((self.version, name, op))
+
+    def delta(self, since):
+        """
+        Returns the changes made after version ``since``.
+
+        :param since (int): version already known by the caller.
+
+        :rtype tuple: (version, added records, updated records, removed
+                       names), or ``None`` when the changelog no longer
+                       covers ``since`` and a full snapshot is needed.
+        """
+        with self.lock:
+            if since > self.version:
+                return None
+            if since < self.version and (not self.changes or self.changes[0][0] > since + 1):
+                return None
+
+            # First and last operation per peer after ``since``
+            first = {}
+            for version, name, op in reversed(self.changes):
+                if version <= since:
+                    break
+                first[name] = op
+
+            added, updated, removed = [], [], []
+            for name, op in first.items():
+                record = self.peers.get(name)
+                if record is None:
+                    if op != PEER_ADDED:
+                        removed.append(name)
+                elif op == PEER_ADDED:
+                    added.append(record)
+                else:
+                    updated.append(record)
+            return self.version, added, updated, removed
+
+    def names(self):
+        """Returns the names of all registered peers."""
+        with self.lock:
+            return list(self.peers)
+
+    def snapshot(self):
+        """
+        Returns the current version and the list of peer records.
+
+        :rtype tuple: (version, list of peer records).
+        """
+        with self.lock:
+            return self.version, list(self.peers.values())
+
+    def load(self, peers):
+        """Replaces the content with ``peers``, a list of peer records."""
+        with self.lock:
+            self.peers = {}
+            for peer in peers:
+                if 'name' in peer:
+                    self.peers[peer['name']] = {'name': peer['name'],
+                                                'ip': peer.get('ip', ''),
+                                                'port': peer.get('port', '')}
+            self.version += 1
+            self.changes.clear()
+            self._saved_version = self.version
+
+    #
+    # Write-behind persistence
+    #
+
+    def start_writer(self, save):
+        """
+        Starts the background thread persisting the registry.
+
+        :param save (function): called with the list of peer records.
+        """
+        self._save = save
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._write_loop, daemon=True)
+            self._writer.start()
+
+    def _write_loop(self):
+        while True:
+            self._dirty.wait()
+            # Debounce: coalesce the burst of mutations into one write
+            time.sleep(self.debounce)
+            self._dirty.clear()
+            self.flush()
+
+    def flush(self):
+        """Synchronously saves the registry if it changed since the last save."""
+        if self._save is None:
+            return
+        version, peers = self.snapshot()
+        if version == self._saved_version:
+            return
+        if self._save(peers):
+            self._saved_version = version
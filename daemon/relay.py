@@ -0,0 +1,254 @@
+#
+# Copyright (C) 2025 pdnguyen of HCMC University of Technology VNU-HCM.
+# All rights reserved.
+# This file is part of the CO3093/CO3094 course.
+#
+# WeApRous release
+#
+# The authors hereby grant to Licensee personal permission to use
+# and modify the Licensed Source Code for the sole purpose of studying
+# while attending the course
+#
+
+"""
+daemon.relay
+~~~~~~~~~~~~~~~~~
+
+This module provides the buffered socket reader the proxy uses to stream
+HTTP messages between a client and an upstream.
+
+A :class:`SocketReader <SocketReader>` owns one preallocated buffer that
+``recv_into`` fills through a :class:`memoryview`. Only message heads are
+copied out; bodies are relayed from the buffer to the other socket as they
+arrive, so a proxied message costs at most ``BUFFER_SIZE`` bytes per
+direction whatever its length, and the first bytes of a response reach the
+client before the upstream has finished sending it.
+
+Bodies are framed as HTTP/1.1 does:
+
+- ``none``: no body (HEAD, 1xx, 204 and 304 responses, requests without
+  a length),
+- ``length``: ``Content-Length`` bytes,
+- ``chunked``: chunks up to the zero-size chunk and the trailers,
+- ``eof``: responses without a length, up to the end of the connection.
+
+Usage::
+
+  >>> client = SocketReader(conn)
+  >>> head = client.read_head()
+  >>> start_line, headers = parse_head(head)
+  >>> upstream.sendall(head)
+  >>> client.relay_body(upstream, request_framing(headers))
+"""
+
+#: Size of the buffer of a reader, also the largest message head accepted.
+BUFFER_SIZE = 64 * 1024
+
+FRAMING_NONE = 'none'
+FRAMING_LENGTH = 'length'
+FRAMING_CHUNKED = 'chunked'
+FRAMING_EOF = 'eof'
+
+
+def parse_head(head):
+    """
+    Splits a message head into its start line and headers.
+
+    :param head (bytes): head, ending with the blank line.
+
+    :rtype tuple: (start line, dict of lower-cased header names to values).
+    """
+    lines = head.decode('latin-1').split("\r\n")
+    headers = {}
+    for line in lines[1:]:
+        name, sep, value = line.partition(":")
+        if sep:
+            headers[name.strip().lower()] = value.strip()
+    return lines[0], headers
+
+
+def _length(headers):
+    try:
+        length = int(headers['content-length'])
+    except ValueError:
+        raise ValueError("Invalid Content-Length {}".format(headers['content-length']))
+    if length < 0:
+        raise ValueError("Invalid Content-Length {}".format(length))
+    return length
+
+
+def request_framing(headers):
+    """
+    Returns how the body of a request is framed.
+
+    :rtype tuple: (framing, length), the length being only meaningful for
+                  ``length`` framing.
+    """
+    if 'chunked' in headers.get('transfer-encoding', '').lower():
+        return FRAMING_CHUNKED, 0
+    if 'content-length' in headers:
+        return FRAMING_LENGTH, _length(headers)
+    return FRAMING_NONE, 0
+
+
+def response_framing(method, status, headers):
+    """
+    Returns how the body of a response is framed.
+
+    :param method (str): method of the request answered.
+    :param status (int): response status code.
+
+    :rtype tuple: (framing, length).
+    """
+    if method == 'HEAD' or status < 200 or status in (204, 304):
+        return FRAMING_NONE, 0
+    if 'chunked' in headers.get('transfer-encoding', '').lower():
+        return FRAMING_CHUNKED, 0
+    if 'content-length' in headers:
+        return FRAMING_LENGTH, _length(headers)
+    return FRAMING_EOF, 0
+
+
+class SocketReader:
+    """The :class:`SocketReader <SocketReader>` object reads one socket
+    through a fixed buffer.
+
+    Bytes between ``start`` and ``end`` of the buffer are received and not
+    consumed yet.
+
+    :attrs sock (socket.socket): socket read from.
+    :attrs buf (bytearray): the buffer.
+    """
+
+    __slots__ = ("sock", "buf", "view", "start", "end")
+
+    def __init__(self, sock, size=BUFFER_SIZE):
+        self.sock = sock
+        self.buf = bytearray(size)
+        self.view = memoryview(self.buf)
+        self.start = 0
+        self.end = 0
+
+    def buffered(self):
+        """Number of received bytes not consumed yet."""
+        return self.end - self.start
+
+    def fill(self):
+        """
+        Receives more bytes into the buffer, moving unconsumed bytes to its
+        front first if it is full.
+
+        :raises ValueError: If the buffer is full of unconsumed bytes.
+
+        :rtype int: bytes received, 0 once the peer closed the connection.
+        """
+        if self.start == self.end:
+            self.start = self.end = 0
+        elif self.end == len(self.buf):
+            if self.start == 0:
+                raise ValueError("Message head larger than {} bytes".format(len(self.buf)))
+            count = self.end - self.start
+            self.view[:count] = self.view[self.start:self.end]
+            self.start, self.end = 0, count
+        received = self.sock.recv_into(self.view[self.end:])
+        self.end += received
+        return received
+
+    def _find(self, marker):
+        while True:
+            index = self.buf.find(marker, self.start, self.end)
+            if index >= 0:
+                return index + len(marker)
+            if not self.fill():
+                return -1
+
+    def read_head(self):
+        """
+        Reads a message head.
+
+        :raises ValueError: If the connection closed in the middle of the
+                            head or the head does not fit in the buffer.
+
+        :rtype bytes: the head, ending with the blank line, or ``b""`` if
+                      the connection closed before a new message started.
+        """
+        end = self._find(b"\r\n\r\n")
+        if end < 0:
+            if self.start == self.end:
+                return b""
+            raise ValueError("Connection closed in the middle of a message head")
+        head = bytes(self.view[self.start:end])
+        self.start = end
+        return head
+
+    def read_line(self):
+        """
+        Reads one CRLF terminated line, e.g. a chunk size.
+
+        :raises ValueError: If the connection closed first.
+
+        :rtype bytes: the line with its CRLF.
+        """
+        end = self._find(b"\r\n")
+        if end < 0:
+            raise ValueError("Connection closed in the middle of a chunked body")
+        line = bytes(self.view[self.start:end])
+        self.start = end
+        return line
+
+    def relay(self, out, length):
+        """
+        Sends the next ``length`` bytes of the stream to socket ``out``.
+
+        :raises ValueError: If the connection closed first.
+        """
+        while length:
+            if self.start == self.end and not self.fill():
+                raise ValueError("Connection closed in the middle of a body")
+            count = min(length, self.end - self.start)
+            out.sendall(self.view[self.start:self.start + count])
+            self.start += count
+            length -= count
+
+    def relay_chunked(self, out):
+        """Sends a chunked body, up to its trailers, to socket ``out``."""
+        while True:
+            line = self.read_line()
+            out.sendall(line)
+            try:
+                size = int(line.split(b";", 1)[0].strip(), 16)
+            except ValueError:
+                raise ValueError("Invalid chunk size {!r}".format(line))
+            if size == 0:
+                break
+            self.relay(out, size + 2)
+        # Trailers, if any, end with an empty line
+        while True:
+            line = self.read_line()
+            out.sendall(line)
+            if line == b"\r\n":
+                return
+
+    def relay_to_eof(self, out):
+        """Sends the rest of the stream to socket ``out``."""
+        while True:
+            if self.start < self.end:
+                out.sendall(self.view[self.start:self.end])
+                self.start = self.end
+            if not self.fill():
+                return
+
+    def relay_body(self, out, framing):
+        """
+        Sends a body framed as ``framing`` to socket ``out``.
+
+        :param framing (tuple): (framing, length), as returned by
+            :func:`request_framing` or :func:`response_framing`.
+        """
+        kind, length = framing
+        if kind == FRAMING_LENGTH:
+            self.relay(out, length)
+        elif kind == FRAMING_CHUNKED:
+            self.relay_chunked(out)
+        elif kind == FRAMING_EOF:
+            self.relay_to_eof(out)
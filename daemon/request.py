@@ -17,8 +17,14 @@ daemon.request
 This module provides a Request object to manage and persist 
 request settings (cookies, auth, proxies).
 """
+import json
+from urllib.parse import parse_qsl
+
 from .dictionary import CaseInsensitiveDict
 
+#: Marks a cached body representation that was not parsed yet
+_UNPARSED = object()
+
 class Request():
     """The fully mutable "class" `Request <Request>` object,
     containing the exact bytes that will be sent to the server.
@@ -57,14 +63,24 @@ class Request():
         self.headers = None
         #: HTTP path
         self.path = None        
+        #: Raw query string of the URL, without the leading '?'
+        self.query_string = ""
         # The cookies set used to create Cookie header
         self.cookies = None
         #: request body to send to the server.
         self.body = None
+        #: Undecoded request body, handed to routes for binary content types
+        self.raw_body = b""
+        #: IP address of the client connection
+        self.remote_addr = None
         #: Routes
         self.routes = {}
         #: Hook point for routed mapped-path
         self.hook = None
+        # Parsed body and query string, see form, json and query
+        self._form = None
+        self._json = _UNPARSED
+        self._query = None
 
     def extract_request_line(self, request):
         try:
@@ -72,9 +88,9 @@ class Request():
             first_line = lines[0]
             method, path, version = first_line.split()
 
-            # Remove query string from path
+            # Remove query string from path, keeping it for GET routes
             if '?' in path:
-                path = path.split('?')[0]
+                path, self.query_string = path.split('?', 1)
 
             if path == '/':
                 path = '/index.html'
@@ -134,9 +150,54 @@ class Request():
 
         # Extract body from request
         self.body = self.extract_body(request)
+        self._form = None
+        self._json = _UNPARSED
+        self._query = None
 
         return
 
+    @property
+    def form(self):
+        """
+        Fields of a form encoded body, parsed on first access. Bodies of
+        other content types have no form fields.
+
+        :rtype dict: field name to decoded value, the last value wins.
+        """
+        if self._form is None:
+            content_type = (self.headers or {}).get('content-type', '')
+            kind = content_type.split(';', 1)[0].strip().lower()
+            if self.body and kind in ('', 'application/x-www-form-urlencoded'):
+                self._form = dict(parse_qsl(self.body, keep_blank_values=True))
+            else:
+                self._form = {}
+        return self._form
+
+    @property
+    def json(self):
+        """
+        JSON document of the body, parsed on first access.
+
+        :rtype: decoded document, or ``None`` if the body is not JSON.
+        """
+        if self._json is _UNPARSED:
+            try:
+                self._json = json.loads(self.body) if self.body else None
+            except ValueError:
+                self._json = None
+        return self._json
+
+    @property
+    def query(self):
+        """
+        Fields of the URL query string, parsed on first access.
+
+        :rtype dict: field name to decoded value, the last value wins.
+        """
+        if self._query is None:
+            self._query = dict(parse_qsl(self.query_string, keep_blank_values=True))
+        return self._query
+
     def extract_body(self, request):
         """Extract the body from HTTP request."""
         parts = request.split('\r\n\r\n', 1)
@@ -21,12 +21,79 @@ based on incoming requests.
 The current version supports MIME type detection, content loading and header formatting
 """
 import datetime
+import hashlib
+import json
 import os
 import mimetypes
 from .dictionary import CaseInsensitiveDict
 
 BASE_DIR = ""
 
+#: Cache-Control of static files (css, js, images) and of public pages;
+#: caches may serve them for ``max-age`` seconds, then a little longer while
+#: they revalidate with the ETag.
+STATIC_CACHE_CONTROL = "public, max-age=300, stale-while-revalidate=60"
+PAGE_CACHE_CONTROL = "public, max-age=60, stale-while-revalidate=30"
+#: Cache-Control of pages that depend on the login cookie.
+PRIVATE_CACHE_CONTROL = "private, no-cache"
+
+
+def dumps(obj):
+    """
+    Serializes a route result to JSON.
+
+    Objects providing a ``__json__()`` method, such as
+    :class:`daemon.message.Message`, are embedded with the JSON text they
+    return instead of being encoded again.
+
+    :param obj: dict, list or JSON scalar.
+
+    :rtype str: JSON text.
+    """
+    if isinstance(obj, dict):
+        return "{" + ", ".join(json.dumps(str(key)) + ": " + dumps(value)
+                               for key, value in obj.items()) + "}"
+    if isinstance(obj, (list, tuple)):
+        return "[" + ", ".join(dumps(item) for item in obj) + "]"
+    raw = getattr(obj, "__json__", None)
+    if raw is not None:
+        return raw()
+    return json.dumps(obj)
+
+
+class Payload(bytes):
+    """A route result sent as the response body as-is, with its own
+    content type instead of being serialized to JSON.
+
+    :attrs content_type (str): value of the ``Content-Type`` header.
+    """
+
+    def __new__(cls, data, content_type):
+        payload = super().__new__(cls, data)
+        payload.content_type = content_type
+        return payload
+
+
+class BadRequest(dict):
+    """A route result sent as JSON with a ``400 Bad Request`` status, for
+    a request the route refuses as invalid."""
+
+
+def set_connection(message, keep_alive):
+    """
+    Replaces the ``Connection`` header of a raw HTTP message.
+
+    :param message (bytes): request or response, head and body.
+    :param keep_alive (bool): ``keep-alive`` if true, else ``close``.
+
+    :rtype bytes: the message with a single ``Connection`` header.
+    """
+    head, sep, body = message.partition(b"\r\n\r\n")
+    lines = [line for line in head.split(b"\r\n")
+             if not line.lower().startswith(b"connection:")]
+    lines.insert(1, b"Connection: keep-alive" if keep_alive else b"Connection: close")
+    return b"\r\n".join(lines) + sep + body
+
 class Response():   
     """The :class:`Response <Response>` object, which contains a
     server's response to an HTTP request.
@@ -118,6 +185,12 @@ class Response():
         #: is a response.
         self.request = None
 
+        #: Cache-Control header, chosen from the content type when None.
+        self.cache_control = None
+
+        #: Entity tag of the content, set once the content is loaded.
+        self.etag = None
+
 
     def get_mime_type(self, path):
         """
@@ -218,9 +291,12 @@ class Response():
         try:
             with open(filepath, 'rb') as f:
                 content = f.read()
+            self.etag = '"{}"'.format(hashlib.md5(content).hexdigest()[:16])
         except IOError as e:
             print("[Response] Error reading file {}: {}".format(filepath, e))
             content = b"404 Not Found"
+            # Never let a cache keep the error
+            self.cache_control = "no-store"
         
         return len(content), content
 
@@ -242,7 +318,7 @@ class Response():
                 "Accept": "{}".format(reqhdr.get("Accept", "application/json")),
                 "Accept-Language": "{}".format(reqhdr.get("Accept-Language", "en-US,en;q=0.9")),
                 "Authorization": "{}".format(reqhdr.get("Authorization", "Basic <credentials>")),
-                "Cache-Control": "no-cache",
+                "Cache-Control": "{}".format(self.cache_control or "no-cache"),
                 "Content-Type": "{}".format(self.headers['Content-Type']),
                 "Content-Length": "{}".format(len(self._content)),
 #                "Cookie": "{}".format(reqhdr.get("Cookie", "sessionid=xyz789")), #dummy cooki
@@ -267,6 +343,9 @@ class Response():
         for key, value in headers.items():
             fmt_header += "{}: {}\r\n".format(key, value)
         
+        if self.etag:
+            fmt_header += "ETag: {}\r\n".format(self.etag)
+
         # Add Set-Cookie if present
         if self.cookies:
             for cookie_name, cookie_value in self.cookies.items():
@@ -277,6 +356,29 @@ class Response():
         return fmt_header.encode('utf-8')
 
 
+    def build_not_modified(self, request):
+        """
+        Constructs a 304 Not Modified response, for a request whose
+        ``If-None-Match`` names the current ETag of the content.
+
+        A 304 has no body, so no ``Content-Length`` is sent: a cache
+        would otherwise take the length of the empty answer for the
+        length of the stored representation.
+
+        :rtype bytes: Encoded 304 response.
+        """
+
+        return (
+                "HTTP/1.1 304 Not Modified\r\n"
+                "ETag: {}\r\n"
+                "Cache-Control: {}\r\n"
+                "Date: {}\r\n"
+                "\r\n"
+            ).format(self.etag, self.cache_control,
+                     datetime.datetime.utcnow().strftime("%a, %d %b %Y %H:%M:%S GMT")
+                     ).encode('utf-8')
+
+
     def build_notfound(self):
         """
         Constructs a standard 404 Not Found HTTP response.
@@ -329,6 +431,21 @@ class Response():
             return self.build_notfound()
 
         c_len, self._content = self.build_content(path, base_dir)
+
+        # Static files may be kept by browsers and the caching proxy, pages
+        # setting cookies may not
+        if self.cache_control is None:
+            if self.cookies:
+                self.cache_control = PRIVATE_CACHE_CONTROL
+            elif self.headers['Content-Type'] == 'text/html':
+                self.cache_control = PAGE_CACHE_CONTROL
+            else:
+                self.cache_control = STATIC_CACHE_CONTROL
+        if self.etag and not self.cookies:
+            if_none_match = request.headers.get('if-none-match', '')
+            if self.etag in if_none_match or if_none_match.strip() == '*':
+                return self.build_not_modified(request)
+
         self._header = self.build_response_header(request)
 
         return self._header + self._content
\ No newline at end of file
@@ -0,0 +1,547 @@
+#
+# Copyright (C) 2025 pdnguyen of HCMC University of Technology VNU-HCM.
+# All rights reserved.
+# This file is part of the CO3093/CO3094 course.
+#
+# WeApRous release
+#
+# The authors hereby grant to Licensee personal permission to use
+# and modify the Licensed Source Code for the sole purpose of studying
+# while attending the course
+#
+
+"""
+daemon.routing
+~~~~~~~~~~~~~~~~~
+
+This module reads the host blocks of ``config/proxy.conf`` into an
+immutable :class:`RoutingTable <RoutingTable>` and keeps it current.
+
+A table is compiled once per configuration: each host block becomes a
+:class:`HostRoute <HostRoute>` of balancers (see :mod:`daemon.balancer`)
+in a dict keyed by ``Host`` header, so finding the host of a request is
+one dict lookup. Other forms of a ``Host`` header
+are resolved on first sight and remembered:
+
+- ``app.local:8080`` matches its block exactly,
+- ``app.local`` as a block matches whatever port the client used,
+- ``*.app.local`` and ``*.app.local:8080`` match any subdomain, on any
+  port or on that port, the longest suffix winning.
+
+Inside a host block, nginx-style ``location`` blocks route by request
+path, each with its own upstreams and settings::
+
+    host "app.local:8080" {
+        proxy_pass http://127.0.0.1:9000;
+        location /static/ {
+            proxy_pass http://127.0.0.1:9100;
+            proxy_pass http://127.0.0.1:9101;
+            dist_policy least-conn;
+        }
+        location ~ ^/(send-peer|broadcast-peer|get-messages) {
+            proxy_pass http://127.0.0.1:9000;
+            proxy_timeout read=60;
+        }
+    }
+
+A path is matched as nginx does:
+
+- ``location = /path`` matches that path only and wins outright,
+- ``location /prefix`` is a prefix, the longest one is looked up in a
+  character trie in one pass over the path; a ``^~`` prefix
+  (``location ^~ /static/``) wins outright when it is the longest,
+- ``location ~ regex`` and ``location ~* regex`` (case-insensitive) are
+  tried in file order, the first match wins,
+- otherwise the longest prefix wins, if any, else the ``proxy_pass``
+  lines of the host block itself. A path matching nothing gets a ``404``.
+
+A :class:`Router <Router>` holds the current table. It loads the file
+again when its modification time changes, or on ``SIGHUP``, and swaps the
+table in one assignment: requests already routed finish on the balancer
+of the old table. Host blocks whose text did not change keep their
+balancer, with its health and load state; the health checkers of removed
+blocks are stopped. A file that fails to load is reported and the current
+table stays.
+
+Usage::
+
+  >>> router = Router('config/proxy.conf')
+  >>> router.watch()
+  >>> route = router.table.get('app.local:8080')
+  >>> balancer = route.match('/static/css/chat.css')
+"""
+
+import os
+import re
+import threading
+
+from .balancer import DEFAULT_POLICY, create_balancer, parse_upstream
+from . import health
+from . import breaker
+from . import timeouts
+from .coalesce import parse_coalesce
+
+#: Seconds between two checks of the modification time of the file.
+DEFAULT_RELOAD_INTERVAL = 2.0
+
+#: Resolved ``Host`` headers remembered by a table at most.
+MEMO_SIZE = 4096
+
+_MISSING = object()
+
+
+def _closing_brace(text, start):
+    """Returns the index of the brace closing the block opened just before
+    ``start``."""
+    depth = 1
+    for match in re.finditer(r'[{}]', text[start:]):
+        depth += 1 if match.group() == '{' else -1
+        if depth == 0:
+            return start + match.start()
+    raise ValueError("Unbalanced braces in the configuration")
+
+
+def split_blocks(text, keyword):
+    """
+    Splits the ``keyword <argument> { ... }`` blocks out of ``text``,
+    nested blocks staying in the body of their parent.
+
+    :raises ValueError: If a block is not closed.
+
+    :rtype tuple: (list of (argument, body) pairs in file order, text
+                  outside the blocks).
+    """
+    pattern = re.compile(r'\b{}\s+([^{{}};]*?)\s*\{{'.format(keyword))
+    blocks, outside, pos = [], [], 0
+    while True:
+        match = pattern.search(text, pos)
+        if match is None:
+            break
+        end = _closing_brace(text, match.end())
+        outside.append(text[pos:match.start()])
+        blocks.append((match.group(1), text[match.end():end]))
+        pos = end + 1
+    outside.append(text[pos:])
+    return blocks, ''.join(outside)
+
+
+def parse_host_blocks(text):
+    """
+    Splits a configuration into its host blocks.
+
+    :raises ValueError: If a block is not closed.
+
+    :rtype list: (host, block text) pairs, in file order.
+    """
+    blocks, _ = split_blocks(text, 'host')
+    return [(host.strip('"'), block) for host, block in blocks]
+
+
+def build_balancer(host, block):
+    """
+    Builds the balancer of a host or location block.
+
+    A host block lists its upstreams with ``proxy_pass``, optionally
+    weighted, and picks a load-balancing policy with ``dist_policy``
+    (round-robin by default). ``health_check`` and ``passive_check`` set
+    up the health checks of :mod:`daemon.health`, ``circuit_breaker`` the
+    breakers of :mod:`daemon.breaker`, ``proxy_coalesce`` the request
+    coalescing of :mod:`daemon.coalesce`; ``proxy_timeout``,
+    ``proxy_retries`` and ``proxy_hedge`` the request policy of
+    :mod:`daemon.timeouts`::
+
+        host "app.local:8080" {
+            proxy_pass http://127.0.0.1:9001 weight=3;
+            proxy_pass http://127.0.0.1:9002;
+            dist_policy consistent-hash cookie=auth;
+            health_check /health interval=5 timeout=1 rise=2 fall=3;
+            circuit_breaker error_rate=0.5 slow=2 open=5;
+            proxy_timeout connect=1 read=10 total=15;
+            proxy_retries 2;
+            proxy_hedge percentile=95;
+        }
+
+    :raises ValueError: If a setting is invalid.
+
+    :rtype daemon.balancer.Balancer: the balancer, or ``None`` for a block
+                                     without ``proxy_pass``.
+    """
+    # Find all proxy_pass entries, with their optional weight
+    upstreams = []
+    for address, weight in re.findall(
+            r'proxy_pass\s+http://([^\s;]+)(?:\s+weight=(\d+))?\s*;', block):
+        upstreams.append(parse_upstream(address, int(weight) if weight else 1))
+
+    # Find dist_policy if present, default policy is round-robin
+    dist_policy = DEFAULT_POLICY
+    options = {}
+    policy_match = re.search(r'dist_policy\s+([\w-]+)([^;]*);?', block)
+    if policy_match:
+        dist_policy = policy_match.group(1)
+        for option in policy_match.group(2).split():
+            key, _, value = option.partition('=')
+            options[key] = value
+
+    # Active checks only when asked, passive checks unless turned off
+    active = None
+    health_match = re.search(r'health_check\b([^;]*);', block)
+    if health_match:
+        active = health.parse_active_check(health_match.group(1).split())
+    passive = health.PassiveCheck()
+    passive_match = re.search(r'passive_check\b([^;]*);', block)
+    if passive_match:
+        passive = health.parse_passive_check(passive_match.group(1).split())
+
+    # Circuit breakers unless turned off
+    breaker_settings = breaker.BreakerSettings()
+    breaker_match = re.search(r'circuit_breaker\b([^;]*);', block)
+    if breaker_match:
+        breaker_settings = breaker.parse_breaker(breaker_match.group(1).split())
+
+    # Timeouts, retries and hedging of the requests
+    policy = {}
+    timeout_match = re.search(r'proxy_timeout\b([^;]*);', block)
+    if timeout_match:
+        policy.update(timeouts.parse_proxy_timeout(timeout_match.group(1).split()))
+    retries_match = re.search(r'proxy_retries\s+(\d+)\s*;', block)
+    if retries_match:
+        policy['retries'] = int(retries_match.group(1))
+    hedge_match = re.search(r'proxy_hedge\b([^;]*);', block)
+    if hedge_match:
+        policy['hedge'] = timeouts.parse_hedge(hedge_match.group(1).split())
+
+    # Request coalescing only when asked
+    coalescer = None
+    coalesce_match = re.search(r'proxy_coalesce\b([^;]*);', block)
+    if coalesce_match:
+        coalescer = parse_coalesce(coalesce_match.group(1).split())
+
+    if not upstreams:
+        print("[Proxy] Host {} has no proxy_pass, skipped".format(host))
+        return None
+    balancer = create_balancer(dist_policy, upstreams, options)
+    balancer.request_policy = timeouts.RequestPolicy(**policy)
+    balancer.coalescer = coalescer
+    health.watch(balancer, active, passive)
+    breaker.watch(balancer, breaker_settings)
+    return balancer
+
+
+class PrefixTrie:
+    """The :class:`PrefixTrie <PrefixTrie>` object finds the longest stored
+    prefix of a path in one pass over its characters."""
+
+    def __init__(self):
+        #: nodes are dicts of characters to nodes, the value stored for
+        #: the prefix ending at a node is under ``None``
+        self.root = {}
+
+    def insert(self, prefix, value):
+        node = self.root
+        for char in prefix:
+            node = node.setdefault(char, {})
+        node[None] = value
+
+    def longest(self, path):
+        """
+        Returns the value of the longest prefix of ``path``.
+
+        :rtype object: the value, or ``None`` if no prefix matches.
+        """
+        node = self.root
+        found = node.get(None)
+        for char in path:
+            node = node.get(char)
+            if node is None:
+                break
+            if None in node:
+                found = node[None]
+        return found
+
+
+class HostRoute:
+    """The :class:`HostRoute <HostRoute>` object holds the balancers of one
+    host block: its locations and its default.
+
+    :attrs default (Balancer): balancer of the ``proxy_pass`` lines of the
+        block itself, or ``None``.
+    :attrs exact (dict): ``=`` locations to their balancer.
+    :attrs prefixes (PrefixTrie): prefix locations to (balancer, True for
+        ``^~``).
+    :attrs regexes (tuple): (compiled regex, balancer) of the ``~`` and
+        ``~*`` locations, in file order.
+    """
+
+    __slots__ = ("default", "exact", "prefixes", "regexes", "balancers")
+
+    def __init__(self, default=None, locations=()):
+        self.default = default
+        self.exact = {}
+        self.prefixes = PrefixTrie()
+        regexes = []
+        balancers = [default] if default is not None else []
+        for modifier, pattern, balancer in locations:
+            if modifier == '=':
+                self.exact[pattern] = balancer
+            elif modifier in ('', '^~'):
+                self.prefixes.insert(pattern, (balancer, modifier == '^~'))
+            else:
+                flags = re.IGNORECASE if modifier == '~*' else 0
+                regexes.append((re.compile(pattern, flags), balancer))
+            balancers.append(balancer)
+        self.regexes = tuple(regexes)
+        #: every balancer of the block
+        self.balancers = tuple(balancers)
+
+    def match(self, path):
+        """
+        Returns the balancer of a request path.
+
+        :rtype Balancer: the balancer, or ``None`` if no location matches
+                         and the block has no ``proxy_pass`` of its own.
+        """
+        balancer = self.exact.get(path)
+        if balancer is not None:
+            return balancer
+        prefix = self.prefixes.longest(path)
+        if prefix is not None and prefix[1]:
+            return prefix[0]
+        for regex, balancer in self.regexes:
+            if regex.search(path):
+                return balancer
+        if prefix is not None:
+            return prefix[0]
+        return self.default
+
+    def __repr__(self):
+        return "<HostRoute default={} locations={}>".format(
+            self.default, len(self.balancers) - (self.default is not None))
+
+
+def parse_location(argument):
+    """
+    Splits the argument of a ``location`` line.
+
+    :raises ValueError: If the modifier is unknown or the regex invalid.
+
+    :rtype tuple: (modifier among ``''``, ``=``, ``^~``, ``~``, ``~*``,
+                  path or regex).
+    """
+    parts = argument.split(None, 1)
+    if len(parts) == 2:
+        modifier, pattern = parts[0], parts[1].strip()
+        if modifier not in ('=', '^~', '~', '~*'):
+            raise ValueError("Unknown location modifier {}".format(modifier))
+        if modifier.startswith('~'):
+            try:
+                re.compile(pattern)
+            except re.error as e:
+                raise ValueError("Invalid location regex {}: {}".format(pattern, e))
+        return modifier, pattern
+    if not parts:
+        raise ValueError("Empty location")
+    return '', parts[0]
+
+
+def build_route(host, block):
+    """
+    Builds the route of a host block and of its ``location`` blocks, each
+    with a balancer of its own, see :func:`build_balancer`.
+
+    :raises ValueError: If a setting is invalid.
+
+    :rtype HostRoute: the route, or ``None`` if nothing in the block has a
+                      ``proxy_pass``.
+    """
+    blocks, outside = split_blocks(block, 'location')
+    locations = []
+    for argument, body in blocks:
+        modifier, pattern = parse_location(argument)
+        balancer = build_balancer("{} location {}".format(host, argument), body)
+        if balancer is not None:
+            locations.append((modifier, pattern, balancer))
+    default = None
+    if not locations or re.search(r'proxy_pass\b', outside):
+        default = build_balancer(host, outside)
+    if default is None and not locations:
+        return None
+    return HostRoute(default, locations)
+
+
+def _split_port(host):
+    name, sep, port = host.rpartition(':')
+    if sep and port.isdigit():
+        return name, port
+    return host, ''
+
+
+class RoutingTable:
+    """The :class:`RoutingTable <RoutingTable>` object maps ``Host``
+    headers to host routes. Its routes do not change once built, a new
+    configuration gets a new table.
+
+    :attrs routes (dict): host names to :class:`HostRoute` objects; plain
+        balancers given instead become the default of a route.
+    :attrs sources (dict): host names to the text of their block.
+    """
+
+    def __init__(self, routes, sources=None):
+        self.routes = {host: route if isinstance(route, HostRoute) else HostRoute(route)
+                       for host, route in routes.items()}
+        self.sources = dict(sources or {})
+        exact = {}
+        wildcards = []
+        for host, route in self.routes.items():
+            host = host.lower()
+            if host.startswith('*.'):
+                name, port = _split_port(host[1:])
+                wildcards.append((name, port, route))
+            else:
+                exact[host] = route
+        self.exact = exact
+        # Longest suffix first, blocks with a port before those without
+        self.wildcards = tuple(sorted(wildcards, key=lambda w: (-len(w[0]), not w[1])))
+        #: Host headers seen so far to their route, or ``_MISSING``
+        self.memo = dict(exact)
+
+    def _resolve(self, hostname):
+        host = hostname.strip().lower()
+        route = self.exact.get(host)
+        if route is not None:
+            return route
+        name, port = _split_port(host)
+        route = self.exact.get(name)
+        if route is not None:
+            return route
+        for suffix, wildcard_port, route in self.wildcards:
+            if name.endswith(suffix) and wildcard_port in ('', port):
+                return route
+        return _MISSING
+
+    def get(self, hostname, default=None):
+        """
+        Returns the route of a ``Host`` header.
+
+        :rtype HostRoute: the route, or ``default``.
+        """
+        route = self.memo.get(hostname)
+        if route is None:
+            route = self._resolve(hostname)
+            if len(self.memo) >= MEMO_SIZE:
+                # Bounded against clients inventing Host headers
+                self.memo = dict(self.exact)
+            self.memo[hostname] = route
+        return default if route is _MISSING else route
+
+    def route_of(self, host, block):
+        """Returns the route of ``host`` if it was built from the same
+        block text, or ``None``."""
+        if self.sources.get(host) == block:
+            return self.routes.get(host)
+        return None
+
+    def balancers(self):
+        """Returns every balancer of the table, locations included."""
+        return [balancer for route in self.routes.values() for balancer in route.balancers]
+
+    def items(self):
+        return self.routes.items()
+
+    def __len__(self):
+        return len(self.routes)
+
+
+class Router:
+    """The :class:`Router <Router>` object holds the current routing table
+    of a configuration file and loads it again when it changes.
+
+    :attrs path (str): configuration file, or ``None`` for a fixed table.
+    :attrs table (RoutingTable): the current table.
+    :attrs interval (float): seconds between checks of the file, 0 to only
+        reload on request.
+    """
+
+    def __init__(self, path=None, table=None, interval=DEFAULT_RELOAD_INTERVAL):
+        self.path = path
+        self.table = table if table is not None else RoutingTable({})
+        self.interval = interval
+        self.mtime = None
+        self.lock = threading.Lock()
+        self.requested = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = None
+        if path is not None and not self.reload():
+            raise ValueError("Cannot load routes from {}".format(path))
+
+    def reload(self):
+        """
+        Loads the configuration file into a new table and swaps it in.
+
+        :rtype bool: False if the file could not be loaded, the current
+                     table then stays.
+        """
+        with self.lock:
+            old = self.table
+            mtime = self.mtime
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+                with open(self.path, 'r') as f:
+                    text = f.read()
+                routes, sources = {}, {}
+                for host, block in parse_host_blocks(text):
+                    route = old.route_of(host, block)
+                    if route is None:
+                        route = build_route(host, block)
+                    if route is not None:
+                        routes[host] = route
+                        sources[host] = block
+                table = RoutingTable(routes, sources)
+            except (OSError, ValueError) as e:
+                # Tried again once the file changes
+                self.mtime = mtime
+                print("[Proxy] Keeping the current routes, {} failed to load: {}".format(
+                    self.path, e))
+                return False
+            self.mtime = mtime
+            self.table = table
+
+            kept = set(map(id, table.balancers()))
+            for balancer in table.balancers():
+                health.start(balancer)
+            for balancer in old.balancers():
+                if id(balancer) not in kept:
+                    health.stop(balancer)
+        print("[Proxy] Loaded {} host blocks from {}".format(len(table), self.path))
+        for host, route in table.items():
+            print(host, route)
+        return True
+
+    def request_reload(self):
+        """Asks the watcher to reload; safe to call from a signal handler."""
+        self.requested.set()
+
+    def _changed(self):
+        try:
+            return os.stat(self.path).st_mtime_ns != self.mtime
+        except OSError:
+            return False
+
+    def _run(self):
+        while not self.stopped.is_set():
+            requested = self.requested.wait(self.interval or None)
+            self.requested.clear()
+            if self.stopped.is_set():
+                return
+            if requested or self._changed():
+                self.reload()
+
+    def watch(self):
+        """Starts the background thread reloading the file."""
+        if self.thread is None and self.path is not None:
+            self.thread = threading.Thread(target=self._run, daemon=True, name="routes-reload")
+            self.thread.start()
+
+    def stop(self):
+        """Stops the background reloads."""
+        self.stopped.set()
+        self.requested.set()
@@ -0,0 +1,321 @@
+#
+# Copyright (C) 2025 pdnguyen of HCMC University of Technology VNU-HCM.
+# All rights reserved.
+# This file is part of the CO3093/CO3094 course.
+#
+# WeApRous release
+#
+# The authors hereby grant to Licensee personal permission to use
+# and modify the Licensed Source Code for the sole purpose of studying
+# while attending the course
+#
+
+"""
+daemon.search
+~~~~~~~~~~~~~~~~~
+
+This module provides an incremental inverted index over channel history.
+
+For every channel, each token maps to the ascending list of sequence numbers
+of the messages containing it. Messages are indexed as they are appended to
+the history and removed when the history evicts them; since evicted messages
+are always the oldest of their channel, eviction only advances the head of
+the posting lists.
+
+Queries are whitespace separated terms combined with AND. A term ending with
+``*`` matches every token starting with it, however many there are. The
+short prefixes, which match the most tokens, get their own posting lists
+kept up to date while indexing; a longer prefix matching many tokens is
+checked through a lazy k-way merge of their postings, so a query never
+walks more postings than it needs.
+
+The sorted token list used for prefix lookups is not kept sorted on every
+new token: new tokens wait in a small unsorted list, merged into the
+sorted one once ``MAX_FRESH_TOKENS`` gathered.
+
+Usage::
+
+  >>> index = SearchIndex()
+  >>> index.add('general', 1, 'hello world')
+  >>> index.add('general', 2, 'hello there')
+  >>> index.search('hel* world')
+  [('general', 1)]
+"""
+
+import re
+import threading
+from bisect import bisect_left
+from heapq import merge
+
+TOKEN_RE = re.compile(r"\w+")
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 200
+
+#: Prefixes up to this length have their own posting lists.
+SHORT_PREFIX = 3
+
+#: Tokens of a prefix term checked one by one with a bisection; a prefix
+#: matching more tokens is checked through the merge of their postings.
+MAX_PREFIX_COMPONENTS = 64
+
+#: New or removed tokens tolerated before the sorted token list is rebuilt.
+MAX_FRESH_TOKENS = 256
+
+
+def tokenize(text):
+    """
+    Splits a text into its distinct lower-cased word tokens.
+
+    :rtype list: tokens in order of first appearance.
+    """
+    return list(dict.fromkeys(TOKEN_RE.findall(text.lower())))
+
+
+class _Postings:
+    """Ascending sequence numbers of one token; entries before ``head`` are
+    evicted."""
+
+    __slots__ = ("seqs", "head")
+
+    def __init__(self):
+        self.seqs = []
+        self.head = 0
+
+    def __len__(self):
+        return len(self.seqs) - self.head
+
+    def pop_oldest(self, seq):
+        if self.head < len(self.seqs) and self.seqs[self.head] == seq:
+            self.head += 1
+            if self.head * 2 > len(self.seqs):
+                del self.seqs[:self.head]
+                self.head = 0
+
+
+class _ChannelIndex:
+    """Token to postings map of one channel, with the tokens kept sorted for
+    prefix lookups and the postings of the short prefixes.
+
+    ``tokens`` is sorted, ``fresh`` holds the tokens added since it was
+    last rebuilt; ``listed`` is the set of both. Removed tokens stay
+    listed until the next rebuild, lookups skip them."""
+
+    __slots__ = ("postings", "prefixes", "tokens", "fresh", "listed", "removed")
+
+    def __init__(self):
+        self.postings = {}
+        self.prefixes = {}
+        self.tokens = []
+        self.fresh = []
+        self.listed = set()
+        self.removed = 0
+
+    def list_token(self, token):
+        if token in self.listed:
+            return
+        self.listed.add(token)
+        self.fresh.append(token)
+        if len(self.fresh) > MAX_FRESH_TOKENS:
+            self.rebuild()
+
+    def unlist_token(self):
+        self.removed += 1
+        if self.removed > MAX_FRESH_TOKENS:
+            self.rebuild()
+
+    def rebuild(self):
+        self.tokens = sorted(token for token in self.listed if token in self.postings)
+        self.listed = set(self.tokens)
+        self.fresh = []
+        self.removed = 0
+
+    def matching(self, prefix):
+        """Tokens starting with ``prefix``."""
+        postings = self.postings
+        for token in self.tokens[bisect_left(self.tokens, prefix):]:
+            if not token.startswith(prefix):
+                break
+            if token in postings:
+                yield token
+        for token in self.fresh:
+            if token.startswith(prefix) and token in postings:
+                yield token
+
+
+def _prefixes(tokens):
+    return {token[:n] for token in tokens for n in range(1, min(len(token), SHORT_PREFIX) + 1)}
+
+
+def _newest_first(seqs, lo):
+    for i in range(len(seqs) - 1, lo - 1, -1):
+        yield seqs[i]
+
+
+def _contains(seqs, lo, seq):
+    i = bisect_left(seqs, seq, lo)
+    return i < len(seqs) and seqs[i] == seq
+
+
+class _Descending:
+    """Membership tests of decreasing sequence numbers against the merged
+    postings of many tokens, advancing a lazy k-way merge."""
+
+    __slots__ = ("stream", "current")
+
+    def __init__(self, components):
+        self.stream = merge(*(_newest_first(seqs, lo) for seqs, lo in components),
+                            reverse=True)
+        self.current = next(self.stream, None)
+
+    def __call__(self, seq):
+        while self.current is not None and self.current > seq:
+            self.current = next(self.stream, None)
+        return self.current == seq
+
+
+def _membership(components):
+    if len(components) > MAX_PREFIX_COMPONENTS:
+        return _Descending(components)
+    return lambda seq: any(_contains(seqs, lo, seq) for seqs, lo in components)
+
+
+class SearchIndex:
+    """The :class:`SearchIndex <SearchIndex>` object indexes the messages of
+    every channel history by token.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.channels = {}
+
+    def add(self, channel, seq, text):
+        """
+        Indexes a message. Sequence numbers of a channel must be added in
+        ascending order.
+        """
+        with self.lock:
+            index = self.channels.get(channel)
+            if index is None:
+                index = self.channels[channel] = _ChannelIndex()
+            tokens = tokenize(text)
+            for token in tokens:
+                postings = index.postings.get(token)
+                if postings is None:
+                    postings = index.postings[token] = _Postings()
+                    index.list_token(token)
+                postings.seqs.append(seq)
+            for prefix in _prefixes(tokens):
+                postings = index.prefixes.get(prefix)
+                if postings is None:
+                    postings = index.prefixes[prefix] = _Postings()
+                postings.seqs.append(seq)
+
+    def evict(self, channel, seq, text):
+        """Removes the oldest message of ``channel`` from the index."""
+        with self.lock:
+            index = self.channels.get(channel)
+            if index is None:
+                return
+            tokens = tokenize(text)
+            for token in tokens:
+                postings = index.postings.get(token)
+                if postings is None:
+                    continue
+                postings.pop_oldest(seq)
+                if not postings:
+                    del index.postings[token]
+                    index.unlist_token()
+            for prefix in _prefixes(tokens):
+                postings = index.prefixes.get(prefix)
+                if postings is None:
+                    continue
+                postings.pop_oldest(seq)
+                if not postings:
+                    del index.prefixes[prefix]
+            if not index.postings:
+                del self.channels[channel]
+
+    def _term_postings(self, index, term):
+        """Returns the ``(seqs, lo)`` components matching ``term``; the
+        postings of a component are ``seqs[lo:]``."""
+        if term.endswith('*'):
+            prefix = term[:-1]
+            if len(prefix) <= SHORT_PREFIX:
+                postings = index.prefixes.get(prefix)
+                if postings is None:
+                    return []
+                return [(postings.seqs, postings.head)]
+            return [(index.postings[token].seqs, index.postings[token].head)
+                    for token in index.matching(prefix)]
+        postings = index.postings.get(term)
+        if postings is None:
+            return []
+        return [(postings.seqs, postings.head)]
+
+    def _search_channel(self, index, terms, limit):
+        terms = sorted((self._term_postings(index, term) for term in terms),
+                       key=lambda components: sum(len(seqs) - lo for seqs, lo in components))
+        smallest, others = terms[0], terms[1:]
+        if not smallest:
+            return []
+        # Walk the smallest term newest first, lazily merging prefix unions
+        candidates = merge(*(_newest_first(seqs, lo) for seqs, lo in smallest),
+                           reverse=True)
+        # Candidates come newest first, as the merged tests expect
+        tests = [_membership(components) for components in others]
+        found = []
+        previous = None
+        for seq in candidates:
+            if seq == previous:
+                continue
+            previous = seq
+            if all(test(seq) for test in tests):
+                found.append(seq)
+                if len(found) >= limit:
+                    break
+        return found
+
+    def search(self, query, channel=None, limit=DEFAULT_LIMIT):
+        """
+        Finds the newest messages matching every term of ``query``.
+
+        :param query (str): terms, ``term*`` for prefix matching.
+        :param channel (str): restrict the search to one channel.
+        :param limit (int): maximum number of results.
+
+        :rtype list: ``(channel, seq)`` pairs, newest first.
+        """
+        terms = []
+        for word in query.lower().split():
+            tokens = TOKEN_RE.findall(word)
+            if tokens and word.endswith('*'):
+                tokens[-1] += '*'
+            terms.extend(tokens)
+        if not terms:
+            return []
+        limit = max(1, min(limit, MAX_LIMIT))
+
+        with self.lock:
+            if channel is not None:
+                index = self.channels.get(channel)
+                if index is None:
+                    return []
+                return [(channel, seq) for seq in self._search_channel(index, terms, limit)]
+
+            results = []
+            for name, index in self.channels.items():
+                results.extend((seq, name) for seq in self._search_channel(index, terms, limit))
+        results.sort(reverse=True)
+        return [(name, seq) for seq, name in results[:limit]]
+
+    def stats(self):
+        """
+        Returns index accounting.
+
+        :rtype dict: channel name to token and posting counts.
+        """
+        with self.lock:
+            return {name: {"tokens": len(index.postings),
+                           "postings": sum(len(p) for p in index.postings.values())}
+                    for name, index in self.channels.items()}
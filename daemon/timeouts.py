@@ -0,0 +1,204 @@
+#
+# Copyright (C) 2025 pdnguyen of HCMC University of Technology VNU-HCM.
+# All rights reserved.
+# This file is part of the CO3093/CO3094 course.
+#
+# WeApRous release
+#
+# The authors hereby grant to Licensee personal permission to use
+# and modify the Licensed Source Code for the sole purpose of studying
+# while attending the course
+#
+
+"""
+daemon.timeouts
+~~~~~~~~~~~~~~~~~
+
+This module provides the timeouts, retries and hedging of the requests the
+proxy sends for a host block.
+
+Timeouts, in seconds:
+
+- ``connect``: opening a connection to an upstream,
+- ``read``: an upstream staying silent, before its response head or
+  between two reads of its body,
+- ``total``: from the first try of a request until a response head
+  arrives, retries and hedges included.
+
+An idempotent request whose body was received whole is tried again on
+another upstream, up to ``retries`` times, when its upstream fails before
+the response started: connect error, timeout, connection closed, or a
+``502``, ``503`` or ``504`` status.
+
+With hedging, a ``GET`` still unanswered after ``delay`` seconds is also
+sent to a second upstream, and the first response head to arrive wins; the
+other request is abandoned. Without a fixed ``delay`` the delay is the
+``percentile`` of the recent response times of the host block, so about
+one request in twenty is hedged at the 95th percentile and a slow upstream
+no longer sets the tail latency.
+
+Configured per host block::
+
+    host "app.local:8080" {
+        proxy_pass http://127.0.0.1:9001;
+        proxy_pass http://127.0.0.1:9002;
+        proxy_timeout connect=1 read=10 total=15;
+        proxy_retries 2;
+        proxy_hedge percentile=95;
+    }
+
+Hedging is off unless a ``proxy_hedge`` line is given.
+"""
+
+import threading
+from collections import deque
+
+DEFAULT_CONNECT_TIMEOUT = 5.0
+DEFAULT_READ_TIMEOUT = 30.0
+DEFAULT_TOTAL_TIMEOUT = 60.0
+DEFAULT_RETRIES = 1
+
+#: Methods a request can be sent again with.
+IDEMPOTENT_METHODS = frozenset(('GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS', 'TRACE'))
+
+#: Upstream statuses tried again on another upstream.
+RETRY_STATUSES = frozenset((502, 503, 504))
+
+#: Response times needed before the percentile is trusted.
+MIN_SAMPLES = 20
+
+
+class LatencyWindow:
+    """The :class:`LatencyWindow <LatencyWindow>` object keeps the response
+    times of the last ``size`` requests.
+
+    Percentiles are recomputed every ``MIN_SAMPLES`` new samples rather than
+    on every request.
+    """
+
+    def __init__(self, size=200):
+        self.samples = deque(maxlen=size)
+        self.lock = threading.Lock()
+        self.added = 0
+        self.sorted = []
+
+    def add(self, seconds):
+        with self.lock:
+            self.samples.append(seconds)
+            self.added += 1
+            if self.added % MIN_SAMPLES == 0:
+                self.sorted = sorted(self.samples)
+
+    def percentile(self, p):
+        """
+        Returns the ``p`` th percentile of the response times.
+
+        :rtype float: seconds, or ``None`` with too few samples.
+        """
+        ordered = self.sorted
+        if len(ordered) < MIN_SAMPLES:
+            return None
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100.0))]
+
+
+class HedgePolicy:
+    """Settings of the hedged requests of a host block.
+
+    :attrs delay (float): fixed seconds before hedging, or ``None`` to
+        follow the response times.
+    :attrs percentile (float): percentile of the response times used as
+        the delay.
+    :attrs min_delay (float): shortest delay, keeps fast upstreams from
+        being hedged on noise.
+    """
+
+    def __init__(self, delay=None, percentile=95.0, min_delay=0.005):
+        if (delay is not None and delay <= 0) or not 0 < percentile < 100 or min_delay < 0:
+            raise ValueError("Invalid proxy_hedge settings")
+        self.delay = None if delay is None else float(delay)
+        self.percentile = float(percentile)
+        self.min_delay = float(min_delay)
+
+
+class RequestPolicy:
+    """The :class:`RequestPolicy <RequestPolicy>` object holds the timeouts,
+    retries and hedging of a host block.
+
+    :attrs connect (float): connect timeout.
+    :attrs read (float): read timeout.
+    :attrs total (float): timeout until a response head.
+    :attrs retries (int): further tries of an idempotent request.
+    :attrs hedge (HedgePolicy): hedging settings, or ``None``.
+    :attrs latencies (LatencyWindow): recent response times.
+    """
+
+    def __init__(self, connect=DEFAULT_CONNECT_TIMEOUT, read=DEFAULT_READ_TIMEOUT,
+                 total=DEFAULT_TOTAL_TIMEOUT, retries=DEFAULT_RETRIES, hedge=None):
+        if connect <= 0 or read <= 0 or total <= 0 or retries < 0:
+            raise ValueError("Invalid proxy_timeout or proxy_retries settings")
+        self.connect = float(connect)
+        self.read = float(read)
+        self.total = float(total)
+        self.retries = int(retries)
+        self.hedge = hedge
+        self.latencies = LatencyWindow()
+
+    def tries(self, method, replayable):
+        """Number of tries of a request, 1 unless it can be sent again."""
+        if replayable and method in IDEMPOTENT_METHODS:
+            return 1 + self.retries
+        return 1
+
+    def hedge_delay(self, method, replayable):
+        """
+        Returns how long a request waits before it is hedged.
+
+        :rtype float: seconds, or ``None`` if the request is not hedged.
+        """
+        hedge = self.hedge
+        if hedge is None or method != 'GET' or not replayable:
+            return None
+        if hedge.delay is not None:
+            return hedge.delay
+        delay = self.latencies.percentile(hedge.percentile)
+        if delay is None:
+            return None
+        return max(delay, hedge.min_delay)
+
+
+def parse_proxy_timeout(args):
+    """
+    Reads the options of a ``proxy_timeout`` line.
+
+    :param args (list): ``key=value`` words, keys among ``connect``,
+        ``read`` and ``total``.
+
+    :rtype dict: the timeouts given, as floats.
+    """
+    timeouts = {}
+    for arg in args:
+        key, _, value = arg.partition('=')
+        if key not in ('connect', 'read', 'total'):
+            raise ValueError("Unknown proxy_timeout option {}".format(key))
+        timeouts[key] = float(value)
+    return timeouts
+
+
+def parse_hedge(args):
+    """
+    Builds the hedging settings of a ``proxy_hedge`` line.
+
+    :param args (list): ``on``, ``off`` or ``key=value`` options among
+        ``delay``, ``percentile`` and ``min_delay``.
+
+    :rtype HedgePolicy: the settings, or ``None`` for ``off``.
+    """
+    if args == ['off']:
+        return None
+    if args == ['on']:
+        args = []
+    options = dict(arg.partition('=')[::2] for arg in args)
+    try:
+        return HedgePolicy(**{key: float(value) for key, value in options.items()})
+    except TypeError as e:
+        raise ValueError("Unknown proxy_hedge option: {}".format(e))
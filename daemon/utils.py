@@ -1,16 +1,18 @@
 import os
 import json
-PEER_LIST = "db/peers.jon"
+PEER_LIST = "db/peers.json"
 MESSAGE_QUEUE_FILE = "db/message_queues.txt"
 
 # ----------------------
 # Peer list
 # ----------------------
 def save_peer_list(peer_list):
-    """Save given peer list to file in JSON format"""
+    """Save given peer list to file in JSON format (atomic replace)"""
     try:
-        with open(PEER_LIST, "w", encoding="utf-8") as f:
+        tmp_path = PEER_LIST + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
             json.dump(peer_list, f, indent=4)
+        os.replace(tmp_path, PEER_LIST)
         print("Saved peer list successfully")
         return True
     except Exception as e:
@@ -52,7 +54,10 @@ def load_peer_list():
 # Message queue
 # ----------------------
 def save_message_queue(message_queues):
-    """Save message queues dict to file (line-by-line)"""
+    """Save message queues dict to file (line-by-line)
+
+    Legacy format, superseded by :class:`daemon.msglog.MessageLog`.
+    """
     try:
         with open(MESSAGE_QUEUE_FILE, "w", encoding="utf-8") as f:
             for peer, msgs in message_queues.items():
@@ -74,7 +79,10 @@ def save_message_queue(message_queues):
         return False
 
 def load_message_queue():
-    """Load message queues from file"""
+    """Load message queues from file
+
+    Legacy format, only read to import old queues into the message log.
+    """
     if not os.path.exists(MESSAGE_QUEUE_FILE):
         return {}
 
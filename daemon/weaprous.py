@@ -17,7 +17,10 @@ deamon.weaproute
 This module provides a WeApRous object to deploy RESTful url web app with routing
 """
 
+import inspect
+
 from .backend import create_backend
+from .ratelimit import RateLimiter
 
 class WeApRous:
     """The fully mutable :class:`WeApRous <WeApRous>` object, which is a lightweight,
@@ -40,6 +43,10 @@ class WeApRous:
       >>> def hello(headers, body):
       >>>     return {'message': 'Hello, world!'}
 
+      >>> @app.route('/greet', methods=['POST'])
+      >>> def greet(request):
+      >>>     return {'message': 'Hello, ' + request.form.get('name', '')}
+
       >>> app.run()
     """
 
@@ -64,12 +71,19 @@ class WeApRous:
         self.ip = ip
         self.port = port
 
-    def route(self, path, methods=['GET']):
+    def route(self, path, methods=['GET'], rate_limit=None):
         """
         Decorator to register a route handler for a specific path and HTTP methods.
 
+        Handlers are called with ``headers`` and ``body``, or with the
+        :class:`Request <daemon.request.Request>` itself if they take a
+        ``request`` parameter.
+
         :param path (str): The URL path to route.
         :param methods (list): A list of HTTP methods (e.g., ['GET', 'POST']) to bind.
+        :param rate_limit: A :class:`RateLimiter <daemon.ratelimit.RateLimiter>`,
+            or a number of requests per second per client IP. Requests over
+            the limit are answered with ``429 Too Many Requests``.
 
         :rtype: function - A decorator that registers the handler function.
         """
@@ -80,6 +94,11 @@ class WeApRous:
             # Optional attach route metadata to the function
             func._route_path = path
             func._route_methods = methods
+            func._route_wants_request = 'request' in inspect.signature(func).parameters
+            if rate_limit is None or isinstance(rate_limit, RateLimiter):
+                func._route_rate_limit = rate_limit
+            else:
+                func._route_rate_limit = RateLimiter(rate_limit)
 
             return func
         return decorator
@@ -0,0 +1,251 @@
+#
+# Copyright (C) 2025 pdnguyen of HCMC University of Technology VNU-HCM.
+# All rights reserved.
+# This file is part of the CO3093/CO3094 course.
+#
+# WeApRous release
+#
+# The authors hereby grant to Licensee personal permission to use
+# and modify the Licensed Source Code for the sole purpose of studying
+# while attending the course
+#
+
+"""
+daemon.wire
+~~~~~~~~~~~~~~~~~
+
+This module provides the binary wire formats accepted by the chat endpoints
+besides form encoded requests and JSON responses.
+
+``application/x-chat-frames`` packs length-prefixed fields with
+:mod:`struct`. A body is a sequence of records. A request is one fields
+record; a response is an envelope fields record followed by one message
+record per message, the envelope ``messages`` field holding their count::
+
+    fields record:  count (>H), then count times
+                    key length (>B), key, value length (>I), value
+    message record: seq (>Q), timestamp (>d), then the lengths of
+                    from, to, type, channel, message and msg_id (>I
+                    each), followed by the six utf-8 strings; an empty
+                    msg_id means the client set none
+
+``application/msgpack`` encodes the same request fields and response
+object as MessagePack maps. It is only offered when the ``msgpack`` module
+is installed.
+
+The request ``Content-Type`` selects how a body is decoded; the ``Accept``
+header, or else the request format, selects how the response is encoded.
+
+Usage::
+
+  >>> body = encode_fields({'peer_name': 'bob'})
+  >>> decode_request(CONTENT_TYPE_FRAMES, body)
+  {'peer_name': 'bob'}
+"""
+
+import struct
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+CONTENT_TYPE_FRAMES = 'application/x-chat-frames'
+CONTENT_TYPE_MSGPACK = 'application/msgpack'
+
+#: Binary content types supported in this process, preferred first.
+CONTENT_TYPES = (CONTENT_TYPE_FRAMES,) + ((CONTENT_TYPE_MSGPACK,) if msgpack else ())
+
+FIELD_COUNT = struct.Struct('>H')
+KEY_LENGTH = struct.Struct('>B')
+VALUE_LENGTH = struct.Struct('>I')
+MESSAGE_HEADER = struct.Struct('>QdIIIIII')
+
+
+def media_type(value):
+    """Returns the lower-cased media type of a header value, without
+    parameters."""
+    return value.split(';', 1)[0].strip().lower()
+
+
+def encode_fields(fields):
+    """
+    Encodes a fields record; values are converted with :func:`str`.
+
+    :param fields (dict): field names to values.
+
+    :rtype bytes: the record.
+    """
+    parts = [FIELD_COUNT.pack(len(fields))]
+    for key, value in fields.items():
+        key = str(key).encode('utf-8')
+        value = str(value).encode('utf-8')
+        parts.append(KEY_LENGTH.pack(len(key)))
+        parts.append(key)
+        parts.append(VALUE_LENGTH.pack(len(value)))
+        parts.append(value)
+    return b''.join(parts)
+
+
+def decode_fields(data, offset=0):
+    """
+    Decodes the fields record at ``offset``.
+
+    :raises ValueError: If the record is truncated or not utf-8.
+
+    :rtype tuple: (dict of fields, offset after the record).
+    """
+    try:
+        count, = FIELD_COUNT.unpack_from(data, offset)
+        offset += FIELD_COUNT.size
+        fields = {}
+        for _ in range(count):
+            length, = KEY_LENGTH.unpack_from(data, offset)
+            offset += KEY_LENGTH.size
+            key = bytes(data[offset:offset + length]).decode('utf-8')
+            offset += length
+            length, = VALUE_LENGTH.unpack_from(data, offset)
+            offset += VALUE_LENGTH.size
+            if offset + length > len(data):
+                raise ValueError("Truncated field {}".format(key))
+            fields[key] = bytes(data[offset:offset + length]).decode('utf-8')
+            offset += length
+    except struct.error:
+        raise ValueError("Truncated fields record")
+    return fields, offset
+
+
+def encode_message(msg):
+    """
+    Encodes a message record.
+
+    :param msg (Message): sequenced message.
+
+    :rtype bytes: the record.
+    """
+    strings = [msg.sender.encode('utf-8'), (msg.target or '').encode('utf-8'),
+               msg.type.encode('utf-8'), msg.channel.encode('utf-8'),
+               msg.text.encode('utf-8'), (msg.msg_id or '').encode('utf-8')]
+    return MESSAGE_HEADER.pack(msg.seq, msg.timestamp,
+                               *(len(s) for s in strings)) + b''.join(strings)
+
+
+def decode_message(data, offset=0):
+    """
+    Decodes the message record at ``offset`` into its JSON view.
+
+    :raises ValueError: If the record is truncated or not utf-8.
+
+    :rtype tuple: (message dict, offset after the record).
+    """
+    try:
+        seq, timestamp, *lengths = MESSAGE_HEADER.unpack_from(data, offset)
+    except struct.error:
+        raise ValueError("Truncated message record")
+    offset += MESSAGE_HEADER.size
+    if offset + sum(lengths) > len(data):
+        raise ValueError("Truncated message record")
+    strings = []
+    for length in lengths:
+        strings.append(bytes(data[offset:offset + length]).decode('utf-8'))
+        offset += length
+    sender, target, kind, channel, text, msg_id = strings
+    msg = {'from': sender}
+    if target:
+        msg['to'] = target
+    msg.update({'message': text, 'type': kind, 'channel': channel,
+                'timestamp': timestamp, 'seq': seq})
+    if msg_id:
+        msg['msg_id'] = msg_id
+    return msg, offset
+
+
+def decode_request(content_type, body):
+    """
+    Decodes the fields of a binary request body.
+
+    :param content_type (str): request ``Content-Type`` header.
+    :param body (bytes): request body.
+
+    :raises ValueError: If the content type is not supported or the body
+                        is malformed.
+
+    :rtype dict: field names to values.
+    """
+    kind = media_type(content_type)
+    if kind == CONTENT_TYPE_FRAMES:
+        fields, _ = decode_fields(body)
+        return fields
+    if kind == CONTENT_TYPE_MSGPACK and msgpack is not None:
+        try:
+            fields = msgpack.unpackb(body, raw=False)
+        except Exception as e:
+            raise ValueError("Invalid msgpack body: {}".format(e))
+        if not isinstance(fields, dict):
+            raise ValueError("msgpack body must be a map")
+        return fields
+    raise ValueError("Unsupported content type {}".format(content_type))
+
+
+def negotiate(headers):
+    """
+    Chooses the binary format of a response.
+
+    :param headers (dict): lower-cased request headers.
+
+    :rtype str: binary content type, or ``None`` to answer with JSON.
+    """
+    accept = headers.get('accept', '')
+    for value in accept.split(','):
+        kind = media_type(value)
+        if kind in CONTENT_TYPES:
+            return kind
+        if kind == 'application/json':
+            return None
+    kind = media_type(headers.get('content-type', ''))
+    return kind if kind in CONTENT_TYPES else None
+
+
+def encode_response(content_type, result):
+    """
+    Encodes a route result; its ``messages`` list, if any, holds
+    :class:`daemon.message.Message` objects.
+
+    :param content_type (str): one of :data:`CONTENT_TYPES`.
+    :param result (dict): route result.
+
+    :rtype bytes: response body.
+    """
+    if content_type == CONTENT_TYPE_MSGPACK:
+        return msgpack.packb(result, default=lambda obj: obj.to_dict(), use_bin_type=True)
+    # The envelope holds the number of message records in ``messages``
+    messages = result.get('messages', ())
+    envelope = dict(result)
+    if 'messages' in result:
+        envelope['messages'] = len(messages)
+    return encode_fields(envelope) + b''.join(encode_message(msg) for msg in messages)
+
+
+def decode_response(content_type, body):
+    """
+    Decodes a response body produced by :func:`encode_response`.
+
+    :raises ValueError: If the content type is not supported or the body
+                        is malformed.
+
+    :rtype dict: route result, with messages as dicts. Envelope values of
+                 ``x-chat-frames`` responses are strings.
+    """
+    kind = media_type(content_type)
+    if kind == CONTENT_TYPE_MSGPACK and msgpack is not None:
+        return msgpack.unpackb(body, raw=False)
+    if kind != CONTENT_TYPE_FRAMES:
+        raise ValueError("Unsupported content type {}".format(content_type))
+    result, offset = decode_fields(body)
+    if 'messages' in result:
+        messages = []
+        for _ in range(int(result['messages'])):
+            msg, offset = decode_message(body, offset)
+            messages.append(msg)
+        result['messages'] = messages
+    return result
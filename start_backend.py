@@ -22,34 +22,243 @@ using the socket framework. It parses command-line arguments to configure the
 server's IP address and port, and then launches the backend server.
 """
 
+import os
+import re
+import time
 import socket
 import argparse
 import threading
 
 from daemon import create_backend
 from daemon.weaprous import WeApRous
+from daemon.response import Payload, BadRequest
+from daemon.httpadapter import is_text_type
+from daemon import wire
+from daemon.msgqueue import MessageQueues, OVERFLOW_POLICIES
+from daemon.registry import PeerRegistry
+from daemon.msglog import MessageLog
+from daemon.history import ChannelHistory, DEFAULT_PAGE_SIZE
+from daemon.search import SearchIndex, DEFAULT_LIMIT as SEARCH_LIMIT
+from daemon.presence import PresenceTracker
+from daemon.ratelimit import RateLimiter
+from daemon.idempotency import RecentIds
+from daemon.message import Message, MESSAGE_DIRECT, MESSAGE_BROADCAST
 from daemon.utils import *
 
 # Default port number used if none is specified via command-line arguments.
 PORT = 9000
 
+# Directory of the append-only message log segments.
+MESSAGE_LOG_DIR = "db/msglog"
+
+# Number of messages kept per channel history.
+CHANNEL_HISTORY_LIMIT = 100
+
+# Channels are created on demand; names are limited to word characters
+# and hyphens.
+CHANNEL_NAME_RE = re.compile(r'^[\w-]{1,64}$')
+
 # Global peer tracking for chat application
-peer_list = []
-peer_list_lock = threading.Lock()
+# Name-indexed registry, persisted write-behind to db/peers.json
+peer_registry = PeerRegistry()
 
 # Global message queue for real-time messaging
-# Structure: { 'peer_name': [ {from, message, timestamp}, ... ] }
-message_queues = {}
-message_queues_lock = threading.Lock()
-
-# Channel message history (persistent during server run)
-# Structure: { 'channel_name': [ {from, message, timestamp}, ... ] }
-channel_history = {
-    'general': [],
-    'random': [],
-    'tech': []
-}
-channel_history_lock = threading.Lock()
+# Bounded per-peer queues with byte accounting, sharded over lock stripes,
+# see daemon.msgqueue
+message_queues = MessageQueues()
+
+# Heartbeat presence of registered peers, see daemon.presence
+presence = PresenceTracker()
+
+
+def _rate_key(request):
+    """Rate limit key of a chat request, see :func:`_sender_key`."""
+    fields = request.form or request.query
+    return _sender_key(fields.get('sender_name') or fields.get('peer_name'),
+                       request.remote_addr)
+
+
+def _sender_key(name, remote_addr):
+    """Rate limit key of a sender: its name when it is a registered peer,
+    else the client IP. An unregistered name is not trusted, a client could
+    otherwise get a fresh bucket per made-up name."""
+    if isinstance(name, str) and name in peer_registry:
+        return 'peer:' + name
+    return 'ip:' + str(remote_addr)
+
+
+def _is_retry(request):
+    """Tells whether a chat request retries a send whose msg_id is known;
+    it is answered from the stored result and spends no token."""
+    try:
+        fields = _chat_fields(request)
+        msg_id = _msg_id(fields.get('msg_id'))
+    except ValueError:
+        return False
+    return msg_id is not None and (fields.get('sender_name', 'Anonymous'), msg_id) in recent_sends
+
+
+# Token buckets per registered sending peer, else per client IP, see
+# daemon.ratelimit. Broadcasts fan out to every queue, so they get the
+# tighter limit. Retries of a known msg_id are not charged, as in /batch.
+send_limiter = RateLimiter(rate=10, burst=20, key=_rate_key, exempt=_is_retry)
+broadcast_limiter = RateLimiter(rate=2, burst=10, key=_rate_key, exempt=_is_retry)
+
+# Client msg_ids of recent sends, so retries are answered without sending
+# again, see daemon.idempotency
+recent_sends = RecentIds()
+
+# Longest accepted client msg_id.
+MAX_MSG_ID_LENGTH = 128
+
+# Most operations accepted in one /batch request.
+MAX_BATCH_OPS = 256
+
+# Full-text index over channel history, see daemon.search
+search_index = SearchIndex()
+
+# Channel message history, indexed by message sequence number
+# and paged by cursor, see daemon.history. The default channels always
+# exist, others are created by their first broadcast. The search index
+# follows every append and retention eviction.
+channel_history = ChannelHistory(
+    ['general', 'random', 'tech'], limit=CHANNEL_HISTORY_LIMIT,
+    on_append=lambda channel, msg: search_index.add(channel, msg.seq, msg.text),
+    on_evict=lambda channel, msg: search_index.evict(channel, msg.seq, msg.text))
+
+# Durable log of queued and historic messages, see daemon.msglog
+message_log = MessageLog(MESSAGE_LOG_DIR, history_floor=channel_history.floor)
+
+
+def _direct_message(sender_name, target_name, message, channel, msg_id=None):
+    """Build a direct message record."""
+    return Message(sender_name, message, MESSAGE_DIRECT, channel, target_name,
+                   msg_id=msg_id)
+
+
+def _broadcast_message(sender_name, message, channel, msg_id=None):
+    """Build a channel broadcast record."""
+    return Message(sender_name, message, MESSAGE_BROADCAST, channel, msg_id=msg_id)
+
+
+def _msg_id(value):
+    """Normalize an optional client msg_id, None if absent.
+
+    :raises ValueError: If the id is too long.
+    """
+    if value is None or value == '':
+        return None
+    value = str(value)
+    if len(value) > MAX_MSG_ID_LENGTH:
+        raise ValueError('msg_id longer than {} characters'.format(MAX_MSG_ID_LENGTH))
+    return value
+
+
+def _replayed(sender_name, msg_id):
+    """Claim the msg_id of a send.
+
+    :rtype dict: the response to replay for a retry of an earlier send, or
+                 None if this send should run.
+    """
+    if msg_id is None:
+        return None
+    fresh, result = recent_sends.claim((sender_name, msg_id))
+    if fresh:
+        return None
+    replay = dict(result) if result is not None else {'status': 'success', 'message': 'Send in progress'}
+    replay['duplicate'] = True
+    return replay
+
+
+def _settle(sender_name, msg_id, result):
+    """Store the response of a send claimed by msg_id; failed sends are
+    forgotten so that a retry runs again."""
+    if msg_id is not None:
+        if result is not None and result.get('status') == 'success':
+            recent_sends.complete((sender_name, msg_id), result)
+        else:
+            recent_sends.release((sender_name, msg_id))
+    return result
+
+
+def _history_channel(channel):
+    """Return the history channel of a broadcast, or None if the channel
+    name is not valid."""
+    return channel if CHANNEL_NAME_RE.match(channel) else None
+
+
+def _parse_retention(spec):
+    """Parse a ``CHANNEL=COUNT[:BYTES[:AGE]]`` retention option; empty
+    fields keep their default."""
+    channel, limits = spec.split('=', 1)
+    fields = (limits.split(':') + ['', ''])[:3]
+    count, size, age = (field.strip() or None for field in fields)
+    return (channel,
+            int(count) if count is not None else None,
+            int(size) if size is not None else None,
+            float(age) if age is not None else None)
+
+
+def _dispatch(entries):
+    """Persist and queue messages.
+
+    :param entries (list): ``(msg, recipients, history_channel)`` triples.
+    :rtype list: number of queues each message was offered to.
+    """
+    result = []
+
+    def deliver(msgs):
+        for msg, (_, _, history_channel) in zip(msgs, entries):
+            if history_channel:
+                channel_history.append(history_channel, msg)
+        result.extend(message_queues.push_batch(
+            [(recipients, msg) for msg, recipients, _ in entries]))
+
+    message_log.append_many(entries, deliver)
+    counts, disconnected = result
+    for peer_name in disconnected:
+        _disconnect_peer(peer_name)
+    return counts
+
+
+def _fetch_messages(peer_names):
+    """Drain the queues of ``peer_names`` and acknowledge them in the log;
+    acknowledgements are buffered, a poll does not wait on the disk."""
+    drained = message_queues.drain_many(peer_names)
+    for peer_name, messages in drained.items():
+        if messages:
+            message_log.ack(peer_name, messages[-1].seq)
+    return drained
+
+
+def _chat_fields(request):
+    """Fields of a chat request: a binary body in one of the daemon.wire
+    formats, the form fields or else the query string.
+
+    :raises ValueError: If a binary body cannot be decoded.
+    """
+    content_type = request.headers.get('content-type', '')
+    if request.raw_body and not is_text_type(content_type):
+        fields = wire.decode_request(content_type, request.raw_body)
+        return {str(key): str(value) for key, value in fields.items()}
+    return request.form or request.query
+
+
+def _reply(request, result):
+    """Encode a chat route result in the binary format negotiated by the
+    client, or leave it to be sent as JSON."""
+    content_type = wire.negotiate(request.headers)
+    if content_type is None:
+        return result
+    return Payload(wire.encode_response(content_type, result), content_type)
+
+
+def _int_field(data, key):
+    """Parse an optional integer form field, None if missing or invalid."""
+    try:
+        return int(data[key])
+    except (KeyError, ValueError):
+        return None
 
 # Create WeApRous app with chat routes
 app = WeApRous()
@@ -64,99 +273,112 @@ def add_cors_headers(response):
 # THÊM đoạn code này vào file start_backend.py, trước dòng if __name__ == "__main__":
 
 @app.route("/health", methods=["GET", "HEAD"])
-def health_check(headers="", body=""):
+def health_check(request):
     """Health check endpoint for proxies and load balancers"""
-    import time
     return {
         "status": "healthy",
         "service": "chat_backend", 
         "timestamp": time.time(),
         "version": "1.0",
-        "peers_count": len(peer_list)
+        "peers_count": len(peer_registry),
+        "queued_bytes": message_queues.total_bytes
     }
+
+
+def _drop_peer(name):
+    """Remove a peer and reclaim its queue and presence state."""
+    peer_registry.remove(name)
+    message_queues.remove(name)
+    message_log.forget(name)
+    presence.forget(name)
+
+
+def _disconnect_peer(name):
+    """Drop a peer whose queue overflowed under the disconnect policy."""
+    _drop_peer(name)
+    print("[ChatApp] {} disconnected: message queue overflow".format(name))
+
+
+def _expire_stale():
+    """Drop the peers silent for longer than the presence TTL."""
+    for name in presence.expire():
+        _drop_peer(name)
+        print("[ChatApp] {} expired: no request for {}s".format(name, presence.ttl))
+
+
+def _seen(name):
+    """Refresh the presence of a registered peer, then expire stale ones."""
+    if name in peer_registry:
+        presence.touch(name)
+    _expire_stale()
+
+
 @app.route("/submit-info", methods=["POST"])
-def submit_info(headers="guest", body="anonymous"):
+def submit_info(request):
     """Register a new peer with the tracker server."""
     print("[ChatApp] Received peer registration request")
-    print("[DEBUG] Headers:", headers)
-    
-    # Parse form data
-    peer_data = {}
-    if body:
-        for param in body.split('&'):
-            if '=' in param:
-                key, value = param.split('=', 1)
-                peer_data[key] = value
+    print("[DEBUG] Headers:", request.headers)
     
+    peer_data = request.form
     name = peer_data.get('name', 'Unknown')
     ip = peer_data.get('ip', '127.0.0.1')
     port = peer_data.get('port', '5000')
     
-    # Add to peer list
-    with peer_list_lock:
-        # Check if peer already exists
-        existing = False
-        for peer in peer_list:
-            if peer['name'] == name:
-                peer['ip'] = ip  # Update IP
-                peer['port'] = port  # Update port
-                existing = True
-                break
-        
-        if not existing:
-            peer_list.append({
-                'name': name,
-                'ip': ip,
-                'port': port
-            })
-        with open("db/peers.json", "w") as f:
-            f.write("[\n")
-            for i, p in enumerate(peer_list):
-                if i == len(peer_list) - 1:  # Last item - no comma
-                    f.write('    {{"name": "{}", "ip": "{}", "port": "{}"}}\n'.format(p['name'], p['ip'], p['port']))
-                else:
-                    f.write('    {{"name": "{}", "ip": "{}", "port": "{}"}},\n'.format(p['name'], p['ip'], p['port']))
-            f.write("]\n")
-     # Initialize message queue for this peer
-    with message_queues_lock:
-        if name not in message_queues:
-            message_queues[name] = []
+    # Add to peer list (new or updated address), saved by the write-behind thread
+    peer_registry.upsert(name, ip, port)
+    _seen(name)
+    # Initialize message queue for this peer
+    message_queues.ensure(name)
     
     print("[ChatApp] Registered peer: {} at {}:{}".format(name, ip, port))
-    print("[ChatApp] Total peers: {}".format(len(peer_list)))
+    print("[ChatApp] Total peers: {}".format(len(peer_registry)))
     
     return {"status": "success", "message": "Peer registered: {} at {}:{}".format(name, ip, port)}
 
 
 @app.route("/add-list", methods=["POST"])
-def add_list(headers="guest", body="anonymous"):
+def add_list(request):
     """Alternative endpoint for adding peers to the list."""
-    return submit_info(headers, body)
+    return submit_info(request)
 
 
-@app.route("/get-list", methods=["GET"])
-def get_list(headers="guest", body="anonymous"):
-    """Get the list of all active peers."""
+@app.route("/get-list", methods=["GET", "POST"])
+def get_list(request):
+    """Get the list of all active peers.
+
+    With a ``since_version`` form field, only the peers added, updated and
+    removed since that registry version are returned, or an ``unchanged``
+    marker. A full list is returned when the changelog no longer reaches
+    back to ``since_version``.
+    """
     print("[ChatApp] Peer list requested")
     
-    with peer_list_lock:
-        peers = list(peer_list)  # Create a copy
+    _expire_stale()
+    return _peer_list(_int_field(request.form or request.query, 'since_version'))
+
+
+def _peer_list(since=None):
+    """Full peer list, or the delta since registry version ``since``."""
+    if since is not None:
+        delta = peer_registry.delta(since)
+        if delta is not None:
+            version, added, updated, removed = delta
+            if version == since:
+                return {"status": "unchanged", "version": version}
+            return {"status": "delta", "version": version, "added": added,
+                    "updated": updated, "removed": removed, "count": len(peer_registry)}
+    
+    version, peers = peer_registry.snapshot()
     
-    return {"peers": peers, "count": len(peers)}
+    return {"status": "full", "version": version, "peers": peers, "count": len(peers)}
 
 
 @app.route("/connect-peer", methods=["POST"])
-def connect_peer(headers="guest", body="anonymous"):
+def connect_peer(request):
     """Establish connection with a specific peer."""
     print("[ChatApp] Peer connection request")
     
-    # Parse form data
-    data = {}
-    if body:
-        for param in body.split('&'):
-            if '=' in param:
-                key, value = param.split('=', 1)
-                data[key] = value
+    data = request.form
     
     target_ip = data.get('target_ip', '')
     target_port = data.get('target_port', '')
@@ -166,26 +388,16 @@ def connect_peer(headers="guest", body="anonymous"):
     return {"status": "success", "message": "Connection established"}
 
 
-@app.route("/send-peer", methods=["POST"])
-def send_peer(headers="guest", body="anonymous"):
+@app.route("/send-peer", methods=["POST"], rate_limit=send_limiter)
+def send_peer(request):
     """Send a message to a specific peer (P2P direct messaging)."""
     print("[ChatApp] Direct message request")
     
-    # Parse form data
-    data = {}
-    if body:
-        for param in body.split('&'):
-            if '=' in param:
-                key, value = param.split('=', 1)
-                # URL decode
-                value = value.replace('+', ' ')
-                try:
-                    # Simple URL decode for %20, %21, etc
-                    import urllib.parse
-                    value = urllib.parse.unquote(value)
-                except:
-                    pass
-                data[key] = value
+    try:
+        data = _chat_fields(request)
+        msg_id = _msg_id(data.get('msg_id'))
+    except ValueError as e:
+        return _reply(request, {'status': 'error', 'message': str(e)})
     
     sender_name = data.get('sender_name', 'Anonymous')
     target_name = data.get('target_name', '')
@@ -193,191 +405,266 @@ def send_peer(headers="guest", body="anonymous"):
     channel = data.get('channel', 'general')  # Get channel
     
     print("[ChatApp] Message from {} to {} [{}]: {}".format(sender_name, target_name, channel, message))
+    _seen(sender_name)
+    
+    # A retry of a send that already went through gets the first answer
+    replay = _replayed(sender_name, msg_id)
+    if replay is not None:
+        print("[ChatApp] Duplicate DM {} from {}".format(msg_id, sender_name))
+        return _reply(request, replay)
     
     # Find target peer
-    target_found = False
-    with peer_list_lock:
-        for peer in peer_list:
-            if peer['name'] == target_name:
-                target_found = True
-                break
-    
-    if target_found:
-        # Add message to BOTH target's and sender's queue (for echo-back)
-        import time
-        msg_data = {
-            'from': sender_name,
-            'to': target_name,
-            'message': message,
-            'type': 'direct',
-            'channel': channel,
-            'timestamp': time.time()
-        }
-        
-        with message_queues_lock:
-            # Queue for receiver
-            if target_name not in message_queues:
-                message_queues[target_name] = []
-            message_queues[target_name].append(msg_data.copy())
-            
-            # Queue for sender (echo-back)
-            if sender_name not in message_queues:
-                message_queues[sender_name] = []
-            message_queues[sender_name].append(msg_data.copy())
-
-            save_message_queue()
-        
-        print("[ChatApp] DM queued: {} -> {}".format(sender_name, target_name))
-        return {"status": "success", "message": "Message sent to {}".format(target_name)}
-    else:
-        return {"status": "error", "message": "Peer {} not found".format(target_name)}
-
-
-@app.route("/broadcast-peer", methods=["POST"])
-def broadcast_peer(headers="guest", body="anonymous"):
+    if target_name not in peer_registry:
+        return _reply(request, _settle(sender_name, msg_id, {"status": "error", "message": "Peer {} not found".format(target_name)}))
+    
+    # Add message to BOTH target's and sender's queue (for echo-back)
+    msg_data = _direct_message(sender_name, target_name, message, channel, msg_id)
+    try:
+        _dispatch([(msg_data, [target_name, sender_name], None)])
+    except Exception:
+        _settle(sender_name, msg_id, None)
+        raise
+    
+    print("[ChatApp] DM queued: {} -> {}".format(sender_name, target_name))
+    return _reply(request, _settle(sender_name, msg_id, {"status": "success", "message": "Message sent to {}".format(target_name), "seq": msg_data.seq}))
+
+
+@app.route("/broadcast-peer", methods=["POST"], rate_limit=broadcast_limiter)
+def broadcast_peer(request):
     """Broadcast a message to all connected peers."""
     print("[ChatApp] Broadcast message request")
     
-    # Parse form data
-    data = {}
-    if body:
-        for param in body.split('&'):
-            if '=' in param:
-                key, value = param.split('=', 1)
-                # URL decode
-                value = value.replace('+', ' ')
-                try:
-                    import urllib.parse
-                    value = urllib.parse.unquote(value)
-                except:
-                    pass
-                data[key] = value
+    try:
+        data = _chat_fields(request)
+        msg_id = _msg_id(data.get('msg_id'))
+    except ValueError as e:
+        return _reply(request, {'status': 'error', 'message': str(e)})
     
     sender_name = data.get('sender_name', 'Anonymous')
     message = data.get('message', '')
     channel = data.get('channel', 'general')  # Get channel
     
     print("[ChatApp] Broadcast from {} [{}]: {}".format(sender_name, channel, message))
+    _seen(sender_name)
     
-    # Add message to channel history (persistent)
-    import time
-    msg_data = {
-        'from': sender_name,
-        'message': message,
-        'type': 'broadcast',
-        'channel': channel,
-        'timestamp': time.time()
-    }
-    
-    with channel_history_lock:
-        if channel in channel_history:
-            channel_history[channel].append(msg_data)
-            # Keep only last 100 messages per channel
-            if len(channel_history[channel]) > 100:
-                channel_history[channel] = channel_history[channel][-100:]
+    replay = _replayed(sender_name, msg_id)
+    if replay is not None:
+        print("[ChatApp] Duplicate broadcast {} from {}".format(msg_id, sender_name))
+        return _reply(request, replay)
     
-    # Add message to ALL peers' queues (including sender to see confirmation)
-    broadcast_count = 0
+    msg_data = _broadcast_message(sender_name, message, channel, msg_id)
     
     # Get all registered peers
-    with peer_list_lock:
-        all_peers = [p['name'] for p in peer_list]
+    all_peers = peer_registry.names()
     
     print("[ChatApp] Broadcasting to peers: {}".format(all_peers))
     
-    with message_queues_lock:
-        for peer_name in all_peers:
-            # Ensure queue exists
-            if peer_name not in message_queues:
-                message_queues[peer_name] = []
-            
-            message_queues[peer_name].append(msg_data.copy())
-            broadcast_count += 1
+    # Add message to channel history (persistent) and to ALL peers' queues
+    # (including sender to see confirmation)
+    history_channel = _history_channel(channel)
+    try:
+        broadcast_count, = _dispatch([(msg_data, all_peers, history_channel)])
+    except Exception:
+        _settle(sender_name, msg_id, None)
+        raise
     
     print("[ChatApp] Broadcast queued for {} peers (including sender)".format(broadcast_count))
     
-    return {"status": "success", "message": "Broadcast sent", "peer_count": broadcast_count}
+    return _reply(request, _settle(sender_name, msg_id, {"status": "success", "message": "Broadcast sent", "peer_count": broadcast_count, "seq": msg_data.seq}))
 
 
 @app.route('/get-messages', methods=['POST'])
-def get_messages(headers="guest", body="anonymous"):
-    # Parse form data
-    data = {}
-    if body:
-        for param in body.split('&'):
-            if '=' in param:
-                key, value = param.split('=', 1)
-                # URL decode
-                try:
-                    import urllib.parse
-                    value = urllib.parse.unquote(value)
-                except:
-                    pass
-                data[key] = value
+def get_messages(request):
+    try:
+        data = _chat_fields(request)
+    except ValueError as e:
+        return _reply(request, {'status': 'error', 'message': str(e)})
     
     peer_name = data.get('peer_name', '').strip()
     
     if not peer_name:
-        return {'status': 'error', 'message': 'Missing peer_name'}
+        return _reply(request, {'status': 'error', 'message': 'Missing peer_name'})
+    _seen(peer_name)
     
-    with message_queues_lock:
-        messages = message_queues.get(peer_name, [])
-        message_queues[peer_name] = []  # Clear after reading
+    messages = _fetch_messages([peer_name])[peer_name]  # Clear after reading
     
-    return {'status': 'success', 'messages': messages}
+    return _reply(request, {'status': 'success', 'messages': messages})
+
+
+@app.route('/batch', methods=['POST'])
+def batch(request):
+    """Run several chat operations in one request.
+
+    The body is a JSON object ``{"ops": [...]}``. Each operation has an
+    ``op`` field, one of ``send``, ``broadcast``, ``fetch`` or ``peers``,
+    and the form fields of the matching single endpoint. Sends and
+    broadcasts are queued first, in order, with a single lock acquisition
+    per queue stripe; fetches and peer-list lookups run afterwards. Results
+    are returned in operation order. Sends and broadcasts count against the
+    rate limits of their single endpoints, one token per operation; a
+    retried operation with a known ``msg_id`` is answered first and costs
+    no token.
+
+    A body that is no object, or whose ``ops`` is not a list of at most
+    ``MAX_BATCH_OPS`` objects, is answered with a 400.
+    """
+    document = request.json
+    if not isinstance(document, dict):
+        return BadRequest({'status': 'error', 'message': 'Invalid JSON body'})
+    ops = document.get('ops', [])
+    if isinstance(ops, list) and len(ops) > MAX_BATCH_OPS:
+        return BadRequest({'status': 'error',
+                           'message': 'At most {} ops per batch'.format(MAX_BATCH_OPS)})
+    if not isinstance(ops, list) or not all(isinstance(op, dict) for op in ops):
+        return BadRequest({'status': 'error', 'message': 'ops must be a list of objects'})
+    
+    results = [None] * len(ops)
+    entries = []
+    sent = []
+    fetches = []
+    all_peers = None
+    
+    for op in ops:
+        name = op.get('sender_name') or op.get('peer_name')
+        if isinstance(name, str) and name in peer_registry:
+            presence.touch(name)
+    _expire_stale()
+    
+    for index, op in enumerate(ops):
+        kind = op.get('op')
+        if kind in ('send', 'broadcast'):
+            sender_name = op.get('sender_name', 'Anonymous')
+            try:
+                msg_id = _msg_id(op.get('msg_id'))
+            except ValueError as e:
+                results[index] = {'status': 'error', 'message': str(e)}
+                continue
+            replay = _replayed(sender_name, msg_id)
+            if replay is not None:
+                results[index] = replay
+                continue
+            limiter = send_limiter if kind == 'send' else broadcast_limiter
+            retry_after = limiter.acquire(_sender_key(op.get('sender_name'), request.remote_addr))
+            if retry_after:
+                results[index] = _settle(sender_name, msg_id, {'status': 'error', 'message': 'Rate limit exceeded',
+                                                               'retry_after': round(retry_after, 3)})
+                continue
+        if kind == 'send':
+            target_name = op.get('target_name', '')
+            if target_name not in peer_registry:
+                results[index] = _settle(sender_name, msg_id, {'status': 'error', 'message': 'Peer {} not found'.format(target_name)})
+                continue
+            msg_data = _direct_message(sender_name, target_name, op.get('message', ''),
+                                       op.get('channel', 'general'), msg_id)
+            entries.append((msg_data, [target_name, sender_name], None))
+            sent.append(index)
+        elif kind == 'broadcast':
+            if all_peers is None:
+                all_peers = peer_registry.names()
+            channel = op.get('channel', 'general')
+            msg_data = _broadcast_message(sender_name, op.get('message', ''), channel, msg_id)
+            history_channel = _history_channel(channel)
+            entries.append((msg_data, all_peers, history_channel))
+            sent.append(index)
+        elif kind == 'fetch':
+            peer_name = str(op.get('peer_name', '')).strip()
+            if not peer_name:
+                results[index] = {'status': 'error', 'message': 'Missing peer_name'}
+                continue
+            fetches.append((index, peer_name))
+        elif kind == 'peers':
+            since = op.get('since_version')
+            results[index] = _peer_list(since if isinstance(since, int) else None)
+        else:
+            results[index] = {'status': 'error', 'message': 'Unknown op {}'.format(kind)}
+    
+    if entries:
+        try:
+            counts = _dispatch(entries)
+        except Exception:
+            for msg_data, _, _ in entries:
+                _settle(msg_data.sender, msg_data.msg_id, None)
+            raise
+        for index, (msg_data, _, _), count in zip(sent, entries, counts):
+            results[index] = _settle(msg_data.sender, msg_data.msg_id,
+                                     {'status': 'success', 'seq': msg_data.seq, 'peer_count': count})
+    
+    if fetches:
+        drained = _fetch_messages([peer_name for _, peer_name in fetches])
+        for index, peer_name in fetches:
+            # A peer fetched twice gets its messages on the first fetch only
+            results[index] = {'status': 'success', 'messages': drained.pop(peer_name, [])}
+    
+    print("[ChatApp] Batch of {} ops: {} sends, {} fetches".format(len(ops), len(entries), len(fetches)))
+    return {'status': 'success', 'results': results}
+
+
+@app.route('/queue-stats', methods=['GET'])
+def queue_stats(request):
+    """Report per-peer and total queued messages and bytes."""
+    return {'status': 'success', 'queues': message_queues.stats(),
+            'log': message_log.stats(),
+            'history': channel_history.stats(),
+            'presence': {'ttl': presence.ttl, 'peers': len(presence)}}
 
 @app.route('/get-channel-history', methods=['POST'])
-def get_channel_history(headers="guest", body="anonymous"):
-    """Get full message history for a specific channel."""
-    # Parse form data
-    data = {}
-    if body:
-        for param in body.split('&'):
-            if '=' in param:
-                key, value = param.split('=', 1)
-                try:
-                    import urllib.parse
-                    value = urllib.parse.unquote(value)
-                except:
-                    pass
-                data[key] = value
+def get_channel_history(request):
+    """Get one page of message history for a specific channel.
+
+    Form fields ``before`` and ``after`` are exclusive sequence cursors and
+    ``limit`` the page size. Without cursors the newest page is returned.
+    """
+    data = request.form
     
     channel_name = data.get('channel', 'general').strip()
+    before = _int_field(data, 'before')
+    after = _int_field(data, 'after')
+    limit = _int_field(data, 'limit') or DEFAULT_PAGE_SIZE
     
-    with channel_history_lock:
-        history = channel_history.get(channel_name, [])
+    history, has_more = channel_history.query(channel_name, before, after, limit)
     
     print("[ChatApp] Channel history requested for #{}: {} messages".format(channel_name, len(history)))
-    return {'status': 'success', 'messages': history, 'channel': channel_name}
+    return {'status': 'success', 'messages': history, 'channel': channel_name,
+            'has_more': has_more}
+
+@app.route('/search', methods=['GET', 'POST'])
+def search(request):
+    """Full-text search over channel history.
+
+    Fields: ``q`` (terms combined with AND, ``term*`` for prefix match),
+    optional ``channel`` and ``limit``. Results are newest first.
+    """
+    data = request.form or request.query
+    
+    query = data.get('q', '')
+    channel = data.get('channel', '').strip() or None
+    limit = _int_field(data, 'limit') or SEARCH_LIMIT
+    
+    hits = search_index.search(query, channel, limit)
+    
+    # Group hits per channel to look messages up in one pass each
+    by_channel = {}
+    for channel_name, seq in hits:
+        by_channel.setdefault(channel_name, []).append(seq)
+    found = {}
+    for channel_name, seqs in by_channel.items():
+        for msg in channel_history.lookup(channel_name, seqs):
+            found[msg.seq] = msg
+    messages = [found[seq] for _, seq in hits if seq in found]
+    
+    print("[ChatApp] Search '{}' in {}: {} results".format(query, channel or 'all channels', len(messages)))
+    return {'status': 'success', 'query': query, 'messages': messages}
 
 @app.route('/unregister', methods=['POST'])
-def unregister(headers="guest", body="anonymous"):
-    # Parse form data
-    data = {}
-    if body:
-        for param in body.split('&'):
-            if '=' in param:
-                key, value = param.split('=', 1)
-                # URL decode
-                try:
-                    import urllib.parse
-                    value = urllib.parse.unquote(value)
-                except:
-                    pass
-                data[key] = value
+def unregister(request):
+    data = request.form
     
     peer_name = data.get('name', '').strip()
     
     if not peer_name:
         return {'status': 'error', 'message': 'Missing name'}
     
-    with peer_list_lock:
-        global peer_list
-        peer_list = [p for p in peer_list if p['name'] != peer_name]
-    
-    with message_queues_lock:
-        if peer_name in message_queues:
-            del message_queues[peer_name]
+    _drop_peer(peer_name)
     
     print(f"[Unregister] {peer_name} disconnected")
     return {'status': 'success', 'message': f'{peer_name} unregistered'} 
@@ -410,10 +697,114 @@ if __name__ == "__main__":
         default=PORT,
         help='Port number to bind the server. Default is {}.'.format(PORT)
     )
+    parser.add_argument(
+        '--channel-retention',
+        nargs='*',
+        default=[],
+        metavar='CHANNEL=COUNT[:BYTES[:AGE]]',
+        help='Messages, bytes and seconds kept per channel history. Default is {} messages, '
+             '{} bytes and no age limit.'.format(CHANNEL_HISTORY_LIMIT, channel_history.max_bytes)
+    )
+    parser.add_argument(
+        '--history-channel-bytes',
+        type=int,
+        default=channel_history.max_bytes,
+        help='Default bytes kept per channel history. Default is {}.'.format(channel_history.max_bytes)
+    )
+    parser.add_argument(
+        '--history-max-age',
+        type=float,
+        default=None,
+        help='Default seconds a message is kept in channel history. Default is no limit.'
+    )
+    parser.add_argument(
+        '--history-total-bytes',
+        type=int,
+        default=channel_history.max_total_bytes,
+        help='Bytes kept over all channel histories. Default is {}.'.format(channel_history.max_total_bytes)
+    )
+    parser.add_argument(
+        '--send-rate',
+        type=float,
+        default=send_limiter.rate,
+        help='Direct messages per second per peer. Default is {}.'.format(send_limiter.rate)
+    )
+    parser.add_argument(
+        '--send-burst',
+        type=float,
+        default=send_limiter.burst,
+        help='Burst of direct messages per peer. Default is {}.'.format(send_limiter.burst)
+    )
+    parser.add_argument(
+        '--broadcast-rate',
+        type=float,
+        default=broadcast_limiter.rate,
+        help='Broadcasts per second per peer. Default is {}.'.format(broadcast_limiter.rate)
+    )
+    parser.add_argument(
+        '--broadcast-burst',
+        type=float,
+        default=broadcast_limiter.burst,
+        help='Burst of broadcasts per peer. Default is {}.'.format(broadcast_limiter.burst)
+    )
+    parser.add_argument(
+        '--presence-ttl',
+        type=float,
+        default=presence.ttl,
+        help='Seconds without requests before a peer expires. Default is {}.'.format(presence.ttl)
+    )
+    parser.add_argument(
+        '--dedupe-window',
+        type=float,
+        default=recent_sends.window,
+        help='Seconds a send msg_id is remembered to absorb retries. Default is {}.'.format(recent_sends.window)
+    )
+    parser.add_argument(
+        '--queue-max-messages',
+        type=int,
+        default=message_queues.max_messages,
+        help='Maximum pending messages per peer. Default is {}.'.format(message_queues.max_messages)
+    )
+    parser.add_argument(
+        '--queue-max-bytes',
+        type=int,
+        default=message_queues.max_bytes,
+        help='Maximum pending bytes per peer. Default is {}.'.format(message_queues.max_bytes)
+    )
+    parser.add_argument(
+        '--queue-total-bytes',
+        type=int,
+        default=message_queues.max_total_bytes,
+        help='Maximum pending bytes over all peers. Default is {}.'.format(message_queues.max_total_bytes)
+    )
+    parser.add_argument(
+        '--queue-stripes',
+        type=int,
+        default=len(message_queues.stripes),
+        help='Number of lock stripes for message queues. Default is {}.'.format(len(message_queues.stripes))
+    )
+    parser.add_argument(
+        '--queue-overflow',
+        choices=OVERFLOW_POLICIES,
+        default=message_queues.policy,
+        help='Policy applied when a queue is full. Default is {}.'.format(message_queues.policy)
+    )
  
     args = parser.parse_args()
     ip = args.server_ip
     port = args.server_port
+    message_queues = MessageQueues(args.queue_max_messages, args.queue_max_bytes,
+                                   args.queue_total_bytes, args.queue_overflow,
+                                   args.queue_stripes)
+    presence.ttl = args.presence_ttl
+    recent_sends.window = args.dedupe_window
+    send_limiter.rate, send_limiter.burst = args.send_rate, args.send_burst
+    broadcast_limiter.rate, broadcast_limiter.burst = args.broadcast_rate, args.broadcast_burst
+    channel_history.configure(max_bytes=args.history_channel_bytes,
+                              max_age=args.history_max_age,
+                              max_total_bytes=args.history_total_bytes)
+    for retention in args.channel_retention:
+        channel_history.set_retention(*_parse_retention(retention))
 
     print("="*60)
     print("Backend Server with Authentication + Real-Time Chat")
@@ -427,13 +818,42 @@ if __name__ == "__main__":
     print("  - POST /send-peer (direct messaging)")
     print("  - POST /broadcast-peer (broadcast)")
     print("  - POST /get-messages (fetch pending messages)")
+    print("  - POST /batch (several chat operations in one request)")
+    print("  - GET  /search?q=&channel=&limit= (search channel history)")
+    print("  - GET  /queue-stats (queue memory accounting)")
     print("  - Chat UI: http://localhost:{}/chat.html".format(port))
     print("="*60)
 
     # Prepare and run the app with routes
     app.prepare_address(ip, port)
-    with peer_list_lock:
-        peer_list = load_peer_list()
-    with message_queues_lock:
-        message_queues = load_message_queue()
+    peer_registry.load(load_peer_list())
+    peer_registry.start_writer(save_peer_list)
+    # Restored peers must send a request within one TTL to stay listed
+    for name in peer_registry.names():
+        presence.touch(name)
+    queues, history = message_log.recover()
+    if not queues and not history and os.path.exists(MESSAGE_QUEUE_FILE):
+        # One-time import of the legacy db/message_queues.txt format
+        for peer_name, msgs in load_message_queue().items():
+            for fields in msgs:
+                msg = Message.from_dict(fields)
+                message_log.append(msg, [peer_name])
+                queues.setdefault(peer_name, []).append(msg)
+    for peer_name in list(queues):
+        if peer_name not in peer_registry:
+            # Pending for a peer that is gone or never registered
+            message_log.forget(peer_name)
+            del queues[peer_name]
+    message_queues.load(queues)
+    # Registered peers without pending messages get an empty queue
+    for name in peer_registry.names():
+        message_queues.ensure(name)
+    for channel, msgs in history.items():
+        channel_history.load(channel, msgs)
+    # Retries of sends made before a restart are still recognized
+    for msgs in list(queues.values()) + list(history.values()):
+        for msg in msgs:
+            if msg.msg_id is not None:
+                recent_sends.remember((msg.sender, msg.msg_id),
+                                      {'status': 'success', 'seq': msg.seq}, msg.timestamp)
     app.run()
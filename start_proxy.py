@@ -39,68 +39,20 @@ import socket
 import threading
 import argparse
 import re
+import signal
 from urllib.parse import urlparse
 from collections import defaultdict
 
 from daemon import create_proxy
+from daemon import connpool
+from daemon import routing
+from daemon.routing import Router
+from daemon.cache import (HttpCache, DEFAULT_MAX_BYTES, DEFAULT_MAX_OBJECT_BYTES,
+                          DEFAULT_MAX_DISK_BYTES)
 
 PROXY_PORT = 8080
 
 
-def parse_virtual_hosts(config_file):
-    """
-    Parses virtual host blocks from a config file.
-
-    :config_file (str): Path to the NGINX config file.
-    :rtype list of dict: Each dict contains 'listen'and 'server_name'.
-    """
-
-    with open(config_file, 'r') as f:
-        config_text = f.read()
-
-    # Match each host block
-    host_blocks = re.findall(r'host\s+"([^"]+)"\s*\{(.*?)\}', config_text, re.DOTALL)
-
-    dist_policy_map = ""
-
-    routes = {}
-    for host, block in host_blocks:
-        proxy_map = {}
-
-        # Find all proxy_pass entries
-        proxy_passes = re.findall(r'proxy_pass\s+http://([^\s;]+);', block)
-        map = proxy_map.get(host,[])
-        map = map + proxy_passes
-        proxy_map[host] = map
-
-        # Find dist_policy if present
-        policy_match = re.search(r'dist_policy\s+(\w+)', block)
-        if policy_match:
-            dist_policy_map = policy_match.group(1)
-        else: #default policy is round_robin
-            dist_policy_map = 'round-robin'
-            
-        #
-        # @bksysnet: Build the mapping and policy
-        # TODO: this policy varies among scenarios 
-        #       the default policy is provided with one proxy_pass
-        #       In the multi alternatives of proxy_pass then
-        #       the policy is applied to identify the highes matching
-        #       proxy_pass
-        #
-        if len(proxy_map.get(host,[])) == 1:
-            routes[host] = (proxy_map.get(host,[])[0], dist_policy_map)
-        # esle if:
-        #         TODO:  apply further policy matching here
-        #
-        else:
-            routes[host] = (proxy_map.get(host,[]), dist_policy_map)
-
-    for key, value in routes.items():
-        print(key, value)
-    return routes
-
-
 if __name__ == "__main__":
     """
     Entry point for launching the proxy server.
@@ -116,11 +68,72 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(prog='Proxy', description='', epilog='Proxy daemon')
     parser.add_argument('--server-ip', default='0.0.0.0')
     parser.add_argument('--server-port', type=int, default=PROXY_PORT)
+    parser.add_argument(
+        '--upstream-max-idle',
+        type=int,
+        default=connpool.DEFAULT_MAX_IDLE,
+        help='Idle keep-alive connections kept per upstream, 0 disables reuse. Default is {}.'.format(connpool.DEFAULT_MAX_IDLE)
+    )
+    parser.add_argument(
+        '--upstream-idle-timeout',
+        type=float,
+        default=connpool.DEFAULT_IDLE_TIMEOUT,
+        help='Seconds an idle upstream connection is kept. Default is {}.'.format(connpool.DEFAULT_IDLE_TIMEOUT)
+    )
+    parser.add_argument(
+        '--upstream-max-lifetime',
+        type=float,
+        default=connpool.DEFAULT_MAX_LIFETIME,
+        help='Seconds an upstream connection is used at most. Default is {}.'.format(connpool.DEFAULT_MAX_LIFETIME)
+    )
+    parser.add_argument(
+        '--cache-bytes',
+        type=int,
+        default=DEFAULT_MAX_BYTES,
+        help='Memory used by cached responses, 0 disables the cache. Default is {}.'.format(DEFAULT_MAX_BYTES)
+    )
+    parser.add_argument(
+        '--cache-max-object',
+        type=int,
+        default=DEFAULT_MAX_OBJECT_BYTES,
+        help='Largest response body cached. Default is {}.'.format(DEFAULT_MAX_OBJECT_BYTES)
+    )
+    parser.add_argument(
+        '--cache-dir',
+        default=None,
+        help='Directory large and evicted cached responses spill to. Default is memory only.'
+    )
+    parser.add_argument(
+        '--cache-disk-bytes',
+        type=int,
+        default=DEFAULT_MAX_DISK_BYTES,
+        help='Disk used by spilled cached responses. Default is {}.'.format(DEFAULT_MAX_DISK_BYTES)
+    )
+    parser.add_argument(
+        '--reload-interval',
+        type=float,
+        default=routing.DEFAULT_RELOAD_INTERVAL,
+        help='Seconds between checks of config/proxy.conf for changes, 0 to only reload on SIGHUP. Default is {}.'.format(routing.DEFAULT_RELOAD_INTERVAL)
+    )
  
     args = parser.parse_args()
     ip = args.server_ip
     port = args.server_port
-
-    routes = parse_virtual_hosts("config/proxy.conf")
-
-    create_proxy(ip, port, routes)
+    connpool.configure(max_idle=args.upstream_max_idle,
+                       idle_timeout=args.upstream_idle_timeout,
+                       max_lifetime=args.upstream_max_lifetime)
+
+    cache = None
+    if args.cache_bytes > 0:
+        cache = HttpCache(max_bytes=args.cache_bytes,
+                          max_object_bytes=args.cache_max_object,
+                          directory=args.cache_dir,
+                          max_disk_bytes=args.cache_disk_bytes)
+
+    # Routes follow config/proxy.conf without a restart
+    router = Router("config/proxy.conf", interval=args.reload_interval)
+    router.watch()
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, lambda signum, frame: router.request_reload())
+
+    create_proxy(ip, port, router, cache)
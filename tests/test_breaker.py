@@ -0,0 +1,55 @@
+import unittest
+
+from daemon import breaker
+from daemon.balancer import Upstream, create_balancer
+
+
+class HalfOpenProbeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.upstream = Upstream('127.0.0.1', 9001)
+        self.balancer = create_balancer('round-robin', [self.upstream])
+        breaker.watch(self.balancer, breaker.BreakerSettings(
+            min_requests=2, open=60, probes=2))
+        self.breaker = self.upstream.breaker
+
+    def _trip(self):
+        for _ in range(2):
+            upstream, probe = self.balancer.choose()
+            breaker.record(upstream, False, probe=probe)
+        self.assertEqual(self.breaker.state, breaker.OPEN)
+        self.breaker._half_open()
+
+    def test_requests_sent_before_opening_are_no_probes(self):
+        _, early = self.balancer.choose()
+        self._trip()
+        _, probe = self.balancer.choose()
+        self.assertEqual(probe, self.breaker.opened)
+        # The request sent while closed completes, it proves nothing
+        breaker.record(self.upstream, True, probe=early)
+        breaker.cancel(self.upstream, early)
+        self.assertEqual(self.breaker.state, breaker.HALF_OPEN)
+        self.assertEqual((self.breaker.probing, self.breaker.successes), (1, 0))
+        breaker.record(self.upstream, True, probe=probe)
+        self.assertEqual(self.breaker.state, breaker.HALF_OPEN)
+        _, probe = self.balancer.choose()
+        breaker.record(self.upstream, True, probe=probe)
+        self.assertEqual(self.breaker.state, breaker.CLOSED)
+
+    def test_probes_of_an_earlier_period_are_ignored(self):
+        self._trip()
+        _, stale = self.balancer.choose()
+        _, failed = self.balancer.choose()
+        self.assertEqual(self.balancer.choose()[1], 0)
+        breaker.record(self.upstream, False, probe=failed)
+        self.breaker._half_open()
+        breaker.record(self.upstream, True, probe=stale)
+        breaker.cancel(self.upstream, stale)
+        self.assertEqual((self.breaker.probing, self.breaker.successes), (0, 0))
+        _, probe = self.balancer.choose()
+        self.assertEqual(probe, self.breaker.opened)
+        self.assertEqual(self.breaker.probing, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
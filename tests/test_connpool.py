@@ -0,0 +1,63 @@
+import socket
+import unittest
+
+from daemon.connpool import ConnectionPool
+from daemon.relay import SocketReader, response_framing, parse_head
+
+
+class ConnectionPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = socket.socket()
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(4)
+        self.pool = ConnectionPool(*self.server.getsockname())
+
+    def tearDown(self):
+        self.pool.close()
+        self.server.close()
+
+    def _response(self, out, method, data):
+        conn, reused = self.pool.acquire()
+        peer, _ = self.server.accept()
+        conn.reader = SocketReader(conn.sock)
+        peer.sendall(data)
+        head = conn.reader.read_head()
+        status_line, headers = parse_head(head)
+        framing = response_framing(method, int(status_line[9:12]), headers)
+        conn.reader.relay_body(out, framing)
+        return conn, peer
+
+    def test_connection_with_stray_bytes_is_not_pooled(self):
+        sink = _Sink()
+        # A HEAD answered with a body leaves the body in the reader
+        conn, peer = self._response(sink, 'HEAD',
+                                    b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok")
+        self.assertTrue(conn.buffered())
+        self.pool.release(conn)
+        self.assertEqual(self.pool.stats()['idle'], 0)
+        peer.close()
+
+    def test_clean_connection_is_pooled(self):
+        sink = _Sink()
+        conn, peer = self._response(sink, 'GET',
+                                    b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok")
+        self.assertEqual(bytes(sink.data), b"ok")
+        self.pool.release(conn)
+        self.assertEqual(self.pool.stats()['idle'], 1)
+        again, reused = self.pool.acquire()
+        self.assertTrue(reused)
+        peer.close()
+
+
+class _Sink:
+
+    def __init__(self):
+        self.data = bytearray()
+
+    def sendall(self, data):
+        self.data += data
+
+
+if __name__ == '__main__':
+    unittest.main()
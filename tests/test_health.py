@@ -0,0 +1,44 @@
+import sys
+import threading
+import unittest
+
+from daemon import health
+from daemon.balancer import Upstream, create_balancer
+
+
+class PassiveCheckTest(unittest.TestCase):
+
+    def setUp(self):
+        self.upstream = Upstream('127.0.0.1', 9001)
+        self.balancer = create_balancer('round-robin', [self.upstream])
+        health.watch(self.balancer, passive=health.PassiveCheck(
+            min_requests=4, window=3600, eject=3600))
+        self.health = self.upstream.health
+
+    def test_concurrent_reports_are_all_counted(self):
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            threads = [threading.Thread(target=lambda: [health.report(self.upstream, True)
+                                                        for _ in range(5000)])
+                       for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setswitchinterval(interval)
+        self.assertEqual(self.health.window_requests, 40000)
+
+    def test_failures_eject_then_expire(self):
+        for ok in (True, False, False, True):
+            self.health.report(ok, now=10.0)
+        self.assertEqual(self.health.window_requests, 4)
+        self.health.report(False, now=10.0)
+        self.assertFalse(self.upstream.healthy)
+        self.health.check(now=10.0 + 3600)
+        self.assertTrue(self.upstream.healthy)
+
+
+if __name__ == '__main__':
+    unittest.main()
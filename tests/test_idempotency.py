@@ -0,0 +1,26 @@
+import time
+import unittest
+
+from daemon.idempotency import RecentIds
+
+
+class RecentIdsTest(unittest.TestCase):
+
+    def test_retry_is_answered_from_the_stored_result(self):
+        recent = RecentIds(window=300)
+        self.assertEqual(recent.claim(('alice', 'm-1')), (True, None))
+        recent.complete(('alice', 'm-1'), {'status': 'success'})
+        self.assertEqual(recent.claim(('alice', 'm-1')), (False, {'status': 'success'}))
+
+    def test_expired_replayed_key_runs_again(self):
+        recent = RecentIds(window=10)
+        now = time.time()
+        # A live claim heads the ring, the replayed key expires before it
+        recent.claim(('bob', 'live'), now=now)
+        recent.remember(('alice', 'old'), {'status': 'success'}, now - 5)
+        self.assertIn(('alice', 'old'), recent)
+        self.assertEqual(recent.claim(('alice', 'old'), now=now + 6), (True, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from daemon.message import Message
+from daemon.msglog import MessageLog
+
+
+def _message(i):
+    return Message('alice', 'message {}'.format(i), 'direct', 'general', target='bob')
+
+
+class MessageLogDurabilityTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _recover(self):
+        log = MessageLog(self.directory)
+        queues, _ = log.recover()
+        log.close()
+        return [msg.seq for msg in queues.get('bob', [])]
+
+    def test_appends_across_rotations_are_replayed(self):
+        log = MessageLog(self.directory, segment_bytes=300)
+        log.recover()
+        seqs = []
+        for i in range(50):
+            seqs.extend(log.append_many([(_message(i), ['bob'], None),
+                                         (_message(i), ['bob'], None)]))
+        log.close()
+        self.assertGreater(len(os.listdir(self.directory)), 1)
+        self.assertEqual(self._recover(), seqs)
+
+    def test_appends_after_close_are_replayed(self):
+        log = MessageLog(self.directory)
+        log.recover()
+        first = log.append(_message(0), ['bob'])
+        log.close()
+        # A late writer reopens the last segment instead of losing records
+        second = log.append(_message(1), ['bob'])
+        log.close()
+        self.assertEqual(self._recover(), [first, second])
+
+    def test_failed_write_keeps_the_buffer(self):
+        log = MessageLog(self.directory)
+        log.recover()
+        broken = log._active
+        broken.close()
+        with self.assertRaises(ValueError):
+            log.append(_message(0), ['bob'])
+        log._active = None
+        log.flush()
+        log.close()
+        self.assertEqual(self._recover(), [1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import unittest
+
+from daemon.message import Message
+from daemon.msgqueue import MessageQueues, message_size
+
+
+def _message(i):
+    return Message('alice', 'x' * 100, 'direct', 'general', target='bob',
+                   timestamp=1.0, seq=100 + i)
+
+
+class MessageQueuesBudgetTest(unittest.TestCase):
+
+    def _peers_on_one_stripe(self, queues, count):
+        stripe = hash('peer0') % len(queues.stripes)
+        names = (('peer%d' % i) for i in range(100000))
+        return [name for name in names if hash(name) % len(queues.stripes) == stripe][:count]
+
+    def test_global_budget_is_not_split_between_stripes(self):
+        size = message_size(_message(0))
+        queues = MessageQueues(max_messages=1000, max_bytes=100 * size,
+                               max_total_bytes=40 * size, stripes=16)
+        peers = self._peers_on_one_stripe(queues, 4)
+        for peer in peers:
+            queues.ensure(peer)
+        for i in range(10):
+            for peer in peers:
+                queues.push(peer, _message(i))
+        # Every message fits in the global budget, one stripe holding them all
+        self.assertEqual(queues.total_bytes, 40 * size)
+        self.assertEqual(sum(len(queues.drain(peer)) for peer in peers), 40)
+        self.assertEqual(queues.total_bytes, 0)
+
+    def test_global_budget_is_a_hard_ceiling(self):
+        size = message_size(_message(0))
+        queues = MessageQueues(max_messages=1000, max_bytes=100 * size,
+                               max_total_bytes=10 * size, stripes=16,
+                               policy='drop-newest')
+        peers = ['peer%d' % i for i in range(8)]
+        for peer in peers:
+            queues.ensure(peer)
+        for i in range(5):
+            for peer in peers:
+                queues.push(peer, _message(i))
+        self.assertEqual(queues.total_bytes, 10 * size)
+        self.assertEqual(queues.stats()['total_messages'], 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
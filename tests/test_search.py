@@ -0,0 +1,52 @@
+import random
+import unittest
+
+from daemon.search import SearchIndex, tokenize
+
+
+def _matches(text, query):
+    tokens = tokenize(text)
+    for term in query.split():
+        if term.endswith('*'):
+            if not any(token.startswith(term[:-1]) for token in tokens):
+                return False
+        elif term not in tokens:
+            return False
+    return True
+
+
+class SearchIndexTest(unittest.TestCase):
+
+    def test_results_match_a_full_scan(self):
+        rng = random.Random(7)
+        words = ['w%d' % i for i in range(600)] + ['apple', 'apricot', 'banana', 'band']
+        index = SearchIndex()
+        kept = {}
+        for seq in range(1, 3001):
+            text = ' '.join(rng.choice(words) for _ in range(5))
+            index.add('general', seq, text)
+            kept[seq] = text
+            # The history keeps the 1000 newest messages
+            if seq > 1000:
+                oldest = seq - 1000
+                index.evict('general', oldest, kept.pop(oldest))
+        queries = ['w*', 'w1*', 'w12*', 'w123', 'ap*', 'ban* w5*', 'w* apple',
+                   'band w3*', 'zzz*', 'w1* w2* w3*']
+        for query in queries:
+            expected = sorted((seq for seq, text in kept.items() if _matches(text, query)),
+                              reverse=True)[:200]
+            found = [seq for _, seq in index.search(query, 'general', limit=200)]
+            self.assertEqual(found, expected, query)
+
+    def test_wide_prefix_is_complete(self):
+        index = SearchIndex()
+        for seq in range(1, 301):
+            index.add('general', seq, 'abc%d hello' % seq)
+        self.assertEqual(len(index.search('abc*', limit=200)), 200)
+        self.assertEqual(len(index.search('hello abc*', limit=200)), 200)
+        self.assertEqual([seq for _, seq in index.search('abc1*', limit=200)][:3],
+                         [199, 198, 197])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,32 @@
+import unittest
+
+from daemon import wire
+from daemon.message import Message
+
+
+class FramesRoundTripTest(unittest.TestCase):
+
+    def _round_trip(self, messages):
+        body = wire.encode_response(wire.CONTENT_TYPE_FRAMES,
+                                    {'status': 'success', 'messages': messages})
+        return wire.decode_response(wire.CONTENT_TYPE_FRAMES, body)['messages']
+
+    def test_messages_keep_their_msg_id(self):
+        sent = Message('alice', 'hi', 'direct', 'general', target='bob',
+                       timestamp=1.5, seq=7, msg_id='m-1')
+        plain = Message('alice', 'all', 'broadcast', 'general', timestamp=2.5, seq=8)
+        self.assertEqual(self._round_trip([sent, plain]),
+                         [sent.to_dict(), plain.to_dict()])
+
+    def test_long_fields_round_trip(self):
+        name = 'a' * 70000
+        msg = Message(name, 'b' * 70000, 'direct', 'c' * 70000, target=name,
+                      timestamp=1.0, seq=1, msg_id='m' * 100)
+        self.assertEqual(self._round_trip([msg]), [msg.to_dict()])
+        fields = wire.decode_request(wire.CONTENT_TYPE_FRAMES,
+                                     wire.encode_fields({'sender_name': name}))
+        self.assertEqual(fields, {'sender_name': name})
+
+
+if __name__ == '__main__':
+    unittest.main()